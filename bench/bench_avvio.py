@@ -0,0 +1,89 @@
+# Controllo del tempo di avvio di un worker: in un processo Python nuovo,
+# contro un database già preparato (come dopo flask prepara-db), misura
+# l'import di Flask, l'import di credenza e create_app().
+#
+#   python bench/bench_avvio.py [--righe 100000] [--ripetizioni 5] [--limite-ms 1000]
+#
+# Stampa un documento JSON con i tempi di ogni avvio e le mediane. Esce con
+# codice 1 se la mediana dell'avvio supera il limite, se create_app ha
+# rifatto lo schema (init_db) o se ha caricato moduli che vanno importati solo
+# quando servono.
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Moduli che l'avvio non deve caricare
+PIGRI = ("pandas", "gevent", "concurrent.futures")
+
+FIGLIO = """
+import json, sys, time
+inizio = time.perf_counter()
+import flask
+dopo_flask = time.perf_counter()
+import credenza
+dopo_import = time.perf_counter()
+chiamate = []
+init_db = credenza.init_db
+credenza.init_db = lambda *a, **k: chiamate.append(a) or init_db(*a, **k)
+credenza.create_app()
+fine = time.perf_counter()
+print(json.dumps({"flask_ms": (dopo_flask - inizio) * 1000, "credenza_ms": (dopo_import - dopo_flask) * 1000,
+                  "create_app_ms": (fine - dopo_import) * 1000, "totale_ms": (fine - inizio) * 1000,
+                  "init_db": len(chiamate), "pigri": [m for m in %r if m in sys.modules]}))
+""" % (PIGRI,)
+
+
+def avvio(ambiente):
+    uscita = subprocess.run([sys.executable, "-c", FIGLIO], cwd=RADICE, env=ambiente,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(uscita.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--righe", type=int, default=100000, help="prodotti in credenza nel database")
+    parser.add_argument("--ripetizioni", type=int, default=5)
+    parser.add_argument("--limite-ms", type=float, default=1000, help="mediana massima dell'avvio")
+    args = parser.parse_args()
+
+    cartella = tempfile.mkdtemp(prefix="crenza-avvio-")
+    try:
+        ambiente = dict(os.environ, CRENZA_DB=os.path.join(cartella, "credenza.db"),
+                        CRENZA_FAMIGLIE=os.path.join(cartella, "famiglie"), PYTHONPATH=RADICE)
+        os.environ.update(ambiente)
+        sys.path.insert(0, RADICE)
+        import credenza
+        from bench_carico import popola
+        credenza.init_db()   # come flask prepara-db al deployment
+        popola(credenza.DB_FILE, args.righe)
+
+        avvii = [avvio(ambiente) for _ in range(args.ripetizioni)]
+    finally:
+        shutil.rmtree(cartella, True)
+
+    mediane = {k: round(statistics.median(a[k] for a in avvii), 2)
+               for k in ("flask_ms", "credenza_ms", "create_app_ms", "totale_ms")}
+    problemi = []
+    if mediane["totale_ms"] > args.limite_ms:
+        problemi.append(f"avvio {mediane['totale_ms']} ms oltre il limite di {args.limite_ms} ms")
+    if any(a["init_db"] for a in avvii):
+        problemi.append("create_app ha rifatto lo schema di un database già aggiornato")
+    pigri = sorted({m for a in avvii for m in a["pigri"]})
+    if pigri:
+        problemi.append(f"moduli caricati all'avvio: {', '.join(pigri)}")
+    print(json.dumps({"righe": args.righe, "limite_ms": args.limite_ms, "mediane": mediane,
+                      "avvii": [{k: round(v, 2) if isinstance(v, float) else v for k, v in a.items()}
+                                for a in avvii],
+                      "problemi": problemi}, indent=2))
+    sys.exit(1 if problemi else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+# Prova di carico dell'API servita da gunicorn: per ogni dimensione crea una
+# famiglia con 1k/10k/100k prodotti in credenza (più un decimo in lista), avvia
+# gunicorn in locale e la interroga con client concorrenti (thread) che
+# mescolano GET /, GET /dati completo, GET /dati?since= e le azioni POST.
+#
+#   python bench/bench_carico.py [--righe 1000 10000 100000] [--client 8]
+#       [--worker 2] [--durata 10] [--output risultati.json]
+#       [--baseline baseline.json] [--tolleranza 0.15] [--asincrono]
+#
+# Stampa un documento JSON con p50/p95/p99 (ms), richieste al secondo ed
+# errori per endpoint, e il picco di memoria residente (VmHWM, Linux) di
+# gunicorn. Con --baseline confronta p95 e throughput con un'esecuzione
+# salvata ed esce con codice 1 se qualcosa peggiora oltre la tolleranza.
+# --asincrono avvia gunicorn con i worker gevent (CRENZA_ASYNC=1).
+#
+# bench/baseline.json è un riferimento salvato con i parametri di default; il
+# suo "meta" dice su che macchina (cpu, python) e a che commit. I numeri
+# valgono solo per macchine simili: altrove si rigenera con
+#
+#   python bench/bench_carico.py --output bench/baseline.json
+#
+# e poi si confronta con --baseline bench/baseline.json. Se i parametri della
+# prova (client, worker, durata, mix, asincrono) non coincidono con quelli del
+# riferimento il confronto lo segnala negli avvisi.
+import argparse
+import atexit
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# endpoint -> peso nel mix di richieste
+MIX = {"home": 1, "dati": 1, "dati_since": 3, "azione": 5}
+AZIONI = ("aggiungi_credenza", "consuma", "aggiungi_lista", "da_credenza_a_lista")
+
+
+def popola(percorso, righe):
+    # Passa dal registro dei movimenti come le scritture vere
+    conn = sqlite3.connect(percorso)
+    conn.executemany(
+        '''INSERT INTO movimenti (ts, tipo, fonte, codice, nome, quantita, prezzo, scadenza)
+           VALUES (?, 'aggiunta', 'credenza', ?, ?, 1000, ?, ?)''',
+        ((1767225600 + i, f"800{i:010d}", f"Prodotto {i}", (i % 900) / 100,
+          f"2027-{i % 12 + 1:02d}-{i % 28 + 1:02d}") for i in range(righe)))
+    conn.executemany(
+        '''INSERT INTO lista_spesa (nome, quantita, prezzo_unitario, totale, data_aggiunta, ts_aggiunta)
+           VALUES (?, ?, ?, ?, ?, ?)''',
+        ((f"Spesa {i}", i % 5 + 1, (i % 500) / 100, (i % 5 + 1) * (i % 500) / 100,
+          f"{i % 28 + 1:02d}/01/2026 10:00", 1767225600 + i) for i in range(righe // 10)))
+    conn.commit()
+    conn.close()
+
+
+def porta_libera():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def avvia_gunicorn(porta, worker, ambiente):
+    processo = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-w", str(worker), "-b", f"127.0.0.1:{porta}", "app:app"],
+        cwd=RADICE, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    scadenza = time.monotonic() + 60
+    while time.monotonic() < scadenza:
+        if processo.poll() is not None:
+            raise RuntimeError("gunicorn non è partito")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", porta, timeout=2)
+            conn.request("GET", "/famiglia")
+            conn.getresponse().read()
+            return processo
+        except OSError:
+            time.sleep(0.2)
+    processo.terminate()
+    raise RuntimeError("gunicorn non risponde")
+
+
+def picco_rss_kib(pid):
+    # VmHWM del master e dei worker; None fuori da Linux
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids = [pid] + [int(p) for p in f.read().split()]
+        totale = massimo_worker = 0
+        for p in pids:
+            with open(f"/proc/{p}/status") as f:
+                kib = next(int(r.split()[1]) for r in f if r.startswith("VmHWM:"))
+            totale += kib
+            if p != pid:
+                massimo_worker = max(massimo_worker, kib)
+        return {"totale": totale, "worker_max": massimo_worker}
+    except (OSError, StopIteration, ValueError):
+        return None
+
+
+class Client(threading.Thread):
+    def __init__(self, porta, intestazioni, righe, fine, seme):
+        super().__init__(daemon=True)
+        self.conn = http.client.HTTPConnection("127.0.0.1", porta, timeout=120)
+        self.intestazioni = {**intestazioni, "Accept-Encoding": "gzip"}
+        self.righe, self.fine = righe, fine
+        self.caso = random.Random(seme)
+        self.tempi = {nome: [] for nome in MIX}
+        self.errori = {nome: 0 for nome in MIX}
+        self.versione = 0
+
+    def richiesta(self, metodo, url, corpo=None):
+        intestazioni = dict(self.intestazioni)
+        if corpo is not None:
+            corpo = json.dumps(corpo)
+            intestazioni["Content-Type"] = "application/json"
+        try:
+            self.conn.request(metodo, url, corpo, intestazioni)
+            risposta = self.conn.getresponse()
+            risposta.read()
+            return risposta
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            return None
+
+    def esegui(self, nome):
+        if nome == "home":
+            return self.richiesta("GET", "/")
+        if nome == "dati":
+            risposta = self.richiesta("GET", "/dati")
+            if risposta is not None and risposta.getheader("ETag"):
+                # ETag "<famiglia>-<versione>[-gzip]"
+                self.versione = int(risposta.getheader("ETag").strip('"').removesuffix("-gzip").rsplit("-", 1)[1])
+            return risposta
+        if nome == "dati_since":
+            return self.richiesta("GET", f"/dati?since={self.versione}")
+        azione = self.caso.choice(AZIONI)
+        i = self.caso.randrange(self.righe)
+        corpo = {"azione": azione, "nome": f"Prodotto {i}", "quantita": 1}
+        if azione == "aggiungi_credenza":
+            corpo.update(codice=f"800{i:010d}", prezzo=1.5, scadenza="2027-06-30")
+        elif azione == "aggiungi_lista":
+            corpo.update(nome=f"Spesa {i}", prezzo_unitario=2.0)
+        return self.richiesta("POST", "/", corpo)
+
+    def run(self):
+        nomi, pesi = list(MIX), list(MIX.values())
+        while time.monotonic() < self.fine:
+            nome = self.caso.choices(nomi, pesi)[0]
+            inizio = time.perf_counter()
+            risposta = self.esegui(nome)
+            durata = time.perf_counter() - inizio
+            if risposta is None or risposta.status >= 400:
+                self.errori[nome] += 1
+            else:
+                self.tempi[nome].append(durata)
+
+
+def percentile(ordinati, p):
+    if not ordinati:
+        return None
+    return round(ordinati[min(len(ordinati) - 1, int(len(ordinati) * p))] * 1000, 2)
+
+
+def riassumi(tempi, errori, secondi):
+    tempi.sort()
+    return {"richieste": len(tempi), "errori": errori, "rps": round(len(tempi) / secondi, 1),
+            "p50_ms": percentile(tempi, 0.50), "p95_ms": percentile(tempi, 0.95),
+            "p99_ms": percentile(tempi, 0.99)}
+
+
+def misura(righe, args, ambiente, credenza):
+    nome = f"carico{righe}"
+    chiave = credenza.crea_famiglia(nome)
+    popola(credenza.percorso_famiglia(nome), righe)
+    porta = porta_libera()
+    processo = avvia_gunicorn(porta, args.worker, ambiente)
+    try:
+        intestazioni = {"X-Famiglia": f"{nome}:{chiave}"}
+        # Un giro di riscaldamento per aprire connessioni e cache dei worker
+        Client(porta, intestazioni, righe, 0, 0).esegui("dati")
+        inizio = time.monotonic()
+        client = [Client(porta, intestazioni, righe, inizio + args.durata, seme) for seme in range(args.client)]
+        for c in client:
+            c.start()
+        for c in client:
+            c.join()
+        secondi = time.monotonic() - inizio
+        rss = picco_rss_kib(processo.pid)
+    finally:
+        processo.terminate()
+        processo.wait()
+    endpoint = {n: riassumi([t for c in client for t in c.tempi[n]], sum(c.errori[n] for c in client), secondi)
+                for n in MIX}
+    totale = riassumi([t for c in client for n in MIX for t in c.tempi[n]],
+                      sum(e["errori"] for e in endpoint.values()), secondi)
+    return {"righe": righe, "secondi": round(secondi, 2), "totale": totale, "endpoint": endpoint,
+            "rss_picco_kib": rss}
+
+
+def confronta(risultati, baseline, tolleranza):
+    # Peggioramenti di p95 o throughput oltre la tolleranza, per dimensione ed endpoint
+    precedenti = {r["righe"]: r for r in baseline["risultati"]}
+    differenze, regressioni = [], []
+    for r in risultati:
+        vecchio = precedenti.get(r["righe"])
+        if vecchio is None:
+            continue
+        for nome, valori in [("totale", r["totale"])] + list(r["endpoint"].items()):
+            prima = vecchio["totale"] if nome == "totale" else vecchio["endpoint"].get(nome)
+            if not prima or not prima["p95_ms"] or not valori["p95_ms"] or not prima["rps"]:
+                continue
+            voce = {"righe": r["righe"], "endpoint": nome,
+                    "p95": round(valori["p95_ms"] / prima["p95_ms"] - 1, 3),
+                    "rps": round(valori["rps"] / prima["rps"] - 1, 3)}
+            differenze.append(voce)
+            if voce["p95"] > tolleranza or voce["rps"] < -tolleranza:
+                regressioni.append(voce)
+    return differenze, regressioni
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--righe", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--client", type=int, default=8)
+    parser.add_argument("--worker", type=int, default=2)
+    parser.add_argument("--durata", type=float, default=10, help="secondi di carico per dimensione")
+    parser.add_argument("--output", help="salva i risultati (da usare come baseline)")
+    parser.add_argument("--baseline", help="risultati di un'esecuzione precedente da confrontare")
+    parser.add_argument("--tolleranza", type=float, default=0.15)
+    parser.add_argument("--asincrono", action="store_true", help="worker gevent (CRENZA_ASYNC=1)")
+    args = parser.parse_args()
+
+    cartella = tempfile.mkdtemp(prefix="crenza-carico-")
+    atexit.register(shutil.rmtree, cartella, True)
+    ambiente = dict(os.environ, CRENZA_DB=os.path.join(cartella, "credenza.db"),
+                    CRENZA_FAMIGLIE=os.path.join(cartella, "famiglie"),
+                    CRENZA_ASYNC="1" if args.asincrono else "0")
+    os.environ.update(ambiente)
+    sys.path.insert(0, RADICE)
+    import credenza
+    credenza.init_db()   # come flask prepara-db al deployment
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RADICE,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    documento = {"meta": {"commit": commit, "python": platform.python_version(), "cpu": os.cpu_count(),
+                          "client": args.client, "worker": args.worker, "asincrono": args.asincrono,
+                          "durata": args.durata, "mix": MIX},
+                 "risultati": [misura(righe, args, ambiente, credenza) for righe in args.righe]}
+    esito = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        differenze, regressioni = confronta(documento["risultati"], baseline, args.tolleranza)
+        avvisi = [f"{k}: {baseline['meta'].get(k)} nel riferimento, {documento['meta'][k]} qui"
+                  for k in ("client", "worker", "durata", "mix", "asincrono", "cpu")
+                  if baseline.get("meta", {}).get(k) != documento["meta"][k]]
+        documento["confronto"] = {"baseline": args.baseline, "tolleranza": args.tolleranza,
+                                  "avvisi": avvisi, "differenze": differenze, "regressioni": regressioni}
+        esito = 1 if regressioni else 0
+    testo = json.dumps(documento, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(testo + "\n")
+    print(testo)
+    sys.exit(esito)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# Latenza di cerca() (indice FTS5 a trigrammi dietro /cerca) con credenze da
+# 1k/10k/100k prodotti: sottostringhe, prefissi corti, errori di battitura.
+#
+#   python bench/bench_cerca.py [--righe 1000 10000 100000] [--ripetizioni 50]
+#
+# Stampa una riga JSON per ogni combinazione di dimensione e tipo di query.
+import argparse
+import atexit
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAROLE = ["pasta", "passata", "latte", "mozzarella", "biscotti", "caffè", "riso", "tonno",
+          "pomodori", "yogurt", "farina", "zucchero", "olio", "aceto", "piselli", "fagioli"]
+MARCHE = ["Barilla", "Mutti", "Granarolo", "Lavazza", "Rio Mare", "Scotti", "Findus", "Conad"]
+QUERY = {
+    "sottostringa": ["mozza", "granarolo", "biscotti lav", "8000000012"],
+    "prefisso_corto": ["pa", "y"],
+    "refuso": ["mozarella", "bicsotti", "fagoli"],
+    "assente": ["xylofono"],
+}
+
+
+def popola(db_file, righe):
+    conn = sqlite3.connect(db_file)
+    conn.execute("PRAGMA recursive_triggers=ON")
+    conn.execute("DELETE FROM credenza")
+    conn.executemany(
+        '''INSERT INTO credenza (codice, nome, quantita, prezzo, scadenza, data_inserimento, ts_inserimento)
+           VALUES (?, ?, 1, 1.0, 'N/D', '01/01/2026 10:00', 1767258000)''',
+        ((f"800{i:010d}", f"{PAROLE[i % len(PAROLE)].capitalize()} {MARCHE[i // 7 % len(MARCHE)]} {i}")
+         for i in range(righe)))
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--righe", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--ripetizioni", type=int, default=50)
+    args = parser.parse_args()
+
+    cartella = tempfile.mkdtemp(prefix="crenza-bench-")
+    atexit.register(shutil.rmtree, cartella, True)
+    os.environ["CRENZA_DB"] = os.path.join(cartella, "credenza.db")
+    sys.path.insert(0, RADICE)
+    import credenza
+    credenza.init_db()   # come flask prepara-db al deployment
+
+    for righe in args.righe:
+        popola(credenza.DB_FILE, righe)
+        for tipo, query in QUERY.items():
+            tempi = []
+            for _ in range(args.ripetizioni):
+                for q in query:
+                    inizio = time.perf_counter()
+                    risultati = credenza.cerca(q)
+                    tempi.append(time.perf_counter() - inizio)
+            tempi.sort()
+            print(json.dumps({"righe": righe, "query": tipo, "risultati_ultima": len(risultati),
+                              "ms_p50": round(tempi[len(tempi) // 2] * 1000, 3),
+                              "ms_p99": round(tempi[int(len(tempi) * 0.99)] * 1000, 3)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# Tempi e memoria del percorso attuale di /dati (aggregati in SQL + JSON in
+# streaming dal cursore). pandas non è tra le dipendenze: se è installato il
+# bench misura anche il vecchio get_dati() come termine di paragone, altrimenti
+# lo salta e riporta solo i numeri assoluti dello streaming.
+#
+#   python bench/bench_dati.py [--righe 1000 10000 100000] [--ripetizioni 5]
+#
+# Stampa una riga JSON per ogni combinazione di dimensione e implementazione.
+import argparse
+import atexit
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_dati_pandas(db_file):
+    # Implementazione precedente, tenuta qui solo come termine di paragone
+    import pandas as pd
+    conn = sqlite3.connect(db_file)
+    df_credenza = pd.read_sql_query("SELECT * FROM credenza ORDER BY data_inserimento DESC", conn)
+    df_lista = pd.read_sql_query("SELECT * FROM lista_spesa ORDER BY data_aggiunta DESC", conn)
+    conn.close()
+
+    stats_credenza = {}
+    if not df_credenza.empty:
+        stats_credenza = {
+            "totale_items": len(df_credenza),
+            "totale_quantita": int(df_credenza['quantita'].sum()),
+            "valore_totale": round(float((df_credenza['prezzo'] * df_credenza['quantita']).sum()), 2)
+        }
+    stats_lista = {}
+    if not df_lista.empty:
+        stats_lista = {
+            "totale_items": len(df_lista),
+            "totale_costo": round(float(df_lista['totale'].sum()), 2)
+        }
+    dati = {
+        "credenza": {"items": df_credenza.to_dict('records'), "stats": stats_credenza},
+        "lista_spesa": {"items": df_lista.to_dict('records'), "stats": stats_lista}
+    }
+    return len(json.dumps(dati).encode())
+
+
+def popola(db_file, righe):
+    conn = sqlite3.connect(db_file)
+    conn.execute("DELETE FROM credenza")
+    conn.execute("DELETE FROM lista_spesa")
+    conn.executemany(
+        '''INSERT INTO credenza (codice, nome, quantita, prezzo, scadenza, data_inserimento, ts_inserimento)
+           VALUES (?, ?, ?, ?, ?, ?, ?)''',
+        ((f"800{i:010d}", f"Prodotto {i}", i % 12 + 1, (i % 900) / 100, "2026-12-31",
+          f"{i % 28 + 1:02d}/01/2026 {i % 24:02d}:{i % 60:02d}", 1767225600 + i) for i in range(righe)))
+    conn.executemany(
+        '''INSERT INTO lista_spesa (nome, quantita, prezzo_unitario, totale, data_aggiunta, ts_aggiunta)
+           VALUES (?, ?, ?, ?, ?, ?)''',
+        ((f"Spesa {i}", i % 5 + 1, (i % 500) / 100, (i % 5 + 1) * (i % 500) / 100,
+          f"{i % 28 + 1:02d}/01/2026 10:00", 1767225600 + i) for i in range(righe // 10)))
+    conn.commit()
+    conn.close()
+
+
+def misura(funzione, ripetizioni):
+    # funzione() restituisce il numero di byte prodotti
+    tempi = []
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        byte = funzione()
+        tempi.append(time.perf_counter() - inizio)
+    tracemalloc.start()
+    funzione()
+    _, picco = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    tempi.sort()
+    return {"ms_mediana": round(tempi[len(tempi) // 2] * 1000, 2),
+            "ms_min": round(tempi[0] * 1000, 2),
+            "picco_kib": picco // 1024, "byte": byte}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--righe", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--ripetizioni", type=int, default=5)
+    args = parser.parse_args()
+
+    cartella = tempfile.mkdtemp(prefix="crenza-bench-")
+    atexit.register(shutil.rmtree, cartella, True)
+    os.environ["CRENZA_DB"] = os.path.join(cartella, "credenza.db")
+    sys.path.insert(0, RADICE)
+    inizio = time.perf_counter()
+    import credenza
+    credenza.create_app()
+    import_ms = round((time.perf_counter() - inizio) * 1000, 2)
+
+    try:
+        import pandas  # noqa: F401
+        con_pandas = True
+    except ImportError:
+        con_pandas = False
+        print("pandas non installato: salto il confronto, misuro solo lo streaming", file=sys.stderr)
+
+    print(json.dumps({"import_credenza_ms": import_ms}))
+    for righe in args.righe:
+        popola(credenza.DB_FILE, righe)
+        # Il corpo in streaming viene consumato a blocchi come farebbe il server WSGI
+        risultati = {"streaming": misura(lambda: sum(len(b.encode()) for b in credenza.stream_dati(credenza.DB_FILE)),
+                                         args.ripetizioni)}
+        if con_pandas:
+            risultati["pandas"] = misura(lambda: get_dati_pandas(credenza.DB_FILE), args.ripetizioni)
+        for nome, valori in risultati.items():
+            print(json.dumps({"righe": righe, "implementazione": nome, **valori}))
+
+
+if __name__ == "__main__":
+    main()
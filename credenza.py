@@ -1,14 +1,154 @@
-from flask import Flask, request, render_template_string, jsonify
-from datetime import datetime
+from flask import Blueprint, Flask, Response, request, jsonify, g, has_request_context
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+import base64
+import codecs
+import csv
+import gzip
+import hashlib
+import hmac
+import io
+import itertools
+import json
+import math
+import mimetypes
+import os
 import sqlite3
-import pandas as pd
+import sys
+import tempfile
+import threading
+import time
 import re
+import unicodedata
+import secrets
+import zlib
+import click
+from flask.cli import AppGroup
+from werkzeug.security import safe_join
 
-app = Flask(__name__)
-DB_FILE = "credenza.db"
+# Tutte le route, gli hook e i comandi CLI; l'app la costruisce create_app()
+bp = Blueprint("credenza", __name__, cli_group=None)
+DB_FILE = os.environ.get("CRENZA_DB", "credenza.db")
+# Ogni famiglia ha il suo database (shard) in questa cartella; DB_FILE resta
+# quello delle richieste senza famiglia e ospita il catalogo e il registro famiglie
+CARTELLA_FAMIGLIE = os.environ.get("CRENZA_FAMIGLIE", "famiglie")
+MAX_SHARD_APERTI = int(os.environ.get("CRENZA_SHARD_APERTI", 32))   # per thread
+# Build della app React (frontend/build.mjs): file con l'hash nel nome
+CARTELLA_APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "app")
+MAX_MODIFICHE = 5000
+INTERVALLO_CURSORE = 0.5   # secondi tra due letture del cursore condiviso
+HEARTBEAT_SSE = 15
+BUSY_TIMEOUT_MS = 5000
+MMAP_SIZE = 64 * 1024 * 1024
+CACHE_KIB = 16 * 1024
 
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
+PRAGMI = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    f"PRAGMA mmap_size={MMAP_SIZE}",
+    f"PRAGMA cache_size=-{CACHE_KIB}",
+    "PRAGMA temp_store=MEMORY",
+    # Anche le righe sostituite da INSERT OR REPLACE devono passare dai trigger DELETE
+    "PRAGMA recursive_triggers=ON",
+)
+
+# Connessioni per thread, una per database, aperte al primo uso e poi riusate.
+# Oltre MAX_SHARD_APERTI si chiude quella usata meno di recente, così i file
+# descriptor restano limitati anche con molte famiglie.
+# Il pid distingue le connessioni ereditate dal master di gunicorn dopo il fork.
+_locale = threading.local()
+_pool_lock = threading.Lock()
+_pool_stato = {"pid": None, "aperte": 0, "riusi": 0, "chiuse": 0, "transazioni": 0,
+               "ereditate": [], "verificati": set()}
+
+# condivisa: connessione di uno stream, che in modalità asincrona può essere
+# letto un blocco alla volta da thread diversi (mai da due insieme)
+def apri_connessione(percorso=DB_FILE, condivisa=False):
+    conn = sqlite3.connect(percorso, isolation_level=None, check_same_thread=not condivisa)
+    for pragma in PRAGMI:
+        conn.execute(pragma)
+    return conn
+
+# Database della richiesta in corso: lo shard della famiglia o quello principale
+def db_corrente():
+    return g.get("db", DB_FILE) if has_request_context() else DB_FILE
+
+def get_conn(percorso=None):
+    percorso = percorso or db_corrente()
+    pid = os.getpid()
+    connessioni = getattr(_locale, "connessioni", None)
+    if connessioni is not None and _locale.pid == pid:
+        conn = connessioni.get(percorso)
+        if conn is not None:
+            connessioni.move_to_end(percorso)
+            with _pool_lock:
+                _pool_stato["riusi"] += 1
+            return conn
+    with _pool_lock:
+        if _pool_stato["pid"] != pid:
+            _pool_stato.update(pid=pid, aperte=0, riusi=0, chiuse=0, transazioni=0, verificati=set())
+        if connessioni is not None and _locale.pid != pid:
+            # Chiuderle nel figlio rilascerebbe i lock del processo padre
+            _pool_stato["ereditate"].extend(connessioni.values())
+            connessioni = None
+        _pool_stato["aperte"] += 1
+        da_verificare = percorso not in _pool_stato["verificati"]
+        _pool_stato["verificati"].add(percorso)
+    if connessioni is None:
+        connessioni = _locale.connessioni = OrderedDict()
+        _locale.pid = pid
+    if da_verificare and percorso != DB_FILE:
+        aggiorna_schema(percorso)
+    connessioni[percorso] = conn = apri_connessione(percorso)
+    while len(connessioni) > MAX_SHARD_APERTI:
+        _, vecchia = connessioni.popitem(last=False)
+        vecchia.close()
+        with _pool_lock:
+            _pool_stato["chiuse"] += 1
+    return conn
+
+def stats_pool():
+    return {"pid": os.getpid(), "connessioni_aperte": _pool_stato["aperte"],
+            "connessioni_chiuse": _pool_stato["chiuse"],
+            "shard_aperti_thread": len(getattr(_locale, "connessioni", ())),
+            "riusi": _pool_stato["riusi"], "transazioni": _pool_stato["transazioni"],
+            "journal_mode": get_conn().execute("PRAGMA journal_mode").fetchone()[0]}
+
+# Transazione di scrittura sulla connessione del thread. BEGIN IMMEDIATE prende
+# subito il lock di scrittura (niente "database is locked" a metà transazione);
+# le transazioni annidate confluiscono in quella esterna.
+@contextmanager
+def transazione(percorso=None):
+    conn = get_conn(percorso)
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+    with _pool_lock:
+        _pool_stato["transazioni"] += 1
+    pubblica(percorso or db_corrente(), versione_corrente(conn))
+
+# Shard aperto per la prima volta da questo processo: se è rimasto indietro
+# (creato prima dell'ultima migrazione) lo porta allo schema corrente
+def aggiorna_schema(percorso):
+    conn = apri_connessione(percorso)
+    try:
+        aggiornato = conn.execute("PRAGMA user_version").fetchone()[0] >= len(MIGRAZIONI)
+    finally:
+        conn.close()
+    if not aggiornato:
+        init_db(percorso)
+
+def init_db(percorso=DB_FILE):
+    conn = apri_connessione(percorso)
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS credenza 
                  (codice TEXT, nome TEXT, quantita INTEGER DEFAULT 0, 
@@ -18,73 +158,2211 @@ def init_db():
                  (nome TEXT PRIMARY KEY, quantita INTEGER DEFAULT 1, 
                   prezzo_unitario REAL DEFAULT 0, totale REAL DEFAULT 0,
                   data_aggiunta TEXT)''')
-    conn.commit()
+    # Registro delle modifiche: ogni riga toccata riceve una nuova versione
+    c.execute('''CREATE TABLE IF NOT EXISTS modifiche
+                 (versione INTEGER PRIMARY KEY AUTOINCREMENT, tabella TEXT,
+                  codice TEXT, nome TEXT)''')
+    for evento, riga in (('INSERT', 'new'), ('UPDATE', 'new'), ('DELETE', 'old')):
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS credenza_{evento.lower()}_log
+                      AFTER {evento} ON credenza BEGIN
+                      INSERT INTO modifiche (tabella, codice, nome)
+                      VALUES ('credenza', {riga}.codice, {riga}.nome); END''')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS lista_spesa_{evento.lower()}_log
+                      AFTER {evento} ON lista_spesa BEGIN
+                      INSERT INTO modifiche (tabella, codice, nome)
+                      VALUES ('lista_spesa', NULL, {riga}.nome); END''')
+    # Un UPDATE che cambia la chiave deve segnalare anche la riga di prima
+    c.execute('''CREATE TRIGGER IF NOT EXISTS credenza_update_chiave_log
+                 AFTER UPDATE OF codice, nome ON credenza
+                 WHEN old.codice IS NOT new.codice OR old.nome IS NOT new.nome BEGIN
+                 INSERT INTO modifiche (tabella, codice, nome)
+                 VALUES ('credenza', old.codice, old.nome); END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS lista_spesa_update_chiave_log
+                 AFTER UPDATE OF nome ON lista_spesa
+                 WHEN old.nome IS NOT new.nome BEGIN
+                 INSERT INTO modifiche (tabella, codice, nome)
+                 VALUES ('lista_spesa', NULL, old.nome); END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS modifiche_potatura
+                  AFTER INSERT ON modifiche WHEN new.versione % 500 = 0 BEGIN
+                  DELETE FROM modifiche WHERE versione <= new.versione - {MAX_MODIFICHE}; END''')
+    # Aggregati materializzati, tenuti allineati dai trigger nella stessa transazione
+    c.execute('''CREATE TABLE IF NOT EXISTS statistiche
+                 (tabella TEXT PRIMARY KEY, items INTEGER NOT NULL DEFAULT 0,
+                  quantita INTEGER NOT NULL DEFAULT 0, valore REAL NOT NULL DEFAULT 0)''')
+    for tabella, valore in (("credenza", "{r}.prezzo * {r}.quantita"), ("lista_spesa", "{r}.totale")):
+        nuovo, vecchio = valore.format(r="new"), valore.format(r="old")
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS {tabella}_insert_stats
+                      AFTER INSERT ON {tabella} BEGIN
+                      UPDATE statistiche SET items = items + 1, quantita = quantita + new.quantita,
+                      valore = valore + {nuovo} WHERE tabella = '{tabella}'; END''')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS {tabella}_delete_stats
+                      AFTER DELETE ON {tabella} BEGIN
+                      UPDATE statistiche SET items = items - 1, quantita = quantita - old.quantita,
+                      valore = CASE WHEN items = 1 THEN 0 ELSE valore - {vecchio} END
+                      WHERE tabella = '{tabella}'; END''')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS {tabella}_update_stats
+                      AFTER UPDATE ON {tabella} BEGIN
+                      UPDATE statistiche SET quantita = quantita - old.quantita + new.quantita,
+                      valore = valore - {vecchio} + {nuovo} WHERE tabella = '{tabella}'; END''')
+    migra(conn)
+    ricalcola_statistiche(conn)
     conn.close()
 
+def _epoch(testo):
+    try:
+        return int(datetime.strptime(testo, "%d/%m/%Y %H:%M").timestamp())
+    except (TypeError, ValueError):
+        return 0
+
+def _migrazione_timestamp(conn):
+    # Orari di inserimento come epoch ordinabili, più gli indici per /elenco
+    conn.execute("ALTER TABLE credenza ADD COLUMN ts_inserimento INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE lista_spesa ADD COLUMN ts_aggiunta INTEGER NOT NULL DEFAULT 0")
+    conn.executemany("UPDATE credenza SET ts_inserimento=? WHERE rowid=?",
+                     [(_epoch(testo), rowid) for rowid, testo in
+                      conn.execute("SELECT rowid, data_inserimento FROM credenza").fetchall()])
+    conn.executemany("UPDATE lista_spesa SET ts_aggiunta=? WHERE rowid=?",
+                     [(_epoch(testo), rowid) for rowid, testo in
+                      conn.execute("SELECT rowid, data_aggiunta FROM lista_spesa").fetchall()])
+    conn.execute("CREATE INDEX IF NOT EXISTS credenza_ts ON credenza (ts_inserimento)")
+    conn.execute("CREATE INDEX IF NOT EXISTS credenza_scadenza ON credenza (scadenza)")
+    conn.execute("CREATE INDEX IF NOT EXISTS credenza_nome ON credenza (nome COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS credenza_valore ON credenza (prezzo * quantita)")
+    conn.execute("CREATE INDEX IF NOT EXISTS lista_spesa_ts ON lista_spesa (ts_aggiunta)")
+    conn.execute("CREATE INDEX IF NOT EXISTS lista_spesa_nome ON lista_spesa (nome COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS lista_spesa_totale ON lista_spesa (totale)")
+
+def _migrazione_app(conn):
+    # Collezioni della app React (zone, articoli, spesa, diete, impostazioni).
+    # versione: contatore del singolo record per rilevare i conflitti;
+    # rev: posizione nel registro modifiche, per i pull incrementali;
+    # eliminato: le cancellazioni restano come lapidi finché i client non le vedono.
+    sistema = "versione INTEGER NOT NULL DEFAULT 1, rev INTEGER NOT NULL, eliminato INTEGER NOT NULL DEFAULT 0"
+    conn.execute(f"CREATE TABLE zone (id INTEGER PRIMARY KEY, nome TEXT NOT NULL, {sistema})")
+    conn.execute(f'''CREATE TABLE articoli (id INTEGER PRIMARY KEY, zona_id INTEGER, nome TEXT NOT NULL,
+                     categoria TEXT, scadenza TEXT, barcode TEXT, {sistema})''')
+    conn.execute(f'''CREATE TABLE spesa (id INTEGER PRIMARY KEY, nome TEXT NOT NULL,
+                     quantita REAL NOT NULL DEFAULT 1, prezzo REAL NOT NULL DEFAULT 0, {sistema})''')
+    conn.execute(f"CREATE TABLE diete (id INTEGER PRIMARY KEY, nome TEXT NOT NULL, piano TEXT, {sistema})")
+    conn.execute(f"CREATE TABLE impostazioni (id INTEGER PRIMARY KEY, giorni_avviso INTEGER, {sistema})")
+    for tabella in ("zone", "articoli", "spesa", "diete", "impostazioni"):
+        conn.execute(f"CREATE INDEX {tabella}_rev ON {tabella} (rev)")
+    conn.execute("CREATE INDEX articoli_zona ON articoli (zona_id)")
+
+def _migrazione_famiglie(conn):
+    # Registro delle famiglie, usato solo nel database principale: della
+    # chiave d'accesso si conserva l'hash
+    conn.execute("CREATE TABLE famiglie (nome TEXT PRIMARY KEY, chiave TEXT NOT NULL, creata INTEGER NOT NULL)")
+
+def _migrazione_prodotti(conn):
+    # Catalogo EAN locale: la chiave primaria è l'indice della ricerca per codice
+    conn.execute('''CREATE TABLE prodotti (ean TEXT PRIMARY KEY, nome TEXT NOT NULL,
+                    categoria TEXT, prezzo REAL) WITHOUT ROWID''')
+
+# Scadenza normalizzata a data ISO (NULL se assente o illeggibile), da "AAAA-MM-GG"
+# o "GG/MM/AAAA". Colonna generata: resta allineata senza toccare le scritture.
+GIORNO_SCADENZA = '''date(CASE
+    WHEN scadenza GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*' THEN substr(scadenza, 1, 10)
+    WHEN scadenza GLOB '[0-9][0-9]/[0-9][0-9]/[0-9][0-9][0-9][0-9]*'
+        THEN substr(scadenza, 7, 4) || '-' || substr(scadenza, 4, 2) || '-' || substr(scadenza, 1, 2)
+    END)'''
+
+def _migrazione_scadenze(conn):
+    for tabella in ("credenza", "articoli"):
+        conn.execute(f"ALTER TABLE {tabella} ADD COLUMN giorno_scadenza TEXT "
+                     f"GENERATED ALWAYS AS ({GIORNO_SCADENZA}) VIRTUAL")
+    conn.execute("CREATE INDEX credenza_giorno_scadenza ON credenza (giorno_scadenza)")
+    conn.execute("CREATE INDEX articoli_giorno_scadenza ON articoli (giorno_scadenza) WHERE eliminato = 0")
+    # Riepilogo scaduti / in scadenza precalcolato, una sola riga per database
+    conn.execute('''CREATE TABLE riepilogo_scadenze (id INTEGER PRIMARY KEY CHECK (id = 1),
+                    giorno TEXT NOT NULL, versione INTEGER NOT NULL, dati TEXT NOT NULL)''')
+
+# Indice full-text (trigrammi) su nomi, categorie e codici di credenza, lista
+# della spesa e collezioni della app. Il rowid dell'indice è rowid sorgente * 4
+# + numero della tabella, così i trigger aggiornano per chiave primaria.
+# tabella -> (numero, nome, categoria, codice, condizione)
+RICERCA = {
+    "credenza": (0, "{r}.nome", "NULL", "NULLIF({r}.codice, 'N/A')", "1"),
+    "lista_spesa": (1, "{r}.nome", "NULL", "NULL", "1"),
+    "articoli": (2, "{r}.nome", "{r}.categoria", "{r}.barcode", "{r}.eliminato = 0"),
+    "spesa": (3, "{r}.nome", "NULL", "NULL", "{r}.eliminato = 0"),
+}
+TABELLE_RICERCA = {numero: tabella for tabella, (numero, *_) in RICERCA.items()}
+
+# Accanto all'indice a trigrammi, nomi_ricerca tiene le stesse righe in una
+# tabella normale con indice sul nome (NOCASE): i prefissi del nome sono un
+# intervallo dell'indice, già in ordine, e la ricerca si ferma al LIMIT.
+INDICI_RICERCA = ("ricerca", "nomi_ricerca")
+
+def _inserisci_ricerca(tabella, r, indice="ricerca"):
+    numero, nome, categoria, codice, condizione = (v.format(r=r) if isinstance(v, str) else v
+                                                   for v in RICERCA[tabella])
+    return f'''INSERT INTO {indice} (rowid, nome, categoria, codice)
+               SELECT {r}.rowid * 4 + {numero}, {nome}, {categoria}, {codice} WHERE {condizione}'''
+
+def ricostruisci_ricerca(conn, indici=INDICI_RICERCA):
+    for indice in indici:
+        conn.execute(f"DELETE FROM {indice}")
+        for tabella in RICERCA:
+            conn.execute(_inserisci_ricerca(tabella, "t", indice)
+                         .replace(" WHERE ", f" FROM {tabella} AS t WHERE ", 1))
+
+def _trigger_ricerca(conn, indice):
+    for tabella, (numero, *_) in RICERCA.items():
+        cancella = f"DELETE FROM {indice} WHERE rowid = old.rowid * 4 + {numero};"
+        conn.execute(f'''CREATE TRIGGER {tabella}_insert_{indice} AFTER INSERT ON {tabella} BEGIN
+                         {_inserisci_ricerca(tabella, "new", indice)}; END''')
+        conn.execute(f'''CREATE TRIGGER {tabella}_delete_{indice} AFTER DELETE ON {tabella} BEGIN
+                         {cancella} END''')
+        conn.execute(f'''CREATE TRIGGER {tabella}_update_{indice} AFTER UPDATE ON {tabella} BEGIN
+                         {cancella} {_inserisci_ricerca(tabella, "new", indice)}; END''')
+
+def _migrazione_ricerca(conn):
+    conn.execute('''CREATE VIRTUAL TABLE ricerca USING fts5
+                    (nome, categoria, codice, tokenize = 'trigram')''')
+    _trigger_ricerca(conn, "ricerca")
+    ricostruisci_ricerca(conn, ("ricerca",))
+
+def _migrazione_nomi_ricerca(conn):
+    conn.execute('''CREATE TABLE nomi_ricerca (id INTEGER PRIMARY KEY, nome TEXT COLLATE NOCASE,
+                    categoria TEXT, codice TEXT)''')
+    conn.execute("CREATE INDEX nomi_ricerca_nome ON nomi_ricerca (nome)")
+    _trigger_ricerca(conn, "nomi_ricerca")
+    ricostruisci_ricerca(conn, ("nomi_ricerca",))
+
+# Storico prezzi: osservazioni in sola aggiunta (prodotto = nome minuscolo) e
+# riepilogo mensile per prodotto e negozio tenuto dai trigger. Le stime leggono
+# solo il riepilogo: poche righe per prodotto anche con anni di storico.
+# tabella -> (nome, prezzo, giorno, condizione)
+FONTI_PREZZI = {
+    "credenza": ("{r}.nome", "{r}.prezzo", "date(nullif({r}.ts_inserimento, 0), 'unixepoch', 'localtime')", "1"),
+    "lista_spesa": ("{r}.nome", "{r}.prezzo_unitario", "date(nullif({r}.ts_aggiunta, 0), 'unixepoch', 'localtime')", "1"),
+    "spesa": ("{r}.nome", "{r}.prezzo", "date('now', 'localtime')", "{r}.eliminato = 0"),
+}
+
+# Una sola osservazione per prodotto, prezzo e giorno: le copie credenza ->
+# lista e le riscritture della stessa riga non gonfiano lo storico
+def _osserva_prezzo(tabella, r):
+    nome, prezzo, giorno, condizione = (v.format(r=r) for v in FONTI_PREZZI[tabella])
+    return f'''INSERT INTO osservazioni_prezzi (prodotto, nome, prezzo, giorno, fonte)
+               SELECT lower(trim({nome})), {nome}, {prezzo}, coalesce({giorno}, date('now', 'localtime')), '{tabella}'
+               WHERE {prezzo} > 0 AND {condizione} AND NOT EXISTS (SELECT 1 FROM osservazioni_prezzi
+                   WHERE prodotto = lower(trim({nome})) AND giorno = coalesce({giorno}, date('now', 'localtime'))
+                   AND prezzo = {prezzo})'''
+
+def _migrazione_prezzi(conn):
+    conn.execute('''CREATE TABLE osservazioni_prezzi (id INTEGER PRIMARY KEY, prodotto TEXT NOT NULL,
+                    nome TEXT NOT NULL, prezzo REAL NOT NULL CHECK (prezzo > 0), giorno TEXT NOT NULL,
+                    negozio TEXT NOT NULL DEFAULT '', fonte TEXT NOT NULL)''')
+    conn.execute("CREATE INDEX osservazioni_prezzi_prodotto ON osservazioni_prezzi (prodotto, giorno)")
+    conn.execute('''CREATE TABLE prezzi_mensili (prodotto TEXT NOT NULL, mese TEXT NOT NULL,
+                    negozio TEXT NOT NULL, osservazioni INTEGER NOT NULL, somma REAL NOT NULL,
+                    minimo REAL NOT NULL, massimo REAL NOT NULL, ultimo_giorno TEXT NOT NULL, ultimo REAL NOT NULL,
+                    PRIMARY KEY (prodotto, mese, negozio)) WITHOUT ROWID''')
+    conn.execute('''CREATE TRIGGER osservazioni_prezzi_mensili AFTER INSERT ON osservazioni_prezzi BEGIN
+                    INSERT INTO prezzi_mensili VALUES (new.prodotto, substr(new.giorno, 1, 7), new.negozio,
+                        1, new.prezzo, new.prezzo, new.prezzo, new.giorno, new.prezzo)
+                    ON CONFLICT (prodotto, mese, negozio) DO UPDATE SET
+                        osservazioni = osservazioni + 1, somma = somma + excluded.somma,
+                        minimo = min(minimo, excluded.minimo), massimo = max(massimo, excluded.massimo),
+                        ultimo = CASE WHEN excluded.ultimo_giorno >= ultimo_giorno THEN excluded.ultimo ELSE ultimo END,
+                        ultimo_giorno = max(ultimo_giorno, excluded.ultimo_giorno); END''')
+    for operazione in ("UPDATE", "DELETE"):
+        conn.execute(f'''CREATE TRIGGER osservazioni_prezzi_{operazione.lower()} BEFORE {operazione}
+                         ON osservazioni_prezzi BEGIN
+                         SELECT RAISE(ABORT, 'osservazioni_prezzi è in sola aggiunta'); END''')
+    for tabella in FONTI_PREZZI:
+        conn.execute(f'''CREATE TRIGGER {tabella}_insert_prezzi AFTER INSERT ON {tabella} BEGIN
+                         {_osserva_prezzo(tabella, "new")}; END''')
+    conn.execute(f'''CREATE TRIGGER spesa_update_prezzi AFTER UPDATE OF prezzo, eliminato ON spesa BEGIN
+                     {_osserva_prezzo("spesa", "new")}; END''')
+    # I prezzi già presenti diventano le prime osservazioni
+    for tabella in FONTI_PREZZI:
+        conn.execute(_osserva_prezzo(tabella, "t").replace(" WHERE ", f" FROM {tabella} AS t WHERE ", 1))
+
+# Registro dei movimenti di magazzino (aggiunta, consumo, spostamento, scarto):
+# è la fonte di verità, la credenza è la sua fotografia. I trigger applicano ogni
+# movimento alla fotografia nella stessa istruzione, con decrementi atomici
+# (quantita = quantita - n solo se basta) e la riga che sparisce a quota zero.
+# Gli articoli della app (un pezzo ciascuno) finiscono nel registro con fonte
+# 'articoli': servono per i consumi, la loro fotografia resta la tabella articoli.
+ADESSO_EPOCH = "CAST(strftime('%s', 'now') AS INTEGER)"
+
+def _movimento_articolo(tipo, r, origine="NULL"):
+    return f'''INSERT INTO movimenti (ts, tipo, fonte, codice, nome, quantita, scadenza, origine, destinazione)
+               VALUES ({ADESSO_EPOCH}, {tipo}, 'articoli', {r}.barcode, {r}.nome, 1, {r}.scadenza,
+                       {origine}, {r}.zona_id)'''
+
+def _migrazione_movimenti(conn):
+    conn.execute('''CREATE TABLE movimenti (id INTEGER PRIMARY KEY, ts INTEGER NOT NULL,
+                    tipo TEXT NOT NULL CHECK (tipo IN ('aggiunta', 'consumo', 'spostamento', 'scarto')),
+                    fonte TEXT NOT NULL, codice TEXT, nome TEXT NOT NULL,
+                    quantita INTEGER NOT NULL CHECK (quantita > 0), prezzo REAL, scadenza TEXT,
+                    origine TEXT, destinazione TEXT)''')
+    conn.execute("CREATE INDEX movimenti_tipo_ts ON movimenti (tipo, ts)")
+    conn.execute("CREATE INDEX movimenti_nome_ts ON movimenti (nome COLLATE NOCASE, ts)")
+    # Saldo iniziale: le righe attuali diventano aggiunte (prima dei trigger,
+    # che le sommerebbero di nuovo). Senza codice si prende 'N/A', o
+    # 'N/A-<rowid>' se per quel nome c'è già; le righe senza quantità restano
+    # alla migrazione 11, che le registra come rettifiche
+    for rowid, nome in conn.execute("SELECT rowid, nome FROM credenza WHERE codice IS NULL ORDER BY rowid").fetchall():
+        occupato = conn.execute("SELECT 1 FROM credenza WHERE codice = 'N/A' AND nome IS ?", (nome,)).fetchone()
+        conn.execute("UPDATE credenza SET codice = ? WHERE rowid = ?", (f"N/A-{rowid}" if occupato else "N/A", rowid))
+    conn.execute('''INSERT INTO movimenti (ts, tipo, fonte, codice, nome, quantita, prezzo, scadenza)
+                    SELECT ts_inserimento, 'aggiunta', 'credenza', codice, nome, quantita, prezzo, scadenza
+                    FROM credenza WHERE quantita > 0 ORDER BY ts_inserimento''')
+    conn.execute(f'''INSERT INTO movimenti (ts, tipo, fonte, codice, nome, quantita, scadenza, destinazione)
+                     SELECT {ADESSO_EPOCH}, 'aggiunta', 'articoli', barcode, nome, 1, scadenza, zona_id
+                     FROM articoli WHERE eliminato = 0''')
+    # Entrate: dalla lista (spostamento) o nuove (aggiunta). Si somma alla riga
+    # esistente invece di sostituirla.
+    conn.execute('''CREATE TRIGGER movimenti_credenza_entrata AFTER INSERT ON movimenti
+                    WHEN new.fonte = 'credenza' AND new.tipo IN ('aggiunta', 'spostamento') BEGIN
+                    UPDATE lista_spesa SET quantita = quantita - new.quantita,
+                        totale = (quantita - new.quantita) * prezzo_unitario
+                        WHERE new.origine = 'lista_spesa' AND nome = new.nome AND quantita >= new.quantita;
+                    SELECT RAISE(ABORT, 'quantità insufficiente nella lista')
+                        WHERE new.origine = 'lista_spesa' AND changes() = 0;
+                    DELETE FROM lista_spesa WHERE new.origine = 'lista_spesa' AND nome = new.nome AND quantita <= 0;
+                    INSERT INTO credenza (codice, nome, quantita, prezzo, scadenza, data_inserimento, ts_inserimento)
+                    VALUES (new.codice, new.nome, new.quantita, coalesce(new.prezzo, 0), coalesce(new.scadenza, 'N/D'),
+                            strftime('%d/%m/%Y %H:%M', new.ts, 'unixepoch', 'localtime'), new.ts)
+                    ON CONFLICT (codice, nome) DO UPDATE SET quantita = quantita + excluded.quantita,
+                        prezzo = CASE WHEN excluded.prezzo > 0 THEN excluded.prezzo ELSE prezzo END,
+                        scadenza = CASE WHEN excluded.scadenza <> 'N/D' THEN excluded.scadenza ELSE scadenza END,
+                        data_inserimento = excluded.data_inserimento, ts_inserimento = excluded.ts_inserimento;
+                    END''')
+    conn.execute('''CREATE TRIGGER movimenti_credenza_uscita AFTER INSERT ON movimenti
+                    WHEN new.fonte = 'credenza' AND new.tipo IN ('consumo', 'scarto') BEGIN
+                    UPDATE credenza SET quantita = quantita - new.quantita
+                        WHERE codice = new.codice AND nome = new.nome AND quantita >= new.quantita;
+                    SELECT RAISE(ABORT, 'quantità insufficiente') WHERE changes() = 0;
+                    DELETE FROM credenza WHERE codice = new.codice AND nome = new.nome AND quantita <= 0;
+                    END''')
+    # Il prezzo ora può cambiare anche con un UPDATE
+    conn.execute(f'''CREATE TRIGGER credenza_update_prezzi AFTER UPDATE OF prezzo ON credenza BEGIN
+                     {_osserva_prezzo("credenza", "new")}; END''')
+    # Articoli della app: la cancellazione è un consumo, o uno scarto se era scaduto
+    conn.execute(f'''CREATE TRIGGER articoli_insert_movimenti AFTER INSERT ON articoli
+                     WHEN new.eliminato = 0 BEGIN {_movimento_articolo("'aggiunta'", "new")}; END''')
+    conn.execute(f'''CREATE TRIGGER articoli_elimina_movimenti AFTER UPDATE OF eliminato ON articoli
+                     WHEN old.eliminato <> new.eliminato BEGIN {_movimento_articolo(
+                         "CASE WHEN new.eliminato = 0 THEN 'aggiunta' "
+                         "WHEN new.giorno_scadenza < date('now', 'localtime') THEN 'scarto' ELSE 'consumo' END",
+                         "new")}; END''')
+    conn.execute(f'''CREATE TRIGGER articoli_sposta_movimenti AFTER UPDATE OF zona_id ON articoli
+                     WHEN old.eliminato = 0 AND new.eliminato = 0 AND old.zona_id IS NOT new.zona_id BEGIN
+                     {_movimento_articolo("'spostamento'", "new", "old.zona_id")}; END''')
+
+def _migrazione_importazioni(conn):
+    # Punto raggiunto dalle importazioni con id, per riprenderle dopo un'interruzione
+    conn.execute('''CREATE TABLE importazioni (id TEXT PRIMARY KEY, righe INTEGER NOT NULL,
+                    importate INTEGER NOT NULL, scartate INTEGER NOT NULL, aggiornata INTEGER NOT NULL)''')
+
+def _migrazione_zone(conn):
+    # Prezzo degli articoli per il valore di ogni zona; l'indice parziale per
+    # zona copre gli aggregati (conteggi, scadenze, valore) senza leggere le
+    # righe e sostituisce quello solo su zona_id
+    conn.execute("ALTER TABLE articoli ADD COLUMN prezzo REAL")
+    conn.execute("DROP INDEX articoli_zona")
+    conn.execute('''CREATE INDEX articoli_zona_scadenza ON articoli (zona_id, giorno_scadenza, prezzo)
+                    WHERE eliminato = 0''')
+
+# 'rettifica' è un'uscita che non è né consumo né scarto: credenza svuotata a
+# mano, righe senza quantità del vecchio schema
+def _migrazione_rettifiche(conn):
+    # Il CHECK sul tipo non si modifica: la tabella si ricrea. Con
+    # legacy_alter_table il RENAME non riscrive (né convalida) i trigger di
+    # articoli, che scrivono già in "movimenti".
+    conn.execute('''CREATE TABLE movimenti_nuovi (id INTEGER PRIMARY KEY, ts INTEGER NOT NULL,
+                    tipo TEXT NOT NULL CHECK (tipo IN ('aggiunta', 'consumo', 'spostamento', 'scarto', 'rettifica')),
+                    fonte TEXT NOT NULL, codice TEXT, nome TEXT NOT NULL,
+                    quantita INTEGER NOT NULL CHECK (quantita > 0), prezzo REAL, scadenza TEXT,
+                    origine TEXT, destinazione TEXT)''')
+    conn.execute("INSERT INTO movimenti_nuovi SELECT * FROM movimenti")
+    conn.execute("DROP TABLE movimenti")
+    conn.execute("PRAGMA legacy_alter_table = ON")
+    conn.execute("ALTER TABLE movimenti_nuovi RENAME TO movimenti")
+    conn.execute("PRAGMA legacy_alter_table = OFF")
+    conn.execute("CREATE INDEX movimenti_tipo_ts ON movimenti (tipo, ts)")
+    conn.execute("CREATE INDEX movimenti_nome_ts ON movimenti (nome COLLATE NOCASE, ts)")
+    # Le righe senza quantità lasciate dalla migrazione 8 restano nella storia
+    # come aggiunta più rettifica, a saldo zero, ed escono dalla credenza come
+    # farebbe il trigger di uscita (che qui non c'è ancora)
+    conn.execute('''INSERT INTO movimenti (ts, tipo, fonte, codice, nome, quantita, prezzo, scadenza)
+                    SELECT ts_inserimento, 'aggiunta', 'credenza', codice, nome, 1, prezzo, scadenza
+                    FROM credenza WHERE coalesce(quantita, 0) <= 0 ORDER BY ts_inserimento''')
+    conn.execute('''INSERT INTO movimenti (ts, tipo, fonte, codice, nome, quantita)
+                    SELECT ts_inserimento, 'rettifica', 'credenza', codice, nome, 1
+                    FROM credenza WHERE coalesce(quantita, 0) <= 0 ORDER BY ts_inserimento''')
+    conn.execute("DELETE FROM credenza WHERE coalesce(quantita, 0) <= 0")
+    conn.execute('''CREATE TRIGGER movimenti_credenza_entrata AFTER INSERT ON movimenti
+                    WHEN new.fonte = 'credenza' AND new.tipo IN ('aggiunta', 'spostamento') BEGIN
+                    UPDATE lista_spesa SET quantita = quantita - new.quantita,
+                        totale = (quantita - new.quantita) * prezzo_unitario
+                        WHERE new.origine = 'lista_spesa' AND nome = new.nome AND quantita >= new.quantita;
+                    SELECT RAISE(ABORT, 'quantità insufficiente nella lista')
+                        WHERE new.origine = 'lista_spesa' AND changes() = 0;
+                    DELETE FROM lista_spesa WHERE new.origine = 'lista_spesa' AND nome = new.nome AND quantita <= 0;
+                    INSERT INTO credenza (codice, nome, quantita, prezzo, scadenza, data_inserimento, ts_inserimento)
+                    VALUES (new.codice, new.nome, new.quantita, coalesce(new.prezzo, 0), coalesce(new.scadenza, 'N/D'),
+                            strftime('%d/%m/%Y %H:%M', new.ts, 'unixepoch', 'localtime'), new.ts)
+                    ON CONFLICT (codice, nome) DO UPDATE SET quantita = quantita + excluded.quantita,
+                        prezzo = CASE WHEN excluded.prezzo > 0 THEN excluded.prezzo ELSE prezzo END,
+                        scadenza = CASE WHEN excluded.scadenza <> 'N/D' THEN excluded.scadenza ELSE scadenza END,
+                        data_inserimento = excluded.data_inserimento, ts_inserimento = excluded.ts_inserimento;
+                    END''')
+    conn.execute('''CREATE TRIGGER movimenti_credenza_uscita AFTER INSERT ON movimenti
+                    WHEN new.fonte = 'credenza' AND new.tipo IN ('consumo', 'scarto', 'rettifica') BEGIN
+                    UPDATE credenza SET quantita = quantita - new.quantita
+                        WHERE codice = new.codice AND nome = new.nome AND quantita >= new.quantita;
+                    SELECT RAISE(ABORT, 'quantità insufficiente') WHERE changes() = 0;
+                    DELETE FROM credenza WHERE codice = new.codice AND nome = new.nome AND quantita <= 0;
+                    END''')
+
+# Lotti: una riga di credenza per codice, nome e scadenza, così un consumo
+# parte dal lotto che scade prima e uno scarto tocca solo i lotti scaduti. Le
+# uscite indicano il lotto; un'uscita o un'entrata senza scadenza è del lotto
+# 'N/D'. Prima le righe erano una per prodotto, con l'ultima scadenza vista.
+def _giorno_scadenza(conn, scadenza):
+    return conn.execute(f"SELECT {GIORNO_SCADENZA} FROM (SELECT ? AS scadenza)", (scadenza,)).fetchone()[0]
+
+def _migrazione_lotti(conn):
+    conn.execute("DROP TRIGGER movimenti_credenza_entrata")
+    conn.execute("DROP TRIGGER movimenti_credenza_uscita")
+    # La storia di ogni prodotto si ripercorre nel registro: le entrate
+    # riempiono il lotto della loro scadenza, le uscite (che non lo dicevano)
+    # prendono dal lotto che scade prima e ne ricevono la scadenza, divise in
+    # più movimenti se attraversano più lotti.
+    prodotti = {}
+    for id_movimento, ts, tipo, codice, nome, quantita, prezzo, scadenza in conn.execute(
+            '''SELECT id, ts, tipo, codice, nome, quantita, prezzo, scadenza FROM movimenti
+               WHERE fonte = 'credenza' ORDER BY id''').fetchall():
+        lotti = prodotti.setdefault((codice, nome), {})
+        if tipo in ("aggiunta", "spostamento"):
+            lotto = lotti.setdefault(scadenza or "N/D", {"quantita": 0, "prezzo": 0, "ts": ts})
+            lotto["quantita"] += quantita
+            lotto["prezzo"] = prezzo if prezzo and prezzo > 0 else lotto["prezzo"]
+            lotto["ts"] = ts
+            continue
+        parti = []
+        for chiave in sorted((k for k, l in lotti.items() if l["quantita"] > 0),
+                             key=lambda k: (_giorno_scadenza(conn, k) is None, _giorno_scadenza(conn, k) or "",
+                                            lotti[k]["ts"])):
+            presa = min(quantita - sum(n for _, n in parti), lotti[chiave]["quantita"])
+            lotti[chiave]["quantita"] -= presa
+            parti.append((chiave, presa))
+            if sum(n for _, n in parti) == quantita:
+                break
+        # Un registro che non torna lascia il resto sull'ultimo lotto
+        if not parti:
+            parti = [("N/D", quantita)]
+        resto = quantita - sum(n for _, n in parti)
+        parti[-1] = (parti[-1][0], parti[-1][1] + resto)
+        conn.execute("UPDATE movimenti SET scadenza = ?, quantita = ? WHERE id = ?", (*parti[0], id_movimento))
+        conn.executemany('''INSERT INTO movimenti (ts, tipo, fonte, codice, nome, quantita, scadenza)
+                            VALUES (?, ?, 'credenza', ?, ?, ?, ?)''',
+                         [(ts, tipo, codice, nome, n, chiave) for chiave, n in parti[1:]])
+    conn.execute(f'''CREATE TABLE credenza_lotti (codice TEXT, nome TEXT, quantita INTEGER DEFAULT 0,
+                     prezzo REAL DEFAULT 0, scadenza TEXT NOT NULL DEFAULT 'N/D', data_inserimento TEXT,
+                     ts_inserimento INTEGER NOT NULL DEFAULT 0,
+                     giorno_scadenza TEXT GENERATED ALWAYS AS ({GIORNO_SCADENZA}) VIRTUAL,
+                     PRIMARY KEY (codice, nome, scadenza))''')
+    # Una riga che torna con il registro diventa i suoi lotti; una che non
+    # torna resta com'è (la riallinea ricostruisci-credenza)
+    for codice, nome, quantita, prezzo, scadenza, data_inserimento, ts_inserimento in conn.execute(
+            '''SELECT codice, nome, quantita, prezzo, scadenza, data_inserimento, ts_inserimento
+               FROM credenza ORDER BY rowid''').fetchall():
+        lotti = {k: l for k, l in prodotti.get((codice, nome), {}).items() if l["quantita"] > 0}
+        if sum(l["quantita"] for l in lotti.values()) != quantita:
+            lotti = {scadenza or "N/D": {"quantita": quantita, "prezzo": prezzo, "ts": ts_inserimento}}
+        for chiave, lotto in lotti.items():
+            conn.execute('''INSERT INTO credenza_lotti (codice, nome, quantita, prezzo, scadenza,
+                            data_inserimento, ts_inserimento) VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                         (codice, nome, lotto["quantita"], lotto["prezzo"] or prezzo, chiave,
+                          data_inserimento if len(lotti) == 1 else
+                          datetime.fromtimestamp(lotto["ts"]).strftime("%d/%m/%Y %H:%M"),
+                          ts_inserimento if len(lotti) == 1 else lotto["ts"]))
+    # Indici e trigger della vecchia tabella si ricreano uguali, tranne il
+    # registro modifiche che ora annota anche la scadenza
+    log = ("credenza_insert_log", "credenza_update_log", "credenza_delete_log", "credenza_update_chiave_log")
+    ricreare = [sql for nome, sql in conn.execute(
+        '''SELECT name, sql FROM sqlite_master WHERE tbl_name = 'credenza' AND type IN ('index', 'trigger')
+           AND sql IS NOT NULL ORDER BY type, rowid''').fetchall() if nome not in log]
+    conn.execute("DROP TABLE credenza")
+    conn.execute("PRAGMA legacy_alter_table = ON")
+    conn.execute("ALTER TABLE credenza_lotti RENAME TO credenza")
+    conn.execute("PRAGMA legacy_alter_table = OFF")
+    for sql in ricreare:
+        conn.execute(sql)
+    conn.execute("ALTER TABLE modifiche ADD COLUMN scadenza TEXT")
+    for evento, riga in (('INSERT', 'new'), ('UPDATE', 'new'), ('DELETE', 'old')):
+        conn.execute(f'''CREATE TRIGGER credenza_{evento.lower()}_log AFTER {evento} ON credenza BEGIN
+                         INSERT INTO modifiche (tabella, codice, nome, scadenza)
+                         VALUES ('credenza', {riga}.codice, {riga}.nome, {riga}.scadenza); END''')
+    conn.execute('''CREATE TRIGGER credenza_update_chiave_log AFTER UPDATE OF codice, nome, scadenza ON credenza
+                    WHEN old.codice IS NOT new.codice OR old.nome IS NOT new.nome OR old.scadenza IS NOT new.scadenza
+                    BEGIN INSERT INTO modifiche (tabella, codice, nome, scadenza)
+                    VALUES ('credenza', old.codice, old.nome, old.scadenza); END''')
+    # Le chiavi registrate finora non dicono il lotto: i client ricaricano tutto
+    conn.execute("DELETE FROM modifiche")
+    conn.execute("UPDATE sqlite_sequence SET seq = seq + 1 WHERE name = 'modifiche'")
+    ricostruisci_ricerca(conn)
+    conn.execute('''CREATE TRIGGER movimenti_credenza_entrata AFTER INSERT ON movimenti
+                    WHEN new.fonte = 'credenza' AND new.tipo IN ('aggiunta', 'spostamento') BEGIN
+                    UPDATE lista_spesa SET quantita = quantita - new.quantita,
+                        totale = (quantita - new.quantita) * prezzo_unitario
+                        WHERE new.origine = 'lista_spesa' AND nome = new.nome AND quantita >= new.quantita;
+                    SELECT RAISE(ABORT, 'quantità insufficiente nella lista')
+                        WHERE new.origine = 'lista_spesa' AND changes() = 0;
+                    DELETE FROM lista_spesa WHERE new.origine = 'lista_spesa' AND nome = new.nome AND quantita <= 0;
+                    INSERT INTO credenza (codice, nome, quantita, prezzo, scadenza, data_inserimento, ts_inserimento)
+                    VALUES (new.codice, new.nome, new.quantita, coalesce(new.prezzo, 0), coalesce(new.scadenza, 'N/D'),
+                            strftime('%d/%m/%Y %H:%M', new.ts, 'unixepoch', 'localtime'), new.ts)
+                    ON CONFLICT (codice, nome, scadenza) DO UPDATE SET quantita = quantita + excluded.quantita,
+                        prezzo = CASE WHEN excluded.prezzo > 0 THEN excluded.prezzo ELSE prezzo END,
+                        data_inserimento = excluded.data_inserimento, ts_inserimento = excluded.ts_inserimento;
+                    END''')
+    conn.execute('''CREATE TRIGGER movimenti_credenza_uscita AFTER INSERT ON movimenti
+                    WHEN new.fonte = 'credenza' AND new.tipo IN ('consumo', 'scarto', 'rettifica') BEGIN
+                    UPDATE credenza SET quantita = quantita - new.quantita
+                        WHERE codice = new.codice AND nome = new.nome AND scadenza = coalesce(new.scadenza, 'N/D')
+                        AND quantita >= new.quantita;
+                    SELECT RAISE(ABORT, 'quantità insufficiente') WHERE changes() = 0;
+                    DELETE FROM credenza WHERE codice = new.codice AND nome = new.nome
+                        AND scadenza = coalesce(new.scadenza, 'N/D') AND quantita <= 0;
+                    END''')
+
+def _migrazione_elenco_scadenze(conn):
+    # /elenco ordina per scadenza normalizzata: l'indice sul testo grezzo
+    # (misto di 'N/D', GG/MM/AAAA e ISO) non serve più
+    conn.execute("DROP INDEX credenza_scadenza")
+    conn.execute(f"CREATE INDEX credenza_scadenza_elenco ON credenza ({SCADENZA_ELENCO})")
+
+# Schema versionato con PRAGMA user_version: la migrazione N porta alla versione N
+MIGRAZIONI = [_migrazione_timestamp, _migrazione_app, _migrazione_prodotti, _migrazione_famiglie,
+              _migrazione_scadenze, _migrazione_ricerca, _migrazione_prezzi, _migrazione_movimenti,
+              _migrazione_importazioni, _migrazione_zone, _migrazione_rettifiche, _migrazione_nomi_ricerca,
+              _migrazione_lotti, _migrazione_elenco_scadenze]
+
+def migra(conn):
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        # Riletta dentro la transazione: più worker possono partire insieme
+        versione = conn.execute("PRAGMA user_version").fetchone()[0]
+        if versione >= len(MIGRAZIONI):
+            conn.execute("COMMIT")
+            return
+        try:
+            MIGRAZIONI[versione](conn)
+            conn.execute(f"PRAGMA user_version = {versione + 1}")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+# Ricostruisce gli aggregati da zero: a ogni prepara-db copre le scritture
+# fatte da connessioni esterne senza recursive_triggers
+def ricalcola_statistiche(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute('''INSERT OR REPLACE INTO statistiche (tabella, items, quantita, valore)
+                    SELECT 'credenza', COUNT(*), COALESCE(SUM(quantita), 0),
+                           COALESCE(SUM(prezzo * quantita), 0) FROM credenza''')
+    conn.execute('''INSERT OR REPLACE INTO statistiche (tabella, items, quantita, valore)
+                    SELECT 'lista_spesa', COUNT(*), COALESCE(SUM(quantita), 0),
+                           COALESCE(SUM(totale), 0) FROM lista_spesa''')
+    conn.execute("COMMIT")
+
+def versione_corrente(conn):
+    # sqlite_sequence conserva l'ultima versione anche dopo la potatura del registro
+    riga = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='modifiche'").fetchone()
+    return riga[0] if riga else 0
+
+def calcola_stats(conn, tabella):
+    n, quantita, valore = conn.execute(
+        "SELECT items, quantita, valore FROM statistiche WHERE tabella=?", (tabella,)).fetchone()
+    if not n:
+        return {}
+    if tabella == "credenza":
+        return {"totale_items": n, "totale_quantita": quantita, "valore_totale": round(valore, 2)}
+    return {"totale_items": n, "totale_quantita": quantita, "totale_costo": round(valore, 2)}
+
+# Bus pub/sub del processo: chi scrive pubblica la nuova versione del suo
+# database, gli stream SSE aspettano sulla Condition senza consumare CPU
+_bus = threading.Condition()
+_bus_stato = {"versioni": {}, "ascoltatori": {}, "osservatore": None}
+
+def pubblica(percorso, versione):
+    with _bus:
+        if versione > _bus_stato["versioni"].get(percorso, 0):
+            _bus_stato["versioni"][percorso] = versione
+            _bus.notify_all()
+            if _asincrono["hub"] is not None:
+                _asincrono["hub"].loop.run_callback_threadsafe(_sveglia_greenlet)
+
+def attendi_versione(percorso, dopo, timeout):
+    if _nel_hub():
+        return _attendi_versione_greenlet(percorso, dopo, timeout)
+    with _bus:
+        _bus_stato["ascoltatori"][percorso] = _bus_stato["ascoltatori"].get(percorso, 0) + 1
+        try:
+            _bus.wait_for(lambda: _bus_stato["versioni"].get(percorso, 0) > dopo, timeout)
+            return _bus_stato["versioni"].get(percorso, 0)
+        finally:
+            _bus_stato["ascoltatori"][percorso] -= 1
+            if not _bus_stato["ascoltatori"][percorso]:
+                del _bus_stato["ascoltatori"][percorso]
+
+def _osserva_cursore():
+    # Le scritture degli altri worker gunicorn arrivano solo tramite il
+    # database: un unico thread per processo legge il cursore dei database
+    # che qualcuno sta ascoltando e le ripubblica
+    while True:
+        with _bus:
+            percorsi = list(_bus_stato["ascoltatori"])
+        for percorso in percorsi:
+            try:
+                pubblica(percorso, versione_corrente(get_conn(percorso)))
+            except sqlite3.OperationalError:
+                pass
+        time.sleep(INTERVALLO_CURSORE)
+
+def avvia_osservatore():
+    with _bus:
+        if _bus_stato["osservatore"] is None:
+            t = threading.Thread(target=_osserva_cursore, name="osservatore-modifiche", daemon=True)
+            _bus_stato["osservatore"] = t
+            t.start()
+
+# Modalità asincrona (gunicorn.conf.py con CRENZA_ASYNC=1): worker gevent con
+# i soli socket cooperativi. L'hub tiene le connessioni dei client, anche
+# migliaia di stream SSE fermi; tutto ciò che tocca SQLite (la richiesta Flask
+# e la lettura del corpo della risposta) gira in un pool limitato di thread
+# nativi, dove valgono le connessioni per thread di get_conn.
+THREAD_SQLITE = int(os.environ.get("CRENZA_THREAD_SQLITE", 8))
+DURATA_MAX_SSE = 600
+SPOOL_CORPO = 1024 * 1024   # oltre, il corpo della richiesta finisce su file
+_asincrono = {"pool": None, "hub": None, "thread_hub": None, "segnale": None}
+
+def _gevent_attivo():
+    monkey = sys.modules.get("gevent.monkey")
+    return monkey is not None and monkey.is_module_patched("socket")
+
+def _nel_hub():
+    return _asincrono["hub"] is not None and threading.get_ident() == _asincrono["thread_hub"]
+
+def _pool_sqlite():
+    if _asincrono["pool"] is None:
+        import gevent.event
+        import gevent.threadpool
+        _asincrono["segnale"] = gevent.event.Event()
+        _asincrono["thread_hub"] = threading.get_ident()
+        _asincrono["pool"] = gevent.threadpool.ThreadPool(THREAD_SQLITE)
+        _asincrono["hub"] = gevent.get_hub()
+    return _asincrono["pool"]
+
+def _sveglia_greenlet():
+    # Gira nell'hub: sveglia chi aspetta e prepara il segnale successivo
+    segnale, _asincrono["segnale"] = _asincrono["segnale"], type(_asincrono["segnale"])()
+    segnale.set()
+
+def _attendi_versione_greenlet(percorso, dopo, timeout):
+    # Come attendi_versione, ma senza bloccare l'hub sulla Condition
+    fine = time.monotonic() + timeout
+    with _bus:
+        _bus_stato["ascoltatori"][percorso] = _bus_stato["ascoltatori"].get(percorso, 0) + 1
+    try:
+        while True:
+            segnale = _asincrono["segnale"]
+            versione = _bus_stato["versioni"].get(percorso, 0)
+            rimasto = fine - time.monotonic()
+            if versione > dopo or rimasto <= 0:
+                return versione
+            segnale.wait(rimasto)
+    finally:
+        with _bus:
+            _bus_stato["ascoltatori"][percorso] -= 1
+            if not _bus_stato["ascoltatori"][percorso]:
+                del _bus_stato["ascoltatori"][percorso]
+
+def _leggi_corpo(environ):
+    # Il corpo si legge nell'hub, prima di passare la richiesta al pool
+    lunghezza = environ.get("CONTENT_LENGTH")
+    if not lunghezza and environ.get("HTTP_TRANSFER_ENCODING", "").lower() != "chunked":
+        return
+    corpo = tempfile.SpooledTemporaryFile(SPOOL_CORPO)
+    ingresso = environ["wsgi.input"]
+    try:
+        while True:
+            blocco = ingresso.read(BLOCCO_ESPORTAZIONE)
+            if not blocco:
+                break
+            corpo.write(blocco)
+    except OSError:
+        # Client caduto a metà: /importa registra comunque quanto è arrivato
+        pass
+    environ["CONTENT_LENGTH"] = str(corpo.tell())
+    environ.pop("HTTP_TRANSFER_ENCODING", None)
+    environ["wsgi.input_terminated"] = False
+    corpo.seek(0)
+    environ["wsgi.input"] = corpo
+
+def servizio_asincrono(wsgi_app):
+    def servi(environ, start_response):
+        if not _gevent_attivo():
+            return wsgi_app(environ, start_response)
+        pool = _pool_sqlite()
+        _leggi_corpo(environ)
+        stato = []
+
+        def registra(status, headers, exc_info=None):
+            stato[:] = [status, headers, exc_info]
+            return lambda dati: None
+
+        def avvia():
+            corpo = wsgi_app(environ, registra)
+            iteratore = iter(corpo)
+            if _sse(stato[1]):
+                return corpo, iteratore, None
+            return corpo, iteratore, next(iteratore, None)
+
+        corpo, iteratore, primo = pool.apply(avvia)
+        start_response(*stato)
+        # Gli stream SSE aspettano nell'hub senza occupare un thread
+        if _sse(stato[1]):
+            return corpo
+
+        def avanza():
+            blocco = next(iteratore, None)
+            if blocco is None and hasattr(corpo, "close"):
+                corpo.close()
+            return blocco
+
+        def blocchi():
+            blocco = primo
+            try:
+                while blocco is not None:
+                    yield blocco
+                    blocco = pool.apply(avanza)
+            finally:
+                if blocco is not None and hasattr(corpo, "close"):
+                    pool.apply(corpo.close)
+        return blocchi()
+    return servi
+
+def _sse(headers):
+    return any(k.lower() == "content-type" and v.startswith("text/event-stream") for k, v in headers)
+
+# Righe inserite/aggiornate/rimosse dopo la versione `since`. Restituisce None
+# se il registro non copre più quella versione: il client deve ricaricare tutto.
+def get_modifiche(since):
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
+    versione = versione_corrente(conn)
+    minima = conn.execute("SELECT MIN(versione) FROM modifiche").fetchone()[0]
+    if since > versione or (since < versione and (minima is None or since < minima - 1)):
+        return None
+
+    righe_credenza = cur.execute('''SELECT m.codice AS chiave_codice, m.nome AS chiave_nome,
+        m.scadenza AS chiave_scadenza, c.*
+        FROM (SELECT DISTINCT codice, nome, scadenza FROM modifiche
+              WHERE tabella='credenza' AND versione > ?) m
+        LEFT JOIN credenza c ON c.codice = m.codice AND c.nome = m.nome AND c.scadenza = m.scadenza''',
+        (since,)).fetchall()
+    righe_lista = cur.execute('''SELECT m.nome AS chiave_nome, l.*
+        FROM (SELECT DISTINCT nome FROM modifiche
+              WHERE tabella='lista_spesa' AND versione > ?) m
+        LEFT JOIN lista_spesa l ON l.nome = m.nome''', (since,)).fetchall()
+
+    # Una chiave registrata ma assente dalla tabella è stata cancellata
+    credenza = {"aggiornati": [], "rimossi": [], "stats": calcola_stats(conn, "credenza")}
+    for r in righe_credenza:
+        if r["nome"] is None:
+            credenza["rimossi"].append({"codice": r["chiave_codice"], "nome": r["chiave_nome"],
+                                        "scadenza": r["chiave_scadenza"]})
+        else:
+            credenza["aggiornati"].append({k: r[k] for k in r.keys()[3:]})
+    lista = {"aggiornati": [], "rimossi": [], "stats": calcola_stats(conn, "lista_spesa")}
+    for r in righe_lista:
+        if r["nome"] is None:
+            lista["rimossi"].append({"nome": r["chiave_nome"]})
+        else:
+            lista["aggiornati"].append({k: r[k] for k in r.keys()[1:]})
+
+    return {"versione": versione, "completo": False, "credenza": credenza, "lista_spesa": lista}
+
+def _righe(cur, blocco=500):
+    colonne = [d[0] for d in cur.description]
+    while True:
+        righe = cur.fetchmany(blocco)
+        if not righe:
+            return
+        yield [dict(zip(colonne, r)) for r in righe]
+
 def get_dati():
-    conn = sqlite3.connect(DB_FILE)
-    df_credenza = pd.read_sql_query("SELECT * FROM credenza ORDER BY data_inserimento DESC", conn)
-    df_lista = pd.read_sql_query("SELECT * FROM lista_spesa ORDER BY data_aggiunta DESC", conn)
-    conn.close()
-    
-    stats_credenza = {}
-    if not df_credenza.empty:
-        stats_credenza = {
-            "totale_items": len(df_credenza),
-            "totale_quantita": int(df_credenza['quantita'].sum()),
-            "valore_totale": round((df_credenza['prezzo'] * df_credenza['quantita']).sum(), 2)
-        }
-    
-    stats_lista = {}
-    if not df_lista.empty:
-        stats_lista = {
-            "totale_items": len(df_lista),
-            "totale_costo": round(df_lista['totale'].sum(), 2)
-        }
-    
+    conn = get_conn()
+    versione = versione_corrente(conn)
+    credenza = conn.execute("SELECT * FROM credenza ORDER BY ts_inserimento DESC")
+    lista = conn.execute("SELECT * FROM lista_spesa ORDER BY ts_aggiunta DESC")
     return {
-        "credenza": {"items": df_credenza.to_dict('records'), "stats": stats_credenza},
-        "lista_spesa": {"items": df_lista.to_dict('records'), "stats": stats_lista}
+        "versione": versione,
+        "completo": True,
+        "credenza": {"items": [r for b in _righe(credenza) for r in b],
+                     "stats": calcola_stats(conn, "credenza")},
+        "lista_spesa": {"items": [r for b in _righe(lista) for r in b],
+                        "stats": calcola_stats(conn, "lista_spesa")}
     }
 
+# Stesso contenuto di get_dati() ma serializzato un blocco di righe alla volta
+# direttamente dal cursore, senza tenere in memoria le tabelle intere. Lo
+# stream ha una connessione sua: non dipende dal thread né dalla richiesta.
+def stream_dati(percorso):
+    conn = apri_connessione(percorso, condivisa=True)
+    try:
+        conn.execute("BEGIN")
+        versione = versione_corrente(conn)
+        yield f'{{"versione": {versione}, "completo": true'
+        for tabella, ordine in (("credenza", "ts_inserimento"), ("lista_spesa", "ts_aggiunta")):
+            yield f', "{tabella}": {{"stats": {json.dumps(calcola_stats(conn, tabella))}, "items": ['
+            cur = conn.execute(f"SELECT * FROM {tabella} ORDER BY {ordine} DESC")
+            primo = True
+            for blocco in _righe(cur):
+                testo = ", ".join(json.dumps(r) for r in blocco)
+                yield testo if primo else ", " + testo
+                primo = False
+            yield ']}'
+        yield '}'
+    finally:
+        conn.close()
+
+# Corpi di /dati già serializzati, per famiglia e since, validi finché il
+# cursore delle modifiche resta alla stessa versione. Il cursore sta nel
+# database (lo muovono i trigger), quindi la cache resta corretta anche con
+# le scritture degli altri worker o di processi esterni. Limite in byte con
+# scarto della voce usata meno di recente; un corpo oltre un quarto del
+# limite non entra.
+MAX_CACHE_DATI = int(os.environ.get("CRENZA_CACHE_DATI_MB", 64)) * 1024 * 1024
+_cache_dati = OrderedDict()
+_cache_dati_lock = threading.Lock()
+_cache_dati_stato = {"byte": 0, "hit": 0, "miss": 0, "scartate": 0}
+
+def _byte_voce(voce):
+    return sum(len(v) for v in voce[1].values())
+
+def leggi_cache_dati(percorso, since, versione):
+    chiave = (percorso, since)
+    with _cache_dati_lock:
+        voce = _cache_dati.get(chiave)
+        if voce is not None and voce[0] == versione:
+            _cache_dati.move_to_end(chiave)
+            _cache_dati_stato["hit"] += 1
+            return voce[1]
+        if voce is not None and voce[0] < versione:
+            del _cache_dati[chiave]
+            _cache_dati_stato["byte"] -= _byte_voce(voce)
+        _cache_dati_stato["miss"] += 1
+        return None
+
+def salva_cache_dati(percorso, since, versione, varianti):
+    voce = (versione, varianti)
+    if _byte_voce(voce) > MAX_CACHE_DATI // 4:
+        return
+    chiave = (percorso, since)
+    with _cache_dati_lock:
+        vecchia = _cache_dati.get(chiave)
+        if vecchia is not None:
+            if vecchia[0] > versione:
+                return
+            _cache_dati_stato["byte"] -= _byte_voce(vecchia)
+        _cache_dati[chiave] = voce
+        _cache_dati.move_to_end(chiave)
+        _cache_dati_stato["byte"] += _byte_voce(voce)
+        while _cache_dati_stato["byte"] > MAX_CACHE_DATI:
+            _, scartata = _cache_dati.popitem(last=False)
+            _cache_dati_stato["byte"] -= _byte_voce(scartata)
+            _cache_dati_stato["scartate"] += 1
+
+def stats_cache_dati():
+    with _cache_dati_lock:
+        return {"voci": len(_cache_dati), "max_byte": MAX_CACHE_DATI, **_cache_dati_stato}
+
+# Passa i blocchi di stream_dati al client e, se il corpo intero sta nel
+# limite, alla fine lo mette in cache
+def _conserva_dati(blocchi, percorso, versione):
+    parti, dimensione = [], 0
+    for blocco in blocchi:
+        blocco = blocco.encode()
+        dimensione += len(blocco)
+        if dimensione <= MAX_CACHE_DATI // 4:
+            parti.append(blocco)
+        yield blocco
+    if dimensione <= MAX_CACHE_DATI // 4:
+        salva_cache_dati(percorso, None, versione, {"identity": b"".join(parti)})
+
+# Colonne (espressioni indicizzate) su cui /elenco può ordinare
+# Scadenza normalizzata, con le righe senza data in fondo (in cima se
+# discendente, come NULLS LAST / NULLS FIRST di PostgreSQL)
+SCADENZA_ELENCO = "coalesce(giorno_scadenza, '9999-12-31')"
+ORDINAMENTI = {
+    "credenza": {"scadenza": SCADENZA_ELENCO, "nome": "nome COLLATE NOCASE",
+                 "valore": "prezzo * quantita", "inserimento": "ts_inserimento"},
+    "lista_spesa": {"nome": "nome COLLATE NOCASE", "valore": "totale",
+                    "inserimento": "ts_aggiunta"},
+}
+LIMITE_ELENCO = 50
+LIMITE_ELENCO_MAX = 500
+
+def _codifica_cursore(valori):
+    return base64.urlsafe_b64encode(json.dumps(valori).encode()).decode()
+
+def _decodifica_cursore(testo):
+    try:
+        chiave, rowid = json.loads(base64.urlsafe_b64decode(testo.encode()))
+        return chiave, int(rowid)
+    except (ValueError, TypeError):
+        raise ValueError("cursore non valido")
+
+# Paginazione a cursore (keyset): `after` è la coppia (chiave di ordinamento,
+# rowid) dell'ultima riga della pagina precedente, quindi ogni pagina è una
+# scansione di indice a partire da quel punto, senza OFFSET
+def elenca(tabella, ordina="-inserimento", limit=LIMITE_ELENCO, after=None, prefisso=None, ean=None):
+    if tabella not in ORDINAMENTI:
+        raise ValueError(f"tabella sconosciuta: {tabella}")
+    discendente = ordina.startswith("-")
+    espressione = ORDINAMENTI[tabella].get(ordina.lstrip("-"))
+    if espressione is None:
+        raise ValueError(f"ordinamento non supportato: {ordina}")
+    limit = max(1, min(int(limit), LIMITE_ELENCO_MAX))
+
+    condizioni, parametri = [], []
+    if prefisso:
+        condizioni.append("nome COLLATE NOCASE >= ? AND nome COLLATE NOCASE < ?")
+        parametri += [prefisso, prefisso + chr(0x10FFFF)]
+    if ean:
+        if tabella != "credenza":
+            raise ValueError("il filtro ean vale solo per la credenza")
+        condizioni.append("codice = ?")
+        parametri.append(ean)
+    if after:
+        chiave, rowid = _decodifica_cursore(after)
+        # Equivale a (chiave, rowid) > (?, ?), ma scritto così SQLite usa
+        # l'indice anche sulle espressioni e sulle colonne COLLATE NOCASE
+        op = "<" if discendente else ">"
+        condizioni.append(f"{espressione} {op}= ? AND ({espressione} {op} ? OR rowid {op} ?)")
+        parametri += [chiave, chiave, rowid]
+    where = f"WHERE {' AND '.join(condizioni)}" if condizioni else ""
+    verso = "DESC" if discendente else "ASC"
+
+    cur = get_conn().execute(
+        f"SELECT {espressione} AS _chiave, rowid AS _rowid, * FROM {tabella} {where} "
+        f"ORDER BY {espressione} {verso}, rowid {verso} LIMIT ?", parametri + [limit + 1])
+    righe = [r for b in _righe(cur) for r in b]
+    successivo = None
+    if len(righe) > limit:
+        righe = righe[:limit]
+        successivo = _codifica_cursore([righe[-1]["_chiave"], righe[-1]["_rowid"]])
+    for r in righe:
+        del r["_chiave"], r["_rowid"]
+    return {"items": righe, "successivo": successivo}
+
+# Le scritture sulla credenza sono movimenti: i trigger del registro
+# aggiornano la fotografia (vedi _migrazione_movimenti)
+SQL_AGGIUNGI_CREDENZA = '''INSERT INTO movimenti (ts, tipo, fonte, codice, nome, quantita, prezzo, scadenza)
+    VALUES (?, 'aggiunta', 'credenza', ?, ?, ?, ?, ?)'''
+# Consuma dai lotti che scadono prima, un movimento per lotto toccato (i
+# lotti si leggono tutti prima delle scritture dei trigger). Se in tutto non
+# basta, la prima riga ha il codice NULL e il trigger annulla l'operazione.
+SQL_CONSUMA_CREDENZA = '''INSERT INTO movimenti (ts, tipo, fonte, codice, nome, quantita, scadenza)
+    SELECT ?3, 'consumo', 'credenza', NULL, ?1, ?2, NULL
+        WHERE (SELECT coalesce(sum(quantita), 0) FROM credenza WHERE nome = ?1) < ?2
+    UNION ALL
+    SELECT ?3, 'consumo', 'credenza', codice, nome, min(quantita, ?2 - prima), scadenza FROM (
+        SELECT codice, nome, quantita, scadenza, sum(quantita) OVER (ORDER BY giorno_scadenza IS NULL,
+            giorno_scadenza, ts_inserimento, rowid ROWS UNBOUNDED PRECEDING) - quantita AS prima
+        FROM credenza WHERE nome = ?1) WHERE prima < ?2'''
+# Tutto quello che resta dei lotti scelti, come consumo, scarto o rettifica
+SQL_ESAURISCI_CREDENZA = '''INSERT INTO movimenti (ts, tipo, fonte, codice, nome, quantita, scadenza)
+    SELECT ?, ?, 'credenza', codice, nome, quantita, scadenza FROM credenza WHERE {condizione}'''
+# Dalla lista alla credenza (comprato): tutta la quantità in lista se non indicata
+SQL_COMPRA = '''INSERT INTO movimenti (ts, tipo, fonte, codice, nome, quantita, prezzo, origine)
+    SELECT ?3, 'spostamento', 'credenza', coalesce((SELECT codice FROM credenza WHERE nome = ?1
+        ORDER BY ts_inserimento DESC LIMIT 1), 'N/A'), nome, coalesce(?2, quantita), prezzo_unitario, 'lista_spesa'
+    FROM lista_spesa WHERE nome = ?1'''
+SQL_AGGIUNGI_LISTA = '''INSERT OR REPLACE INTO lista_spesa 
+    (nome, quantita, prezzo_unitario, totale, data_aggiunta, ts_aggiunta) 
+    VALUES (?, ?, ?, ?, ?, ?)'''
+# Copia dalla credenza alla lista (1 unità) leggendo il prezzo nella stessa istruzione
+SQL_DA_CREDENZA_A_LISTA = '''INSERT OR REPLACE INTO lista_spesa 
+    (nome, quantita, prezzo_unitario, totale, data_aggiunta, ts_aggiunta) 
+    SELECT ?1, 1, p, p, ?2, ?3 FROM (SELECT COALESCE((SELECT prezzo FROM credenza WHERE nome = ?1
+        ORDER BY ts_inserimento DESC LIMIT 1), 0) AS p)'''
+TABELLE = ("credenza", "lista_spesa")
+
+def _riga_credenza(codice, nome, quantita, prezzo, scadenza, adesso):
+    return (int(adesso.timestamp()), codice or "N/A", nome, int(quantita), float(prezzo or 0), scadenza or "N/D")
+
+def _riga_lista(nome, quantita, prezzo_unitario, adesso):
+    totale = float(quantita) * float(prezzo_unitario or 0)
+    return (nome, int(quantita), float(prezzo_unitario or 0), totale,
+            adesso.strftime("%d/%m/%Y %H:%M"), int(adesso.timestamp()))
+
 def aggiungi_item(codice, nome, quantita, prezzo, scadenza):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute('''INSERT OR REPLACE INTO credenza 
-                 (codice, nome, quantita, prezzo, scadenza, data_inserimento) 
-                 VALUES (?, ?, ?, ?, ?, ?)''',
-              (codice or "N/A", nome, int(quantita), float(prezzo or 0), 
-               scadenza or "N/D", datetime.now().strftime("%d/%m/%Y %H:%M")))
-    conn.commit()
-    conn.close()
+    riga = _riga_credenza(codice, nome, quantita, prezzo, scadenza, datetime.now())
+    with transazione() as conn:
+        conn.execute(SQL_AGGIUNGI_CREDENZA, riga)
+
+def scarta_scaduti():
+    with transazione() as conn:
+        return conn.execute(SQL_ESAURISCI_CREDENZA.format(condizione="giorno_scadenza < date('now', 'localtime')"),
+                            (int(time.time()), "scarto")).rowcount
 
 def rimuovi_item(nome, tabella="credenza"):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute(f"DELETE FROM {tabella} WHERE nome=?", (nome,))
-    conn.commit()
-    conn.close()
+    if tabella not in TABELLE:
+        raise ValueError(f"tabella sconosciuta: {tabella}")
+    with transazione() as conn:
+        if tabella == "credenza":
+            conn.execute(SQL_ESAURISCI_CREDENZA.format(condizione="nome = ?"), (int(time.time()), "consumo", nome))
+        else:
+            conn.execute(f"DELETE FROM {tabella} WHERE nome=?", (nome,))
 
 def cancella_tutto(tabella="credenza"):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute(f"DELETE FROM {tabella}")
-    conn.commit()
-    conn.close()
+    if tabella not in TABELLE:
+        raise ValueError(f"tabella sconosciuta: {tabella}")
+    with transazione() as conn:
+        if tabella == "credenza":
+            # Svuotare a mano non è uno spreco: non conta tra gli scarti
+            conn.execute(SQL_ESAURISCI_CREDENZA.format(condizione="1"), (int(time.time()), "rettifica"))
+        else:
+            conn.execute(f"DELETE FROM {tabella}")
 
 def aggiungi_lista_spesa(nome, quantita, prezzo_unitario):
-    totale = float(quantita) * float(prezzo_unitario or 0)
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute('''INSERT OR REPLACE INTO lista_spesa 
-                 (nome, quantita, prezzo_unitario, totale, data_aggiunta) 
-                 VALUES (?, ?, ?, ?, ?)''',
-              (nome, int(quantita), float(prezzo_unitario or 0), totale,
-               datetime.now().strftime("%d/%m/%Y %H:%M")))
-    conn.commit()
-    conn.close()
+    riga = _riga_lista(nome, quantita, prezzo_unitario, datetime.now())
+    with transazione() as conn:
+        conn.execute(SQL_AGGIUNGI_LISTA, riga)
+
+MAX_OPERAZIONI_BATCH = 1000
+
+class BatchAnnullato(Exception):
+    pass
+
+# Traduce un'operazione di /batch in (sql, parametri); ValueError se non è valida
+def prepara_operazione(op, adesso):
+    if not isinstance(op, dict):
+        raise ValueError("operazione non valida")
+    azione, nome = op.get('azione'), op.get('nome')
+    if not nome or not isinstance(nome, str):
+        raise ValueError("nome obbligatorio")
+    if azione == 'aggiungi_credenza':
+        return SQL_AGGIUNGI_CREDENZA, _riga_credenza(op.get('codice'), nome, op.get('quantita', 1),
+                                                     op.get('prezzo'), op.get('scadenza'), adesso)
+    if azione == 'aggiungi_lista':
+        return SQL_AGGIUNGI_LISTA, _riga_lista(nome, op.get('quantita', 1), op.get('prezzo_unitario'), adesso)
+    if azione == 'da_credenza_a_lista':
+        return SQL_DA_CREDENZA_A_LISTA, (nome, adesso.strftime("%d/%m/%Y %H:%M"), int(adesso.timestamp()))
+    if azione == 'consuma':
+        return SQL_CONSUMA_CREDENZA, (nome, int(op.get('quantita', 1)), int(adesso.timestamp()))
+    if azione == 'compra':
+        quantita = op.get('quantita')
+        return SQL_COMPRA, (nome, None if quantita is None else int(quantita), int(adesso.timestamp()))
+    if azione == 'rimuovi':
+        tabella = op.get('tabella', 'credenza')
+        if tabella not in TABELLE:
+            raise ValueError(f"tabella sconosciuta: {tabella}")
+        if tabella == "credenza":
+            return SQL_ESAURISCI_CREDENZA.format(condizione="nome = ?"), (int(adesso.timestamp()), "consumo", nome)
+        return f"DELETE FROM {tabella} WHERE nome=?", (nome,)
+    raise ValueError(f"azione sconosciuta: {azione}")
+
+# Applica tutte le operazioni in un'unica transazione. Le operazioni consecutive
+# con la stessa istruzione SQL diventano un solo executemany. In modalità
+# atomica basta un errore per annullare tutto; altrimenti il gruppo che fallisce
+# viene rieseguito un'operazione alla volta, ognuna nel suo SAVEPOINT.
+def esegui_batch(operazioni, atomico=True, percorso=None):
+    adesso = datetime.now()
+    risultati = [{"indice": i, "esito": "ok"} for i in range(len(operazioni))]
+    preparate = []
+    for i, op in enumerate(operazioni):
+        try:
+            preparate.append((i,) + prepara_operazione(op, adesso))
+        except (ValueError, TypeError) as e:
+            risultati[i].update(esito="errore", messaggio=str(e))
+
+    def annulla():
+        for r in risultati:
+            if r["esito"] == "ok":
+                r["esito"] = "annullato"
+        return False, risultati
+
+    if atomico and len(preparate) < len(operazioni):
+        return annulla()
+    try:
+        with transazione(percorso) as conn:
+            for sql, gruppo in itertools.groupby(preparate, key=lambda p: p[1]):
+                gruppo = list(gruppo)
+                try:
+                    conn.execute("SAVEPOINT gruppo")
+                    conn.executemany(sql, [parametri for _, _, parametri in gruppo])
+                    conn.execute("RELEASE gruppo")
+                    continue
+                except sqlite3.Error as e:
+                    conn.execute("ROLLBACK TO gruppo")
+                    conn.execute("RELEASE gruppo")
+                    if atomico:
+                        raise BatchAnnullato(gruppo[0][0], str(e))
+                for i, _, parametri in gruppo:
+                    try:
+                        conn.execute("SAVEPOINT operazione")
+                        conn.execute(sql, parametri)
+                        conn.execute("RELEASE operazione")
+                    except sqlite3.Error as e:
+                        conn.execute("ROLLBACK TO operazione")
+                        conn.execute("RELEASE operazione")
+                        risultati[i].update(esito="errore", messaggio=str(e))
+    except BatchAnnullato as e:
+        indice, messaggio = e.args
+        risultati[indice].update(esito="errore", messaggio=messaggio)
+        return annulla()
+    return all(r["esito"] == "ok" for r in risultati), risultati
+
+# Group commit delle scritture singole del POST /: le richieste concorrenti
+# dello stesso worker sullo stesso database si mettono in coda e la prima
+# (leader) le applica tutte in una transazione con esegui_batch non atomico,
+# nell'ordine di arrivo; ognuna risponde solo dopo il COMMIT del suo gruppo.
+# Il leader aspetta altre operazioni fino a LATENZA_GRUPPO secondi (o
+# MAX_GRUPPO operazioni), ma solo se il gruppo precedente ne aveva più di
+# una: con un solo thread per worker (gunicorn sync) non c'è mai nessuno da
+# aspettare. Le richieste si sovrappongono con --threads o in modalità
+# asincrona.
+LATENZA_GRUPPO = float(os.environ.get("CRENZA_GRUPPO_MS", 2)) / 1000
+MAX_GRUPPO = int(os.environ.get("CRENZA_GRUPPO_MAX", 64))
+_gruppi = {}
+_gruppi_lock = threading.Lock()
+_gruppi_stato = {"gruppi": 0, "operazioni": 0, "massimo": 0, "dimensioni": {}}
+
+def _coda_gruppo(percorso):
+    with _gruppi_lock:
+        coda = _gruppi.get(percorso)
+        if coda is None:
+            coda = _gruppi[percorso] = {"cond": threading.Condition(), "voci": [],
+                                        "leader": False, "ultimo": 1}
+        return coda
+
+# Restituisce None se l'operazione è andata a buon fine, altrimenti il
+# messaggio d'errore; ValueError/TypeError se l'operazione non è valida
+def scrivi_in_gruppo(op, percorso=None):
+    prepara_operazione(op, datetime.now())
+    percorso = percorso or db_corrente()
+    coda = _coda_gruppo(percorso)
+    voce = {"op": op, "fatta": False, "errore": None, "eccezione": None}
+    with coda["cond"]:
+        coda["voci"].append(voce)
+        coda["cond"].notify_all()
+        while not voce["fatta"]:
+            if coda["leader"]:
+                coda["cond"].wait()
+                continue
+            coda["leader"] = True
+            if coda["ultimo"] > 1:
+                scadenza = time.monotonic() + LATENZA_GRUPPO
+                while len(coda["voci"]) < MAX_GRUPPO and time.monotonic() < scadenza:
+                    coda["cond"].wait(scadenza - time.monotonic())
+            gruppo = coda["voci"][:MAX_GRUPPO]
+            del coda["voci"][:MAX_GRUPPO]
+            coda["cond"].release()
+            try:
+                _, risultati = esegui_batch([v["op"] for v in gruppo], atomico=False, percorso=percorso)
+                for v, r in zip(gruppo, risultati):
+                    v["errore"] = r.get("messaggio") if r["esito"] != "ok" else None
+            except Exception as e:
+                for v in gruppo:
+                    v["eccezione"] = e
+            finally:
+                coda["cond"].acquire()
+                for v in gruppo:
+                    v["fatta"] = True
+                coda["leader"] = False
+                coda["ultimo"] = len(gruppo)
+                coda["cond"].notify_all()
+            _conta_gruppo(len(gruppo))
+    if voce["eccezione"] is not None:
+        raise voce["eccezione"]
+    return voce["errore"]
+
+def _conta_gruppo(dimensione):
+    # Istogramma per potenze di due: "4" conta i gruppi da 3 a 4 operazioni
+    classe = str(1 << (dimensione - 1).bit_length())
+    with _gruppi_lock:
+        _gruppi_stato["gruppi"] += 1
+        _gruppi_stato["operazioni"] += dimensione
+        _gruppi_stato["massimo"] = max(_gruppi_stato["massimo"], dimensione)
+        _gruppi_stato["dimensioni"][classe] = _gruppi_stato["dimensioni"].get(classe, 0) + 1
+
+def stats_gruppi():
+    with _gruppi_lock:
+        media = _gruppi_stato["operazioni"] / _gruppi_stato["gruppi"] if _gruppi_stato["gruppi"] else 0
+        return {**_gruppi_stato, "dimensioni": dict(_gruppi_stato["dimensioni"]), "media": round(media, 2),
+                "latenza_ms": LATENZA_GRUPPO * 1000, "max": MAX_GRUPPO}
+
+# Catalogo prodotti per codice EAN, con una cache LRU per processo davanti alle
+# ricerche. Anche i codici assenti finiscono in cache (lo scanner rilegge spesso
+# lo stesso codice), ma solo per TTL_PRODOTTI_ASSENTI secondi. Un import svuota
+# la cache del processo che lo esegue; gli altri worker vedono i prodotti nuovi
+# alla scadenza dell'assenza in cache, quelli aggiornati al riavvio.
+MAX_CACHE_PRODOTTI = 4096
+TTL_PRODOTTI_ASSENTI = 300
+BLOCCO_IMPORT = 1000
+CAMPI_PRODOTTO = {
+    "ean": ("ean", "code", "codice", "barcode"),
+    "nome": ("nome", "product_name", "name"),
+    "categoria": ("categoria", "category", "categories"),
+    "prezzo": ("prezzo", "price"),
+}
+_cache_prodotti = OrderedDict()
+_cache_prodotti_lock = threading.Lock()
+_cache_prodotti_stato = {"hit": 0, "miss": 0, "assenti_scaduti": 0}
+
+def normalizza_ean(testo):
+    ean = str(testo or "").strip()
+    if not ean.isdigit() or not 8 <= len(ean) <= 14:
+        raise ValueError(f"codice EAN non valido: {testo!r}")
+    return ean
+
+def cerca_prodotto(ean):
+    with _cache_prodotti_lock:
+        # le voci sono (prodotto, scadenza): None come scadenza per i prodotti trovati
+        voce = _cache_prodotti.get(ean)
+        if voce is not None and (voce[1] is None or voce[1] > time.monotonic()):
+            _cache_prodotti.move_to_end(ean)
+            _cache_prodotti_stato["hit"] += 1
+            return voce[0]
+        if voce is not None:
+            _cache_prodotti_stato["assenti_scaduti"] += 1
+        _cache_prodotti_stato["miss"] += 1
+    riga = get_conn(DB_FILE).execute("SELECT nome, categoria, prezzo FROM prodotti WHERE ean = ?", (ean,)).fetchone()
+    prodotto = None if riga is None else {"ean": ean, "nome": riga[0], "categoria": riga[1], "prezzo": riga[2]}
+    scadenza = time.monotonic() + TTL_PRODOTTI_ASSENTI if prodotto is None else None
+    with _cache_prodotti_lock:
+        _cache_prodotti[ean] = (prodotto, scadenza)
+        _cache_prodotti.move_to_end(ean)
+        if len(_cache_prodotti) > MAX_CACHE_PRODOTTI:
+            _cache_prodotti.popitem(last=False)
+    return prodotto
+
+def stats_cache_prodotti():
+    return {"voci": len(_cache_prodotti), "max": MAX_CACHE_PRODOTTI,
+            "ttl_assenti": TTL_PRODOTTI_ASSENTI, **_cache_prodotti_stato}
+
+# Un record del dump (con i nomi di colonna di CAMPI_PRODOTTO) come parametri
+# per l'INSERT; ValueError se manca qualcosa
+def _riga_prodotto(record):
+    valori = {}
+    for campo, nomi in CAMPI_PRODOTTO.items():
+        valori[campo] = next((record[n] for n in nomi if record.get(n) not in (None, "")), None)
+    if not valori["nome"]:
+        raise ValueError("nome mancante")
+    prezzo = valori["prezzo"]
+    return (normalizza_ean(valori["ean"]), str(valori["nome"]).strip(),
+            valori["categoria"] and str(valori["categoria"]).strip(),
+            None if prezzo is None else float(prezzo))
+
+def leggi_dump(file, formato):
+    if formato == "csv":
+        yield from csv.DictReader(file)
+        return
+    for linea in file:
+        if linea.strip():
+            yield json.loads(linea)
+
+# Importa a blocchi di BLOCCO_IMPORT record, un executemany e una transazione
+# per blocco: la memoria resta costante anche con dump da milioni di righe
+def importa_prodotti(record):
+    esito = {"importati": 0, "scartati": 0}
+    righe = []
+
+    def scrivi():
+        with transazione(DB_FILE) as conn:
+            conn.executemany('''INSERT INTO prodotti (ean, nome, categoria, prezzo) VALUES (?, ?, ?, ?)
+                ON CONFLICT (ean) DO UPDATE SET nome = excluded.nome,
+                categoria = coalesce(excluded.categoria, categoria),
+                prezzo = coalesce(excluded.prezzo, prezzo)''', righe)
+        esito["importati"] += len(righe)
+        righe.clear()
+
+    for r in record:
+        try:
+            righe.append(_riga_prodotto(r))
+        except (ValueError, TypeError, AttributeError):
+            esito["scartati"] += 1
+            continue
+        if len(righe) >= BLOCCO_IMPORT:
+            scrivi()
+    if righe:
+        scrivi()
+    with _cache_prodotti_lock:
+        _cache_prodotti.clear()
+    return esito
+
+@bp.cli.command("importa-prodotti", help="Importa un dump di prodotti (CSV o JSONL, anche .gz) nel catalogo EAN.")
+@click.argument("percorso", type=click.Path(exists=True, dir_okay=False))
+@click.option("--formato", type=click.Choice(["csv", "jsonl"]),
+              help="Formato del dump; di default lo deduce dall'estensione.")
+def comando_importa_prodotti(percorso, formato):
+    nome = percorso[:-3] if percorso.endswith(".gz") else percorso
+    formato = formato or ("csv" if nome.endswith(".csv") else "jsonl")
+    apri = gzip.open if percorso.endswith(".gz") else open
+    with apri(percorso, "rt", encoding="utf-8", newline="") as file:
+        esito = importa_prodotti(leggi_dump(file, formato))
+    click.echo(f"{esito['importati']} prodotti importati, {esito['scartati']} righe scartate")
+
+# Famiglie: ognuna ha il suo shard SQLite, quindi le scritture di famiglie
+# diverse non si contendono lo stesso lock. Le richieste si identificano con
+# "nome:chiave" nell'header X-Famiglia o nel cookie impostato da /famiglia.
+NOME_FAMIGLIA = re.compile(r"[a-z0-9][a-z0-9_-]{0,62}")
+_chiavi_famiglie = {}
+
+def percorso_famiglia(nome):
+    if not NOME_FAMIGLIA.fullmatch(nome or ""):
+        raise ValueError(f"nome famiglia non valido: {nome!r}")
+    return os.path.join(CARTELLA_FAMIGLIE, f"{nome}.db")
+
+def _hash_chiave(chiave):
+    return hashlib.sha256(chiave.encode()).hexdigest()
+
+def verifica_famiglia(nome, chiave):
+    atteso = _chiavi_famiglie.get(nome)
+    if atteso is None:
+        riga = get_conn(DB_FILE).execute("SELECT chiave FROM famiglie WHERE nome = ?", (nome,)).fetchone()
+        if riga is None:
+            return False
+        atteso = _chiavi_famiglie[nome] = riga[0]
+    return hmac.compare_digest(atteso, _hash_chiave(chiave))
+
+def crea_famiglia(nome):
+    percorso = percorso_famiglia(nome)
+    chiave = secrets.token_urlsafe(24)
+    os.makedirs(CARTELLA_FAMIGLIE, exist_ok=True)
+    init_db(percorso)
+    with transazione(DB_FILE) as conn:
+        conn.execute("INSERT INTO famiglie (nome, chiave, creata) VALUES (?, ?, ?)",
+                     (nome, _hash_chiave(chiave), int(time.time())))
+    return chiave
+
+def compatta_shard(percorso):
+    prima = os.path.getsize(percorso)
+    conn = apri_connessione(percorso)
+    try:
+        conn.execute("VACUUM")
+        # VACUUM può rinumerare i rowid di credenza e lista_spesa
+        conn.execute("BEGIN IMMEDIATE")
+        ricostruisci_ricerca(conn)
+        conn.execute("INSERT INTO ricerca (ricerca) VALUES ('optimize')")
+        conn.execute("COMMIT")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+    return prima, os.path.getsize(percorso)
+
+famiglie_cli = AppGroup("famiglie", help="Gestione delle famiglie e dei loro shard.")
+bp.cli.add_command(famiglie_cli)
+opzione_paralleli = click.option("--paralleli", type=int, default=os.cpu_count() or 4, show_default=True,
+                                 help="Shard elaborati contemporaneamente.")
+
+def _in_parallelo(funzione, nomi, paralleli):
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=max(1, paralleli)) as esecutore:
+        futuri = [(nome, esecutore.submit(funzione, nome)) for nome in nomi]
+        for nome, futuro in futuri:
+            try:
+                yield nome, futuro.result(), None
+            except (sqlite3.Error, OSError, ValueError) as e:
+                yield nome, None, e
+
+def _nomi_famiglie(nomi):
+    if nomi:
+        return nomi
+    return [r[0] for r in get_conn(DB_FILE).execute("SELECT nome FROM famiglie ORDER BY nome")]
+
+@famiglie_cli.command("crea", help="Crea le famiglie e ne stampa la chiave d'accesso.")
+@click.argument("nomi", nargs=-1, required=True)
+@opzione_paralleli
+def comando_crea_famiglie(nomi, paralleli):
+    for nome, chiave, errore in _in_parallelo(crea_famiglia, nomi, paralleli):
+        click.echo(f"{nome}: errore: {errore}" if errore else f"{nome}:{chiave}")
+
+@famiglie_cli.command("migra", help="Porta gli shard (di default tutti) allo schema corrente.")
+@click.argument("nomi", nargs=-1)
+@opzione_paralleli
+def comando_migra_famiglie(nomi, paralleli):
+    for nome, _, errore in _in_parallelo(lambda n: init_db(percorso_famiglia(n)), _nomi_famiglie(nomi), paralleli):
+        click.echo(f"{nome}: errore: {errore}" if errore else f"{nome}: schema {len(MIGRAZIONI)}")
+
+@bp.cli.command("prepara-db", help="Crea o aggiorna lo schema del database principale e degli shard "
+                                    "e ricalcola gli aggregati (una volta per deployment).")
+@opzione_paralleli
+def comando_prepara_db(paralleli):
+    init_db(DB_FILE)
+    click.echo(f"{DB_FILE}: schema {len(MIGRAZIONI)}")
+    for nome, _, errore in _in_parallelo(lambda n: init_db(percorso_famiglia(n)), _nomi_famiglie(()), paralleli):
+        click.echo(f"{nome}: errore: {errore}" if errore else f"{nome}: schema {len(MIGRAZIONI)}")
+
+@famiglie_cli.command("compatta", help="VACUUM e checkpoint degli shard (di default tutti).")
+@click.argument("nomi", nargs=-1)
+@opzione_paralleli
+def comando_compatta_famiglie(nomi, paralleli):
+    for nome, dimensioni, errore in _in_parallelo(lambda n: compatta_shard(percorso_famiglia(n)),
+                                                  _nomi_famiglie(nomi), paralleli):
+        click.echo(f"{nome}: errore: {errore}" if errore else
+                   f"{nome}: {dimensioni[0] // 1024} KiB -> {dimensioni[1] // 1024} KiB")
+
+# Scadenze: le ricerche per data sono scansioni di intervallo sull'indice di
+# giorno_scadenza. Il riepilogo (scaduti e in scadenza entro i giorni di avviso
+# delle impostazioni della app) si ricalcola alla lettura solo se è cambiato il
+# giorno o il database, e resta salvato per le letture successive di tutti i
+# worker. Il comando `flask scadenze` lo prepara in anticipo (da cron).
+GIORNI_AVVISO_PREDEFINITI = 3
+MAX_GIORNI_SCADENZA = 3650
+_scansione_stato = {"passate": 0, "ricalcoli": 0}
+
+def giorni_avviso(conn):
+    riga = conn.execute('''SELECT giorni_avviso FROM impostazioni
+                           WHERE eliminato = 0 AND giorni_avviso IS NOT NULL ORDER BY id LIMIT 1''').fetchone()
+    return riga[0] if riga else GIORNI_AVVISO_PREDEFINITI
+
+def prossime_scadenze(conn, entro, oggi=None):
+    oggi = oggi or date.today()
+    limite = (oggi + timedelta(days=entro)).isoformat()
+    risultato = {"oggi": oggi.isoformat(), "entro": entro}
+    for tabella, colonne in (("credenza", "codice, nome, quantita"),
+                             ("articoli", "id, zona_id, nome, categoria")):
+        filtro = "eliminato = 0 AND " if tabella == "articoli" else ""
+        cur = conn.execute(f'''SELECT {colonne}, giorno_scadenza AS scadenza FROM {tabella}
+                               WHERE {filtro}giorno_scadenza <= ? ORDER BY giorno_scadenza''', (limite,))
+        righe = [r for blocco in _righe(cur) for r in blocco]
+        for r in righe:
+            r["giorni"] = (date.fromisoformat(r["scadenza"]) - oggi).days
+        risultato[tabella] = righe
+    return risultato
+
+def _calcola_riepilogo(conn, oggi):
+    avviso = giorni_avviso(conn)
+    scadenze = prossime_scadenze(conn, avviso, oggi)
+    riepilogo = {"oggi": scadenze["oggi"], "giorni_avviso": avviso, "scaduti": {}, "in_scadenza": {}}
+    for tabella in ("credenza", "articoli"):
+        riepilogo["scaduti"][tabella] = [r for r in scadenze[tabella] if r["giorni"] < 0]
+        riepilogo["in_scadenza"][tabella] = [r for r in scadenze[tabella] if r["giorni"] >= 0]
+    return riepilogo
+
+# Riepilogo del database come JSON già serializzato; lo ricalcola se è di un
+# altro giorno o se da allora il database è cambiato (impostazioni comprese)
+def riepilogo_scadenze(percorso=None):
+    conn = get_conn(percorso)
+    oggi = date.today()
+    versione = versione_corrente(conn)
+    riga = conn.execute("SELECT giorno, versione, dati FROM riepilogo_scadenze WHERE id = 1").fetchone()
+    if riga is not None and riga[0] == oggi.isoformat() and riga[1] == versione:
+        return riga[2]
+    dati = json.dumps(_calcola_riepilogo(conn, oggi))
+    with transazione(percorso) as conn:
+        conn.execute("INSERT OR REPLACE INTO riepilogo_scadenze (id, giorno, versione, dati) VALUES (1, ?, ?, ?)",
+                     (oggi.isoformat(), versione, dati))
+    _scansione_stato["ricalcoli"] += 1
+    return dati
+
+def _tutti_i_database():
+    return [DB_FILE] + [percorso_famiglia(n) for n in _nomi_famiglie(())]
+
+def aggiorna_riepiloghi():
+    for percorso in _tutti_i_database():
+        try:
+            riepilogo_scadenze(percorso)
+        except sqlite3.Error:
+            pass
+    _scansione_stato["passate"] += 1
+
+@bp.cli.command("scadenze", help="Ricalcola i riepiloghi delle scadenze di tutte le famiglie (per cron).")
+def comando_scadenze():
+    aggiorna_riepiloghi()
+    click.echo(f"{_scansione_stato['ricalcoli']} riepiloghi ricalcolati")
+
+# Ricerca. Prima i nomi che iniziano con la query, da nomi_ricerca: un
+# intervallo dell'indice in ordine alfabetico, che si ferma al LIMIT. Sotto i
+# 3 caratteri la ricerca finisce qui. Da 3 in su, i posti rimasti vanno alle
+# altre sottostringhe dell'indice a trigrammi: ordinare per bm25 o per
+# posizione in SQL costringerebbe FTS5 a leggere tutte le corrispondenze
+# (15-45 ms a 100k righe), quindi se ne leggono al più CANDIDATI_RICERCA e si
+# ordinano qui (nome a inizio parola, poi altrove, poi categoria e codice).
+# Se non bastano, un errore di battitura lascia intatta almeno una delle due
+# metà della query: i nomi che contengono una metà (al più CANDIDATI_RICERCA
+# per metà) sono candidati e restano, i più simili prima, quelli che
+# condividono abbastanza trigrammi con la query.
+LIMITE_RICERCA = 20
+CANDIDATI_RICERCA = 200
+MIN_FUZZY = 6
+SOMIGLIANZA_MINIMA = 0.5
 
-init_db()
+def _frase(testo):
+    return '"' + testo.replace('"', '""') + '"'
+
+def _trigrammi(testo):
+    testo = testo.lower()
+    return {testo[i:i + 3] for i in range(len(testo) - 2)}
+
+def _risultato_ricerca(rowid, nome, categoria, codice):
+    return {"tabella": TABELLE_RICERCA[rowid % 4], "id": rowid // 4,
+            "nome": nome, "categoria": categoria, "codice": codice}
+
+def _ordine_ricerca(q, riga):
+    _, nome, categoria, codice = riga
+    nome = (nome or "").lower()
+    posizione = nome.find(q)
+    if posizione < 0:
+        return (3 if q in (categoria or "").lower() else 4, 0, len(nome))
+    return (1 if nome[posizione - 1] == " " else 2, posizione, len(nome))
+
+def cerca(q, limite=LIMITE_RICERCA):
+    conn = get_conn()
+    q = " ".join(q.split()).lower()
+    # Il carattere più alto chiude l'intervallo dei nomi che iniziano con q
+    righe = conn.execute('''SELECT id, nome, categoria, codice FROM nomi_ricerca
+                            WHERE nome >= ? AND nome < ? ORDER BY nome LIMIT ?''',
+                         (q, q + "\U0010ffff", limite)).fetchall()
+    risultati = [_risultato_ricerca(*r) for r in righe]
+    if len(risultati) >= limite or len(q) < 3:
+        return risultati
+    trovati = {r[0] for r in righe}
+    altre = [r for r in conn.execute("SELECT rowid, nome, categoria, codice FROM ricerca WHERE ricerca MATCH ? LIMIT ?",
+                                     (_frase(q), CANDIDATI_RICERCA + len(trovati)))
+             if r[0] not in trovati]
+    altre.sort(key=lambda r: _ordine_ricerca(q, r))
+    risultati += [_risultato_ricerca(*r) for r in altre[:limite - len(risultati)]]
+    trovati.update(r[0] for r in altre)
+    if len(risultati) >= limite or len(q) < MIN_FUZZY:
+        return risultati
+    trigrammi = _trigrammi(q)
+    meta = len(q) // 2
+    candidati = []
+    for parte in (q[:meta], q[meta:]):
+        for rowid, nome, categoria, codice in conn.execute(
+                "SELECT rowid, nome, categoria, codice FROM ricerca WHERE nome MATCH ? LIMIT ?",
+                (_frase(parte), CANDIDATI_RICERCA)):
+            if rowid in trovati:
+                continue
+            trovati.add(rowid)
+            somiglianza = len(trigrammi & _trigrammi(nome)) / len(trigrammi)
+            if somiglianza >= SOMIGLIANZA_MINIMA:
+                candidati.append((-somiglianza, len(nome), rowid, nome, categoria, codice))
+    candidati.sort()
+    return risultati + [_risultato_ricerca(*c[2:]) for c in candidati[:limite - len(risultati)]]
+
+# Pianificatore della spesa: traduce i pasti delle diete in ingredienti, li
+# confronta con le scorte di tutte le zone (articoli della app e credenza) e
+# stima il costo con i prezzi già visti in spesa e lista_spesa. Lo stato resta
+# in memoria per database e si aggiorna leggendo il registro modifiche: cambiare
+# un pasto ricalcola solo i suoi ingredienti, cambiare una scorta o un prezzo
+# solo le voci con quel nome. Se il registro non copre più l'ultima versione
+# vista si ricostruisce tutto.
+MAX_PIANIFICATORI = 256
+# La virgola separa gli ingredienti tranne che tra due cifre ("0,5 kg")
+SEPARATORI_PASTO = re.compile(r"(?<!\d),|,(?!\d)|[;+\n]|\be\b|\bcon\b", re.IGNORECASE)
+QUANTITA_PASTO = re.compile(
+    r"(?<![\w.,])(?:x\s*)?(\d+(?:[.,]\d+)?)\s*(kg|gr|g|grammi|lt|l|ml|cl|pz|pezzi|x)?(?![\w])", re.IGNORECASE)
+UNITA_PASTO = {"kg": ("g", 1000), "g": ("g", 1), "gr": ("g", 1), "grammi": ("g", 1),
+               "l": ("ml", 1000), "lt": ("ml", 1000), "ml": ("ml", 1), "cl": ("ml", 10),
+               "pz": ("pz", 1), "pezzi": ("pz", 1), "x": ("pz", 1), None: ("pz", 1)}
+PAROLE_VUOTE = {"di", "del", "della", "dello", "dei", "degli", "delle", "al", "alla", "allo", "ai",
+                "agli", "alle", "il", "lo", "la", "i", "gli", "le", "un", "uno", "una", "d", "l", "qb"}
+_pianificatori = OrderedDict()
+_pianificatori_lock = threading.Lock()
+
+# Chiave di confronto di un nome: minuscole senza accenti né parole vuote, e
+# ogni parola senza la vocale finale così singolare e plurale coincidono
+def parole_chiave(testo):
+    testo = unicodedata.normalize("NFKD", str(testo or "").lower())
+    testo = "".join(c for c in testo if not unicodedata.combining(c))
+    parole = [p for p in re.findall(r"[a-z]+", testo) if p not in PAROLE_VUOTE]
+    return tuple(p[:-1] if len(p) > 3 and p[-1] in "aeiou" else p for p in parole)
+
+# Ingredienti di un pasto: {(chiave, unità): quantità}, più il nome da mostrare
+def ingredienti_pasto(testo, nomi):
+    risultato = {}
+    for parte in SEPARATORI_PASTO.split(str(testo or "")):
+        quantita, unita = 1.0, "pz"
+        trovata = QUANTITA_PASTO.search(parte)
+        if trovata:
+            unita, fattore = UNITA_PASTO[(trovata.group(2) or "").lower() or None]
+            quantita = float(trovata.group(1).replace(",", ".")) * fattore
+            parte = parte[:trovata.start()] + " " + parte[trovata.end():]
+        chiave = parole_chiave(parte)
+        if not chiave:
+            continue
+        nomi.setdefault(chiave, " ".join(parte.split()).lower())
+        risultato[(chiave, unita)] = risultato.get((chiave, unita), 0) + quantita
+    return risultato
+
+def _nuovo_pianificatore():
+    return {"lock": threading.Lock(), "versione": None, "piani": {}, "pasti": {},
+            "fabbisogno": {}, "nomi": {}, "voci": {}, "ricalcolate": 0, "parole": {},
+            "scorte": {}, "fonti_scorte": {}, "prezzi": {}, "fonti_prezzi": {}}
+
+def _sposta(indice, chiave, delta):
+    valore = indice.get(chiave, 0) + delta
+    if abs(valore) < 1e-9:
+        indice.pop(chiave, None)
+    else:
+        indice[chiave] = valore
+
+def _indicizza(stato, chiave):
+    for parola in chiave:
+        stato["parole"].setdefault(parola, set()).add(chiave)
+
+# Scorte e prezzi: ogni fonte (articolo, riga di credenza, voce di spesa)
+# ricorda il contributo che ha dato, così una modifica lo sostituisce
+def _aggiorna_scorta(stato, fonte, chiave, quantita, toccati):
+    vecchia = stato["fonti_scorte"].pop(fonte, None)
+    if vecchia is not None:
+        _sposta(stato["scorte"], vecchia[0], -vecchia[1])
+        toccati.add(vecchia[0])
+    if chiave and quantita:
+        stato["fonti_scorte"][fonte] = (chiave, quantita)
+        _sposta(stato["scorte"], chiave, quantita)
+        _indicizza(stato, chiave)
+        toccati.add(chiave)
+
+def _aggiorna_prezzo(stato, fonte, chiave, prezzo, toccati):
+    vecchio = stato["fonti_prezzi"].pop(fonte, None)
+    if vecchio is not None:
+        stato["prezzi"][vecchio[0]].pop(fonte, None)
+        toccati.add(vecchio[0])
+    if chiave and prezzo:
+        stato["fonti_prezzi"][fonte] = (chiave, prezzo)
+        stato["prezzi"].setdefault(chiave, {})[fonte] = prezzo
+        _indicizza(stato, chiave)
+        toccati.add(chiave)
+
+def _aggiorna_dieta(stato, conn, id_dieta, toccati):
+    riga = conn.execute("SELECT piano, eliminato FROM diete WHERE id = ?", (id_dieta,)).fetchone()
+    nuovo = json.loads(riga[0] or "{}") if riga and not riga[1] else {}
+    vecchio = stato["piani"].pop(id_dieta, {})
+    if nuovo:
+        stato["piani"][id_dieta] = nuovo
+    fabbisogno = stato["fabbisogno"].setdefault(id_dieta, {})
+    for pasto in set(vecchio) | set(nuovo):
+        if vecchio.get(pasto) == nuovo.get(pasto):
+            continue
+        for ingrediente, quantita in stato["pasti"].pop((id_dieta, pasto), {}).items():
+            _sposta(fabbisogno, ingrediente, -quantita)
+            toccati.add(ingrediente[0])
+        contributo = ingredienti_pasto(nuovo.get(pasto), stato["nomi"])
+        if contributo:
+            stato["pasti"][(id_dieta, pasto)] = contributo
+        for ingrediente, quantita in contributo.items():
+            _sposta(fabbisogno, ingrediente, quantita)
+            toccati.add(ingrediente[0])
+
+def _aggiorna_fonte(stato, conn, tabella, codice, nome, toccati):
+    if tabella == "diete":
+        _aggiorna_dieta(stato, conn, int(nome), toccati)
+    elif tabella == "articoli":
+        riga = conn.execute("SELECT nome FROM articoli WHERE id = ? AND eliminato = 0", (int(nome),)).fetchone()
+        _aggiorna_scorta(stato, ("articoli", nome), riga and parole_chiave(riga[0]), 1, toccati)
+    elif tabella == "credenza":
+        # Tutti i lotti del prodotto, con il prezzo dell'ultimo entrato
+        riga = conn.execute('''SELECT sum(quantita), (SELECT prezzo FROM credenza WHERE codice IS ?1 AND nome = ?2
+                                   ORDER BY ts_inserimento DESC LIMIT 1)
+                               FROM credenza WHERE codice IS ?1 AND nome = ?2 HAVING count(*) > 0''',
+                            (codice, nome)).fetchone()
+        _aggiorna_scorta(stato, ("credenza", codice, nome), riga and parole_chiave(nome), riga and riga[0], toccati)
+        _aggiorna_prezzo(stato, ("credenza", codice, nome), riga and parole_chiave(nome), riga and riga[1], toccati)
+    elif tabella == "spesa":
+        riga = conn.execute("SELECT nome, prezzo FROM spesa WHERE id = ? AND eliminato = 0", (int(nome),)).fetchone()
+        _aggiorna_prezzo(stato, ("spesa", nome), riga and parole_chiave(riga[0]), riga and riga[1], toccati)
+    elif tabella == "lista_spesa":
+        riga = conn.execute("SELECT prezzo_unitario FROM lista_spesa WHERE nome = ?", (nome,)).fetchone()
+        _aggiorna_prezzo(stato, ("lista_spesa", nome), riga and parole_chiave(nome), riga and riga[0], toccati)
+
+def _ricostruisci_pianificatore(stato, conn):
+    stato.update({k: v for k, v in _nuovo_pianificatore().items() if k != "lock"})
+    toccati = set()
+    for (id_dieta,) in conn.execute("SELECT id FROM diete WHERE eliminato = 0").fetchall():
+        _aggiorna_dieta(stato, conn, id_dieta, toccati)
+    for (id_articolo,) in conn.execute("SELECT id FROM articoli WHERE eliminato = 0").fetchall():
+        _aggiorna_fonte(stato, conn, "articoli", None, str(id_articolo), toccati)
+    for codice, nome in conn.execute("SELECT DISTINCT codice, nome FROM credenza").fetchall():
+        _aggiorna_fonte(stato, conn, "credenza", codice, nome, toccati)
+    for (id_spesa,) in conn.execute("SELECT id FROM spesa WHERE eliminato = 0").fetchall():
+        _aggiorna_fonte(stato, conn, "spesa", None, str(id_spesa), toccati)
+    for (nome,) in conn.execute("SELECT nome FROM lista_spesa").fetchall():
+        _aggiorna_fonte(stato, conn, "lista_spesa", None, nome, toccati)
+
+# Scorte e prezzi di un ingrediente vengono da tutti i nomi che contengono
+# tutte le sue parole ("pasta" trova anche "pasta barilla")
+def _corrispondenti(stato, chiave):
+    return set.intersection(*(stato["parole"].get(parola, set()) for parola in chiave))
+
+def _scorta(stato, chiave):
+    return sum(stato["scorte"].get(c, 0) for c in _corrispondenti(stato, chiave))
+
+def _stima_prezzo(stato, chiave):
+    prezzi = [p for c in _corrispondenti(stato, chiave) for p in stato["prezzi"].get(c, {}).values()]
+    return sum(prezzi) / len(prezzi) if prezzi else None
+
+def _voce(stato, chiave, unita, quantita):
+    in_scorta = _scorta(stato, chiave)
+    if unita == "pz":
+        da_comprare = max(0, math.ceil(quantita - in_scorta - 1e-9))
+        confezioni = da_comprare
+    else:
+        # Le scorte si contano a pezzi: per grammi e millilitri basta averne una
+        da_comprare = 0 if in_scorta else quantita
+        confezioni = 1 if da_comprare else 0
+    prezzo = _stima_prezzo(stato, chiave)
+    return {"nome": stato["nomi"].get(chiave, " ".join(chiave)), "quantita": round(quantita, 2), "unita": unita,
+            "in_scorta": in_scorta, "da_comprare": round(da_comprare, 2),
+            "prezzo_unitario": None if prezzo is None else round(prezzo, 2),
+            "costo": round((prezzo or 0) * confezioni, 2)}
+
+def _ricalcola_voci(stato, toccati):
+    for id_dieta, fabbisogno in stato["fabbisogno"].items():
+        voci = stato["voci"].setdefault(id_dieta, {})
+        for ingrediente in {i for i in voci if i[0] in toccati} | {i for i in fabbisogno if i[0] in toccati}:
+            if ingrediente in fabbisogno:
+                voci[ingrediente] = _voce(stato, ingrediente[0], ingrediente[1], fabbisogno[ingrediente])
+            else:
+                voci.pop(ingrediente, None)
+            stato["ricalcolate"] += 1
+
+# Gli ingredienti le cui parole sono tutte nel nome di una scorta o di un
+# prezzo cambiati
+def _ingredienti_di(stato, chiavi):
+    richiesti = {i[0] for f in stato["fabbisogno"].values() for i in f} if chiavi else set()
+    return {r for r in richiesti for c in chiavi if set(r) <= set(c)}
+
+def aggiorna_pianificatore(percorso=None):
+    percorso = percorso or db_corrente()
+    with _pianificatori_lock:
+        stato = _pianificatori.get(percorso)
+        if stato is None:
+            stato = _pianificatori[percorso] = _nuovo_pianificatore()
+            while len(_pianificatori) > MAX_PIANIFICATORI:
+                _pianificatori.popitem(last=False)
+        _pianificatori.move_to_end(percorso)
+    conn = get_conn(percorso)
+    with stato["lock"]:
+        conn.execute("BEGIN")
+        try:
+            versione = versione_corrente(conn)
+            minima = conn.execute("SELECT MIN(versione) FROM modifiche").fetchone()[0]
+            toccati = set()
+            stato["ricalcolate"] = 0
+            if stato["versione"] is None or (versione > stato["versione"] and
+                                             (minima is None or minima > stato["versione"] + 1)):
+                _ricostruisci_pianificatore(stato, conn)
+                toccati = {i[0] for f in stato["fabbisogno"].values() for i in f}
+            elif versione > stato["versione"]:
+                for tabella, codice, nome in conn.execute(
+                        "SELECT DISTINCT tabella, codice, nome FROM modifiche WHERE versione > ?",
+                        (stato["versione"],)).fetchall():
+                    _aggiorna_fonte(stato, conn, tabella, codice, nome, toccati)
+                toccati |= _ingredienti_di(stato, toccati)
+            _ricalcola_voci(stato, toccati)
+            stato["versione"] = versione
+        finally:
+            conn.execute("COMMIT")
+        return stato
+
+def lista_pianificata(id_dieta=None, percorso=None):
+    stato = aggiorna_pianificatore(percorso)
+    with stato["lock"]:
+        if id_dieta is None:
+            id_dieta = min(stato["piani"], default=None)
+        voci = sorted(stato["voci"].get(id_dieta, {}).values(), key=lambda v: (v["da_comprare"] == 0, v["nome"]))
+        return {"dieta": id_dieta, "versione": stato["versione"], "voci": voci,
+                "totale": round(sum(v["costo"] for v in voci), 2), "voci_ricalcolate": stato["ricalcolate"]}
+
+# Stima del prezzo unitario dallo storico: media dei mesi pesata per
+# recentezza (il peso si dimezza ogni SEMIVITA_PREZZI giorni). Senza storico
+# per il nome esatto si usano i prodotti che iniziano con quel nome
+# ("latte" -> "latte intero").
+MESI_STIMA = 24
+SEMIVITA_PREZZI = 90
+MAX_STIME = 500
+
+def _mese_iniziale(oggi, mesi):
+    indice = oggi.year * 12 + oggi.month - 1 - mesi
+    return f"{indice // 12:04d}-{indice % 12 + 1:02d}"
+
+def stima_prezzo(conn, nome, negozio=None, oggi=None):
+    oggi = oggi or date.today()
+    dal = _mese_iniziale(oggi, MESI_STIMA)
+    righe, metodo = conn.execute('''SELECT mese, negozio, osservazioni, somma, minimo, massimo, ultimo_giorno, ultimo
+                                    FROM prezzi_mensili WHERE prodotto = lower(trim(?1)) AND mese >= ?2''',
+                                 (nome, dal)).fetchall(), "storico"
+    if not righe:
+        righe, metodo = conn.execute('''SELECT mese, negozio, osservazioni, somma, minimo, massimo, ultimo_giorno, ultimo
+                                        FROM prezzi_mensili WHERE prodotto > lower(trim(?1)) || ' '
+                                        AND prodotto < lower(trim(?1)) || ' ' || char(1114111) AND mese >= ?2''',
+                                     (nome, dal)).fetchall(), "simili"
+    if negozio and any(r[1] == negozio for r in righe):
+        righe = [r for r in righe if r[1] == negozio]
+    if not righe:
+        return {"nome": nome, "prezzo": None, "osservazioni": 0, "metodo": None}
+    pesi = somma = 0.0
+    for mese, _, osservazioni, totale, *_ in righe:
+        # Età misurata dalla metà del mese
+        eta = max(0, (oggi - date.fromisoformat(mese + "-15")).days)
+        peso = 0.5 ** (eta / SEMIVITA_PREZZI)
+        pesi += peso * osservazioni
+        somma += peso * totale
+    ultimo = max(righe, key=lambda r: r[6])
+    return {"nome": nome, "prezzo": round(somma / pesi, 2), "osservazioni": sum(r[2] for r in righe),
+            "minimo": min(r[4] for r in righe), "massimo": max(r[5] for r in righe),
+            "ultimo": {"prezzo": ultimo[7], "giorno": ultimo[6]}, "metodo": metodo}
+
+def registra_prezzo(nome, prezzo, negozio=None, giorno=None):
+    with transazione() as conn:
+        conn.execute('''INSERT INTO osservazioni_prezzi (prodotto, nome, prezzo, giorno, negozio, fonte)
+                        VALUES (lower(trim(?1)), ?1, ?2, ?3, ?4, 'manuale')''',
+                     (nome, prezzo, giorno or date.today().isoformat(), negozio or ""))
+
+def storico_prezzi(conn, nome):
+    return [{"mese": mese, "negozio": negozio, "osservazioni": n, "medio": round(somma / n, 2),
+             "minimo": minimo, "massimo": massimo, "ultimo": ultimo}
+            for mese, negozio, n, somma, minimo, massimo, ultimo in conn.execute(
+                '''SELECT mese, negozio, osservazioni, somma, minimo, massimo, ultimo FROM prezzi_mensili
+                   WHERE prodotto = lower(trim(?)) ORDER BY mese, negozio''', (nome,))]
+
+# Fotografia della credenza ricalcolata dal registro: saldo per lotto, con
+# l'ultimo prezzo noto del lotto. Si riscrive solo se diverge da quella tenuta
+# dai trigger (scritture esterne, ripristini parziali).
+SQL_SALDI = f'''SELECT codice, nome, saldo,
+    coalesce((SELECT prezzo FROM movimenti p WHERE p.fonte = 'credenza' AND p.codice = s.codice
+              AND p.nome = s.nome AND coalesce(p.scadenza, 'N/D') = s.scadenza AND p.prezzo > 0
+              ORDER BY p.id DESC LIMIT 1), 0),
+    scadenza, strftime('%d/%m/%Y %H:%M', ultimo, 'unixepoch', 'localtime'), ultimo
+    FROM (SELECT codice, nome, coalesce(scadenza, 'N/D') AS scadenza,
+                 max(CASE WHEN tipo IN ('aggiunta', 'spostamento') THEN ts END) AS ultimo,
+                 sum(CASE WHEN tipo IN ('aggiunta', 'spostamento') THEN quantita ELSE -quantita END) AS saldo
+          FROM movimenti WHERE fonte = 'credenza' GROUP BY codice, nome, coalesce(scadenza, 'N/D')) AS s
+    WHERE saldo > 0'''
+
+def ricostruisci_credenza(percorso=None):
+    with transazione(percorso) as conn:
+        differenze = conn.execute(f'''SELECT count(*) FROM (
+            SELECT * FROM (SELECT codice, nome, scadenza, quantita FROM credenza
+                           EXCEPT SELECT codice, nome, scadenza, saldo FROM ({SQL_SALDI}))
+            UNION ALL
+            SELECT * FROM (SELECT codice, nome, scadenza, saldo FROM ({SQL_SALDI})
+                           EXCEPT SELECT codice, nome, scadenza, quantita FROM credenza))''',
+                                  ).fetchone()[0]
+        if differenze:
+            conn.execute("DELETE FROM credenza")
+            conn.execute(f'''INSERT INTO credenza (codice, nome, quantita, prezzo, scadenza,
+                             data_inserimento, ts_inserimento) {SQL_SALDI}''')
+    return differenze
+
+@bp.cli.command("ricostruisci-credenza", help="Riallinea la credenza al registro dei movimenti "
+                                                "(di default in tutti i database).")
+@click.argument("famiglie", nargs=-1)
+@opzione_paralleli
+def comando_ricostruisci_credenza(famiglie, paralleli):
+    percorsi = [percorso_famiglia(n) for n in famiglie] if famiglie else _tutti_i_database()
+    for percorso, differenze, errore in _in_parallelo(ricostruisci_credenza, percorsi, paralleli):
+        click.echo(f"{percorso}: errore: {errore}" if errore else f"{percorso}: {differenze} righe divergenti")
+
+# Consumi per prodotto (credenza e articoli della app) negli ultimi giorni:
+# ritmo giornaliero e giorni di scorta rimasti a quel ritmo
+MAX_GIORNI_CONSUMI = 3650
+
+def consumi(conn, giorni=30, nome=None, adesso=None):
+    dal = int(adesso or time.time()) - giorni * 86400
+    filtro, parametri = ("AND nome = ? COLLATE NOCASE", (dal, nome)) if nome else ("", (dal,))
+    scorte = dict(conn.execute('''SELECT chiave, sum(n) FROM (
+        SELECT lower(nome) AS chiave, quantita AS n FROM credenza
+        UNION ALL SELECT lower(nome), 1 FROM articoli WHERE eliminato = 0) GROUP BY chiave'''))
+    risultati = []
+    for chiave, nome_prodotto, consumati, scartati in conn.execute(f'''SELECT lower(nome), min(nome),
+            sum(CASE WHEN tipo = 'consumo' THEN quantita ELSE 0 END),
+            sum(CASE WHEN tipo = 'scarto' THEN quantita ELSE 0 END)
+            FROM movimenti WHERE tipo IN ('consumo', 'scarto') AND ts >= ? {filtro} GROUP BY lower(nome)''',
+                                                                  parametri):
+        al_giorno = consumati / giorni
+        in_scorta = scorte.get(chiave, 0)
+        risultati.append({"nome": nome_prodotto, "consumati": consumati, "scartati": scartati,
+                          "al_giorno": round(al_giorno, 3), "in_scorta": in_scorta,
+                          "giorni_rimanenti": round(in_scorta / al_giorno, 1) if al_giorno else None})
+    risultati.sort(key=lambda r: (-r["consumati"], r["nome"]))
+    return {"giorni": giorni, "prodotti": risultati}
+
+# Esportazione e importazione in streaming di credenza, lista, zone, articoli
+# e diete, in NDJSON (tutte le tabelle, una riga JSON per record con il campo
+# "tabella") o CSV (una tabella). Si legge e si scrive a blocchi: la memoria
+# non dipende dalla dimensione della famiglia.
+# tabella -> colonne esportate
+ESPORTAZIONE = {
+    "credenza": ("codice", "nome", "quantita", "prezzo", "scadenza", "ts_inserimento"),
+    "lista_spesa": ("nome", "quantita", "prezzo_unitario", "ts_aggiunta"),
+    "zone": ("id", "nome"),
+    "articoli": ("id", "zona_id", "nome", "categoria", "scadenza", "barcode", "prezzo"),
+    "diete": ("id", "nome", "piano"),
+}
+BLOCCO_ESPORTAZIONE = 64 * 1024
+GIORNI_CHECKPOINT = 7
+
+def esporta_dati(percorso, tabelle, formato="ndjson"):
+    conn = apri_connessione(percorso, condivisa=True)
+    # Una sola transazione di lettura: tutte le tabelle dalla stessa fotografia
+    conn.execute("BEGIN")
+    try:
+        for tabella in tabelle:
+            colonne = ESPORTAZIONE[tabella]
+            filtro = " WHERE eliminato = 0" if tabella in ("zone", "articoli", "diete") else ""
+            cur = conn.execute(f"SELECT {', '.join(colonne)} FROM {tabella}{filtro}")
+            testo = io.StringIO()
+            scrittore = csv.writer(testo, lineterminator="\n")
+            if formato == "csv":
+                scrittore.writerow(colonne)
+            for blocco in _righe(cur):
+                for r in blocco:
+                    if formato == "csv":
+                        scrittore.writerow(r.values())
+                    else:
+                        testo.write(json.dumps({"tabella": tabella, **r}, ensure_ascii=False) + "\n")
+                if testo.tell() >= BLOCCO_ESPORTAZIONE:
+                    yield testo.getvalue().encode()
+                    testo.seek(0)
+                    testo.truncate()
+            yield testo.getvalue().encode()
+    finally:
+        conn.close()
+
+def comprimi(blocchi):
+    compressore = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for blocco in blocchi:
+        dati = compressore.compress(blocco)
+        if dati:
+            yield dati
+    yield compressore.flush()
+
+# Righe di testo da un flusso binario qualsiasi (basta read): il corpo di una
+# richiesta chunked non sempre è un file vero
+def _righe_testo(flusso, blocco=BLOCCO_ESPORTAZIONE):
+    decodifica = codecs.getincrementaldecoder("utf-8")()
+    resto = ""
+    while True:
+        dati = flusso.read(blocco)
+        righe = (resto + decodifica.decode(dati, final=not dati)).split("\n")
+        resto = righe.pop()
+        yield from (r + "\n" for r in righe)
+        if not dati:
+            break
+    if resto:
+        yield resto
+
+# Un'ultima riga senza a capo che non si legge è un invio interrotto: non
+# conta come riga, così la ripresa la rilegge per intero
+def _leggi_record(flusso, formato, tabella):
+    ultima = {"a_capo": True}
+
+    def righe():
+        for riga in _righe_testo(flusso):
+            ultima["a_capo"] = riga.endswith("\n")
+            yield riga
+
+    if formato == "csv":
+        lettore = csv.reader(righe())
+        intestazione = next(lettore, [])
+        for valori in lettore:
+            if not valori:
+                continue
+            if len(valori) != len(intestazione):
+                if not ultima["a_capo"]:
+                    return
+                yield None, "numero di campi errato"
+                continue
+            yield tabella, {k: v if v != "" else None for k, v in zip(intestazione, valori)}
+        return
+    for riga in righe():
+        if not riga.strip():
+            continue
+        try:
+            r = json.loads(riga)
+        except ValueError:
+            if not ultima["a_capo"]:
+                return
+            yield None, "JSON non valido"
+            continue
+        yield (r.pop("tabella", None), r) if isinstance(r, dict) else (None, "record non valido")
+
+def _quantita(valore, predefinita=1):
+    quantita = int(float(valore if valore is not None else predefinita))
+    if quantita <= 0:
+        raise ValueError("quantita deve essere positiva")
+    return quantita
+
+def _parametri_importazione(tabella, r, adesso):
+    if tabella not in ESPORTAZIONE:
+        raise ValueError(f"tabella sconosciuta: {tabella}")
+    if not r.get("nome"):
+        raise ValueError("nome obbligatorio")
+    if tabella == "credenza":
+        ts = r.get("ts_inserimento")
+        return _riga_credenza(r.get("codice"), r["nome"], _quantita(r.get("quantita")), r.get("prezzo"),
+                              r.get("scadenza"), datetime.fromtimestamp(int(ts)) if ts else adesso)
+    if tabella == "lista_spesa":
+        return _riga_lista(r["nome"], _quantita(r.get("quantita")), r.get("prezzo_unitario"), adesso)
+    return tuple([int(r["id"])] + [json.dumps(r[c]) if c in COLONNE_JSON and isinstance(r.get(c), (dict, list))
+                                   else r.get(c) for c in ESPORTAZIONE[tabella][1:]])
+
+def _sql_importazione(tabella):
+    if tabella == "credenza":
+        return SQL_AGGIUNGI_CREDENZA
+    if tabella == "lista_spesa":
+        return SQL_AGGIUNGI_LISTA
+    # Record della app: stesso id sovrascrive, con versione e rev nuovi come una put
+    colonne = ESPORTAZIONE[tabella][1:]
+    return f'''INSERT INTO {tabella} (id, {', '.join(colonne)}, rev) VALUES (?{', ?' * len(colonne)}, ?)
+               ON CONFLICT (id) DO UPDATE SET versione = versione + 1, rev = excluded.rev, eliminato = 0
+               {''.join(f', {c} = excluded.{c}' for c in colonne)}'''
+
+def _scrivi_blocco(conn, tabella, righe, esito):
+    sql = _sql_importazione(tabella)
+    if tabella not in ("credenza", "lista_spesa"):
+        # Il registro modifiche assegna i rev in sequenza dentro la transazione
+        conn.executemany("INSERT INTO modifiche (tabella, nome) VALUES (?, ?)",
+                         [(tabella, str(p[0])) for _, p in righe])
+        ultimo = versione_corrente(conn)
+        righe = [(n, p + (ultimo - len(righe) + 1 + i,)) for i, (n, p) in enumerate(righe)]
+    try:
+        conn.execute("SAVEPOINT blocco")
+        conn.executemany(sql, [p for _, p in righe])
+        conn.execute("RELEASE blocco")
+        esito["importate"] += len(righe)
+        return
+    except sqlite3.Error:
+        conn.execute("ROLLBACK TO blocco")
+        conn.execute("RELEASE blocco")
+    for n, parametri in righe:
+        try:
+            conn.execute("SAVEPOINT riga")
+            conn.execute(sql, parametri)
+            conn.execute("RELEASE riga")
+            esito["importate"] += 1
+        except sqlite3.Error as e:
+            conn.execute("ROLLBACK TO riga")
+            conn.execute("RELEASE riga")
+            _scarta(esito, n, str(e))
+
+def _scarta(esito, n, messaggio):
+    esito["scartate"] += 1
+    if len(esito["errori"]) < 20:
+        esito["errori"].append({"riga": n, "messaggio": messaggio})
+
+# Importa a blocchi di BLOCCO_IMPORT righe, ognuno nella sua transazione. Con
+# un id il punto raggiunto resta in `importazioni` insieme al blocco: dopo
+# un'interruzione si rimanda il file (tutto, o da `inizio` = numero della prima
+# riga inviata) e le righe già importate vengono saltate.
+def importa_dati(flusso, formato="ndjson", tabella=None, id_importazione=None, inizio=0):
+    adesso = datetime.now()
+    esito = {"id": id_importazione, "righe": 0, "importate": 0, "scartate": 0, "errori": []}
+    fatte = 0
+    if id_importazione:
+        with transazione() as conn:
+            conn.execute("DELETE FROM importazioni WHERE aggiornata < ?",
+                         (int(time.time()) - GIORNI_CHECKPOINT * 86400,))
+            riga = conn.execute("SELECT righe, importate, scartate FROM importazioni WHERE id = ?",
+                                (id_importazione,)).fetchone()
+        if riga:
+            fatte, esito["importate"], esito["scartate"] = riga
+    if inizio > fatte:
+        raise ValueError(f"mancano le righe da {fatte}: riprendere da lì")
+    esito["righe"] = fatte
+
+    def salva(blocco, n):
+        with transazione() as conn:
+            for t, righe in itertools.groupby(sorted(blocco, key=lambda b: b[0]), key=lambda b: b[0]):
+                _scrivi_blocco(conn, t, [r for _, *r in righe], esito)
+            if id_importazione:
+                conn.execute('''INSERT INTO importazioni (id, righe, importate, scartate, aggiornata)
+                                VALUES (?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET righe = excluded.righe,
+                                importate = excluded.importate, scartate = excluded.scartate,
+                                aggiornata = excluded.aggiornata''',
+                             (id_importazione, n, esito["importate"], esito["scartate"], int(time.time())))
+        esito["righe"] = n
+
+    blocco, ultima = [], fatte
+    for n, (t, r) in enumerate(_leggi_record(flusso, formato, tabella), start=inizio):
+        if n < fatte:
+            continue
+        ultima = n + 1
+        try:
+            if t is None:
+                raise ValueError(r)
+            blocco.append((t, n, _parametri_importazione(t, r, adesso)))
+        except (KeyError, TypeError, ValueError) as e:
+            _scarta(esito, n, str(e))
+        if len(blocco) >= BLOCCO_IMPORT:
+            salva(blocco, n + 1)
+            blocco = []
+    salva(blocco, ultima)
+    return esito
+
+# Collezioni sincronizzate con la app React: nome della collezione ->
+# (tabella, {campo del client: colonna})
+COLLEZIONI = {
+    "zone": ("zone", {"name": "nome"}),
+    "articoli": ("articoli", {"pantryId": "zona_id", "name": "nome", "category": "categoria",
+                              "expiry": "scadenza", "barcode": "barcode", "price": "prezzo"}),
+    "spesa": ("spesa", {"name": "nome", "qty": "quantita", "price": "prezzo"}),
+    "diete": ("diete", {"name": "nome", "plan": "piano"}),
+    "impostazioni": ("impostazioni", {"alertDays": "giorni_avviso"}),
+}
+COLONNE_JSON = {"piano"}
+MAX_MUTAZIONI_SYNC = 1000
+
+class Conflitto(Exception):
+    pass
+
+def _record_client(collezione, riga):
+    _, campi = COLLEZIONI[collezione]
+    record = {"id": riga["id"], "versione": riga["versione"], "rev": riga["rev"]}
+    if riga["eliminato"]:
+        record["eliminato"] = True
+        return record
+    for campo, colonna in campi.items():
+        valore = riga[colonna]
+        record[campo] = json.loads(valore) if colonna in COLONNE_JSON and valore is not None else valore
+    return record
+
+def leggi_collezione(collezione, since=None):
+    tabella, _ = COLLEZIONI[collezione]
+    cur = get_conn().cursor()
+    cur.row_factory = sqlite3.Row
+    if since is None:
+        righe = cur.execute(f"SELECT * FROM {tabella} WHERE eliminato = 0 ORDER BY id")
+    else:
+        righe = cur.execute(f"SELECT * FROM {tabella} WHERE rev > ? ORDER BY rev", (since,))
+    return [_record_client(collezione, r) for r in righe]
+
+def _registra(conn, collezione, id_record):
+    # Ogni scrittura passa dal registro modifiche: il rev del record è la sua
+    # versione globale e gli stream /events la notificano come le altre
+    return conn.execute("INSERT INTO modifiche (tabella, nome) VALUES (?, ?)",
+                        (collezione, str(id_record))).lastrowid
+
+# Scrittura condizionata di un record: `versione` è quella da cui è partito il
+# client (0 per un record nuovo). Se sul server è cambiato nel frattempo
+# solleva Conflitto con la copia del server.
+def scrivi_record(conn, collezione, id_record, versione, dati=None, elimina=False):
+    tabella, campi = COLLEZIONI[collezione]
+    cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
+    attuale = cur.execute(f"SELECT * FROM {tabella} WHERE id = ?", (id_record,)).fetchone()
+    if attuale is not None and attuale["versione"] != versione:
+        raise Conflitto(_record_client(collezione, attuale))
+    if attuale is None and elimina:
+        return {"id": id_record, "versione": versione, "eliminato": True}
+
+    rev = _registra(conn, collezione, id_record)
+    nuova = attuale["versione"] + 1 if attuale is not None else 1
+    if elimina:
+        conn.execute(f"UPDATE {tabella} SET eliminato = 1, versione = ?, rev = ? WHERE id = ?",
+                     (nuova, rev, id_record))
+        if collezione == "zone":
+            # Con la zona se ne vanno anche i suoi articoli
+            for (id_articolo,) in conn.execute(
+                    "SELECT id FROM articoli WHERE zona_id = ? AND eliminato = 0", (id_record,)).fetchall():
+                conn.execute("UPDATE articoli SET eliminato = 1, versione = versione + 1, rev = ? WHERE id = ?",
+                             (_registra(conn, "articoli", id_articolo), id_articolo))
+        return {"id": id_record, "versione": nuova, "rev": rev, "eliminato": True}
+
+    colonne = [colonna for campo, colonna in campi.items() if campo in dati]
+    valori = [json.dumps(dati[campo]) if colonna in COLONNE_JSON else dati[campo]
+              for campo, colonna in campi.items() if campo in dati]
+    if attuale is None:
+        conn.execute(f"INSERT INTO {tabella} (id, versione, rev{''.join(', ' + c for c in colonne)}) "
+                     f"VALUES (?, ?, ?{', ?' * len(colonne)})", [id_record, nuova, rev] + valori)
+    else:
+        assegnazioni = "".join(f", {c} = ?" for c in colonne)
+        conn.execute(f"UPDATE {tabella} SET eliminato = 0, versione = ?, rev = ?{assegnazioni} WHERE id = ?",
+                     [nuova, rev] + valori + [id_record])
+    return {"id": id_record, "versione": nuova, "rev": rev}
+
+def _mutazione_valida(m):
+    if not isinstance(m, dict) or m.get("collezione") not in COLLEZIONI:
+        raise ValueError("collezione sconosciuta")
+    if m.get("op") not in ("put", "delete"):
+        raise ValueError("op deve essere put o delete")
+    if m["op"] == "put" and not isinstance(m.get("dati"), dict):
+        raise ValueError("dati mancanti")
+    return int(m["id"]), int(m.get("versione") or 0)
+
+# Applica la coda di mutazioni di un client in una sola transazione. Ogni
+# mutazione ha il suo esito: i conflitti non bloccano le altre.
+def applica_mutazioni(mutazioni):
+    risultati = []
+    with transazione() as conn:
+        for m in mutazioni:
+            conn.execute("SAVEPOINT mutazione")
+            try:
+                id_record, versione = _mutazione_valida(m)
+                esito = scrivi_record(conn, m["collezione"], id_record, versione,
+                                      m.get("dati"), elimina=m["op"] == "delete")
+                risultati.append({"esito": "ok", "collezione": m["collezione"], **esito})
+            except Conflitto as e:
+                risultati.append({"esito": "conflitto", "collezione": m["collezione"], "record": e.args[0]})
+            except (ValueError, TypeError, KeyError, sqlite3.IntegrityError) as e:
+                conn.execute("ROLLBACK TO mutazione")
+                risultati.append({"esito": "errore", "messaggio": str(e)})
+            conn.execute("RELEASE mutazione")
+    return risultati
+
+# Zone della app (dispensa, frigo...): gli aggregati sono una scansione
+# raggruppata dell'indice articoli_zona_scadenza, senza leggere gli articoli
+SQL_AGGREGATI_ZONE = '''SELECT zona_id, count(*), sum(giorno_scadenza < :oggi),
+                                 sum(giorno_scadenza BETWEEN :oggi AND :limite),
+                                 total(prezzo), sum(prezzo IS NULL)
+                          FROM articoli WHERE eliminato = 0 GROUP BY zona_id'''
+
+ZONA_VUOTA = (0, 0, 0, 0.0, 0)
+
+def _aggregato(*gruppi):
+    articoli, scaduti, in_scadenza, valore, senza_prezzo = map(sum, zip(ZONA_VUOTA, *gruppi))
+    return {"articoli": articoli, "scaduti": scaduti, "in_scadenza": in_scadenza,
+            "valore": round(valore, 2), "senza_prezzo": senza_prezzo}
+
+def aggregati_zone(conn, entro, oggi=None):
+    oggi = oggi or date.today()
+    per_zona = {r[0]: r[1:] for r in conn.execute(SQL_AGGREGATI_ZONE, {
+        "oggi": oggi.isoformat(), "limite": (oggi + timedelta(days=entro)).isoformat()})}
+    totale = _aggregato(*per_zona.values())
+    zone = [{"id": id_zona, "nome": nome, **_aggregato(per_zona.pop(id_zona, ZONA_VUOTA))}
+            for id_zona, nome in conn.execute("SELECT id, nome FROM zone WHERE eliminato = 0 ORDER BY id")]
+    # Quel che resta sono articoli senza zona o di zone che non esistono più
+    return {"oggi": oggi.isoformat(), "entro": entro, "zone": zone,
+            "senza_zona": _aggregato(*per_zona.values()), "totale": totale}
+
+# Sposta articoli in un'altra zona in una sola transazione: o tutti o nessuno.
+# `articoli` sono coppie (id, versione) con i controlli della sincronizzazione
+# (versione None: quella attuale); con `da_zona` sposta tutta una zona.
+def sposta_articoli(zona, articoli=(), da_zona=None):
+    with transazione() as conn:
+        if conn.execute("SELECT 1 FROM zone WHERE id = ? AND eliminato = 0", (zona,)).fetchone() is None:
+            raise LookupError(f"zona {zona} inesistente")
+        if da_zona is not None:
+            articoli = conn.execute("SELECT id, versione FROM articoli WHERE zona_id = ? AND eliminato = 0",
+                                    (da_zona,)).fetchall()
+        spostati = []
+        for id_articolo, versione in articoli:
+            riga = conn.execute("SELECT versione, zona_id FROM articoli WHERE id = ? AND eliminato = 0",
+                                (id_articolo,)).fetchone()
+            if riga is None:
+                raise LookupError(f"articolo {id_articolo} inesistente")
+            if riga[1] != zona:
+                spostati.append(scrivi_record(conn, "articoli", id_articolo,
+                                              riga[0] if versione is None else versione, {"pantryId": zona}))
+        return spostati
 
 HTML = """
 <!DOCTYPE html>
@@ -189,7 +2467,7 @@ HTML = """
         <!-- CRENZA -->
         <div class="card active" id="card-credenza">
             <h3>➕ Aggiungi alla Credenza</h3>
-            <input type="text" id="codice" placeholder="🔍 Codice EAN (opzionale)">
+            <input type="text" id="codice" placeholder="🔍 Codice EAN (opzionale)" inputmode="numeric" onchange="cercaProdotto()">
             <input type="text" id="nome_credenza" placeholder="📦 Nome prodotto *obbligatorio">
             <div class="input-group">
                 <input type="number" id="quantita_credenza" value="1" min="1" max="99" placeholder="Q.tà">
@@ -240,55 +2518,108 @@ HTML = """
             document.getElementById('stats-lista').style.display = tab === 'lista' ? 'flex' : 'none';
         }
         
+        // Copia locale delle tabelle: il server manda solo le righe cambiate
+        let stato = {versione: null, credenza: new Map(), lista_spesa: new Map(), stats: {}};
+        
+        function chiave(tabella, item) {
+            return tabella === 'credenza' ? JSON.stringify([item.codice, item.nome, item.scadenza]) : item.nome;
+        }
+        
+        function applicaDati(data) {
+            ['credenza', 'lista_spesa'].forEach(tabella => {
+                const righe = stato[tabella];
+                const parte = data[tabella];
+                if (data.completo) {
+                    righe.clear();
+                    parte.items.forEach(item => righe.set(chiave(tabella, item), item));
+                } else {
+                    parte.rimossi.forEach(item => righe.delete(chiave(tabella, item)));
+                    parte.aggiornati.forEach(item => righe.set(chiave(tabella, item), item));
+                }
+                stato.stats[tabella] = parte.stats;
+            });
+            stato.versione = data.versione;
+        }
+        
+        function ordinati(tabella, campo) {
+            return Array.from(stato[tabella].values()).sort((a, b) => a[campo] < b[campo] ? 1 : a[campo] > b[campo] ? -1 : 0);
+        }
+        
         function aggiornaUI() {
-            fetch('/dati')
-                .then(r => r.json())
+            const url = stato.versione === null ? '/dati' : '/dati?since=' + stato.versione;
+            fetch(url)
+                .then(r => r.status === 304 ? null : r.json())
                 .then(data => {
-                    // Credenza
-                    const cred = data.credenza;
-                    document.getElementById('credenza_items').textContent = cred.stats.totale_items || 0;
-                    document.getElementById('credenza_quantita').textContent = cred.stats.totale_quantita || 0;
-                    document.getElementById('credenza_valore').textContent = '€' + (cred.stats.valore_totale || 0).toFixed(2);
-                    document.getElementById('lista_credenza_count').textContent = cred.items.length;
-                    
-                    document.getElementById('lista_credenza').innerHTML = cred.items.map(item => 
-                        `<div class="item">
-                            <div>
-                                <div class="item-nome">${item.nome}</div>
-                                <div class="item-dettagli">
-                                    ${item.codice !== 'N/A' ? `Cod: ${item.codice} | ` : ''}
-                                    Q.tà: ${item.quantita} | €${item.prezzo.toFixed(2)}/un | 
-                                    ${item.scadenza !== 'N/D' ? `Scad: ${item.scadenza}` : 'Nessuna'}
-                                </div>
-                            </div>
-                            <div>
-                                <button class="btn btn-warning btn-small" onclick="rimuovi('${item.nome.replace(/'/g, "\\\\'")}', 'credenza')">➖</button>
-                                <button class="btn btn-success btn-small" style="margin-left:5px;" onclick="aggiungiListaDaCredenza('${item.nome.replace(/'/g, "\\\\'")}')">🛒</button>
-                            </div>
-                        </div>`
-                    ).reverse().join('');
-                    
-                    // Lista Spesa
-                    const lista = data.lista_spesa;
-                    document.getElementById('lista_items').textContent = lista.stats.totale_items || 0;
-                    document.getElementById('lista_totale').textContent = '€' + (lista.stats.totale_costo || 0).toFixed(2);
-                    document.getElementById('lista_quantita').textContent = lista.items.reduce((sum, item) => sum + item.quantita, 0);
-                    document.getElementById('lista_spesa_count').textContent = lista.items.length;
-                    
-                    document.getElementById('lista_spesa').innerHTML = lista.items.map(item => 
-                        `<div class="item">
-                            <div>
-                                <div class="item-nome">${item.nome}</div>
-                                <div class="item-dettagli">
-                                    Q.tà: ${item.quantita} | €${item.prezzo_unitario.toFixed(2)}/un
-                                </div>
-                            </div>
-                            <div>
-                                <span class="item-totale">€${item.totale.toFixed(2)}</span>
-                                <button class="btn btn-warning btn-small" style="margin-left:10px;" onclick="rimuovi('${item.nome.replace(/'/g, "\\\\'")}', 'lista_spesa')">➖</button>
-                            </div>
-                        </div>`
-                    ).reverse().join('');
+                    // Risposte arrivate fuori ordine non devono far tornare indietro lo stato
+                    if (!data || (stato.versione !== null && data.versione < stato.versione)) return;
+                    applicaDati(data);
+                    disegna();
+                });
+        }
+        
+        function disegna() {
+            // Credenza
+            const credStats = stato.stats.credenza;
+            const credItems = ordinati('credenza', 'ts_inserimento');
+            document.getElementById('credenza_items').textContent = credStats.totale_items || 0;
+            document.getElementById('credenza_quantita').textContent = credStats.totale_quantita || 0;
+            document.getElementById('credenza_valore').textContent = '€' + (credStats.valore_totale || 0).toFixed(2);
+            document.getElementById('lista_credenza_count').textContent = credItems.length;
+            
+            document.getElementById('lista_credenza').innerHTML = credItems.map(item => 
+                `<div class="item">
+                    <div>
+                        <div class="item-nome">${item.nome}</div>
+                        <div class="item-dettagli">
+                            ${item.codice !== 'N/A' ? `Cod: ${item.codice} | ` : ''}
+                            Q.tà: ${item.quantita} | €${item.prezzo.toFixed(2)}/un | 
+                            ${item.scadenza !== 'N/D' ? `Scad: ${item.scadenza}` : 'Nessuna'}
+                        </div>
+                    </div>
+                    <div>
+                        <button class="btn btn-warning btn-small" onclick="movimento('consuma', '${item.nome.replace(/'/g, "\\\\'")}')">➖</button>
+                        <button class="btn btn-success btn-small" style="margin-left:5px;" onclick="aggiungiListaDaCredenza('${item.nome.replace(/'/g, "\\\\'")}')">🛒</button>
+                    </div>
+                </div>`
+            ).reverse().join('');
+            
+            // Lista Spesa
+            const listaStats = stato.stats.lista_spesa;
+            const listaItems = ordinati('lista_spesa', 'ts_aggiunta');
+            document.getElementById('lista_items').textContent = listaStats.totale_items || 0;
+            document.getElementById('lista_totale').textContent = '€' + (listaStats.totale_costo || 0).toFixed(2);
+            document.getElementById('lista_quantita').textContent = listaStats.totale_quantita || 0;
+            document.getElementById('lista_spesa_count').textContent = listaItems.length;
+            
+            document.getElementById('lista_spesa').innerHTML = listaItems.map(item => 
+                `<div class="item">
+                    <div>
+                        <div class="item-nome">${item.nome}</div>
+                        <div class="item-dettagli">
+                            Q.tà: ${item.quantita} | €${item.prezzo_unitario.toFixed(2)}/un
+                        </div>
+                    </div>
+                    <div>
+                        <span class="item-totale">€${item.totale.toFixed(2)}</span>
+                        <button class="btn btn-success btn-small" style="margin-left:10px;" onclick="movimento('compra', '${item.nome.replace(/'/g, "\\\\'")}')">✅</button>
+                        <button class="btn btn-warning btn-small" style="margin-left:5px;" onclick="rimuovi('${item.nome.replace(/'/g, "\\\\'")}', 'lista_spesa')">➖</button>
+                    </div>
+                </div>`
+            ).reverse().join('');
+        }
+        
+        // Codice presente nel catalogo: precompila nome e prezzo se sono vuoti
+        function cercaProdotto() {
+            const codice = document.getElementById('codice').value.trim();
+            if (!/^\\d{8,14}$/.test(codice)) return;
+            fetch('/prodotti/' + codice)
+                .then(r => r.ok ? r.json() : null)
+                .then(prodotto => {
+                    if (!prodotto) return;
+                    const nome = document.getElementById('nome_credenza');
+                    const prezzo = document.getElementById('prezzo_credenza');
+                    if (!nome.value.trim()) nome.value = prodotto.nome;
+                    if (prodotto.prezzo != null && !parseFloat(prezzo.value)) prezzo.value = prodotto.prezzo.toFixed(2);
                 });
         }
         
@@ -350,6 +2681,15 @@ HTML = """
             }).then(aggiornaUI);
         }
         
+        // consuma: una unità dalla credenza; compra: dalla lista alla credenza
+        function movimento(azione, nome) {
+            fetch('/', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({azione, nome, quantita: azione === 'consuma' ? 1 : undefined})
+            }).then(r => r.ok ? null : r.json().then(e => alert('❌ ' + e.messaggio))).then(aggiornaUI);
+        }
+        
         function rimuovi(nome, tabella) {
             fetch('/', {
                 method: 'POST',
@@ -394,47 +2734,567 @@ HTML = """
             document.getElementById('nome_lista').focus();
         }
         
+        // Aggiornamenti in tempo reale via SSE; polling se lo stream cade o se
+        // il server non lo offre (worker sync: /events risponde 204)
+        let polling = null;
+        
+        function avviaPolling() {
+            if (!polling) polling = setInterval(aggiornaUI, 2000);
+        }
+        
+        function fermaPolling() {
+            clearInterval(polling);
+            polling = null;
+        }
+        
+        function ascoltaEventi() {
+            if (!window.EventSource) return avviaPolling();
+            const sorgente = new EventSource('/events');
+            sorgente.addEventListener('modifica', aggiornaUI);
+            sorgente.onopen = () => { fermaPolling(); aggiornaUI(); };
+            sorgente.onerror = avviaPolling;
+        }
+        
         // INIZIALIZZAZIONE
         document.getElementById('scadenza').valueAsDate = new Date();
         aggiornaUI();
-        setInterval(aggiornaUI, 2000);
+        ascoltaEventi();
     </script>
 </body>
 </html>
 """
 
-@app.route('/', methods=['GET', 'POST'])
+# Compressione e cache HTTP. I corpi statici (la pagina qui sopra, i file
+# della app compilata) si comprimono una volta sola, in gzip e, se il modulo
+# brotli è installato, in br; le risposte JSON da SOGLIA_COMPRESSIONE byte in
+# su si comprimono al volo in gzip. Gli ETag sono forti: uno per codifica
+# (suffisso -gzip / -br), e le richieste condizionali li accettano tutti.
+SOGLIA_COMPRESSIONE = 1024
+LIVELLO_GZIP = 6
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def _codifica_corpo(corpo):
+    varianti = {"gzip": gzip.compress(corpo, 9, mtime=0)}
+    if brotli is not None:
+        varianti["br"] = brotli.compress(corpo, quality=11)
+    etag = hashlib.sha256(corpo).hexdigest()[:32]
+    return {"identity": corpo, **{c: v for c, v in varianti.items() if len(v) < len(corpo)}}, etag
+
+def etag_noto(etag):
+    return any(request.if_none_match.contains(etag + suffisso) for suffisso in ("", "-gzip", "-br"))
+
+# Le versioni contano per database: l'ETag porta anche la famiglia ("_" è il
+# database principale), altrimenti dopo un cambio di famiglia una versione
+# uguale darebbe un falso 304
+def etag_versione(*parti):
+    return "-".join([g.get("famiglia", "_"), *map(str, parti)])
+
+def con_famiglia(risposta, etag):
+    risposta.set_etag(etag)
+    risposta.vary.update(('Cookie', 'X-Famiglia'))
+    risposta.headers['Cache-Control'] = 'no-cache'
+    return risposta
+
+def _non_modificato(etag, cache):
+    risposta = Response(status=304)
+    risposta.set_etag(etag)
+    risposta.headers['Cache-Control'] = cache
+    risposta.vary.add('Accept-Encoding')
+    return risposta
+
+def risposta_statica(codificato, mimetype, cache):
+    varianti, etag = codificato
+    if etag_noto(etag):
+        return _non_modificato(etag, cache)
+    codifica = next((c for c in ("br", "gzip") if c in varianti and request.accept_encodings[c]), "identity")
+    risposta = Response(varianti[codifica], mimetype=mimetype)
+    if codifica != "identity":
+        risposta.headers['Content-Encoding'] = codifica
+    risposta.set_etag(etag if codifica == "identity" else f"{etag}-{codifica}")
+    risposta.headers['Cache-Control'] = cache
+    risposta.vary.add('Accept-Encoding')
+    return risposta
+
+# Pagina classica: template compilato e reso una volta da create_app (non
+# dipende dalla richiesta), già compresso
+_pagine = {}
+
+# File della app compilata, compressi alla prima richiesta e tenuti finché
+# il file non cambia (una build li sostituisce)
+_file_statici = {}
+
+def file_statico(cartella, nome, cache):
+    percorso = safe_join(cartella, nome)
+    try:
+        info = os.stat(percorso)
+    except (TypeError, OSError):
+        return 'Not Found', 404
+    chiave = (info.st_mtime_ns, info.st_size)
+    voce = _file_statici.get(percorso)
+    if voce is None or voce[0] != chiave:
+        with open(percorso, 'rb') as f:
+            voce = (chiave, _codifica_corpo(f.read()))
+        _file_statici[percorso] = voce
+    mimetype = mimetypes.guess_type(nome)[0] or 'application/octet-stream'
+    return risposta_statica(voce[1], mimetype, cache)
+
+@bp.after_app_request
+def comprimi_json(risposta):
+    if (risposta.mimetype != 'application/json' or risposta.status_code != 200
+            or 'Content-Encoding' in risposta.headers or risposta.direct_passthrough):
+        return risposta
+    if not risposta.is_streamed and risposta.calculate_content_length() < SOGLIA_COMPRESSIONE:
+        return risposta
+    risposta.vary.add('Accept-Encoding')
+    if not request.accept_encodings['gzip']:
+        return risposta
+    if risposta.is_streamed:
+        risposta.response = comprimi(risposta.iter_encoded())
+    else:
+        risposta.set_data(gzip.compress(risposta.get_data(), LIVELLO_GZIP))
+    risposta.headers['Content-Encoding'] = 'gzip'
+    etag, debole = risposta.get_etag()
+    if etag:
+        risposta.set_etag(f"{etag}-gzip", debole)
+    return risposta
+
+@bp.before_app_request
+def scegli_famiglia():
+    credenziali = request.headers.get('X-Famiglia') or request.cookies.get('famiglia')
+    if not credenziali or request.endpoint in ('credenza.famiglia', 'credenza.spa_asset', 'static'):
+        return None
+    nome, _, chiave = credenziali.partition(':')
+    if not NOME_FAMIGLIA.fullmatch(nome) or not verifica_famiglia(nome, chiave):
+        return jsonify({'status': 'errore', 'messaggio': 'famiglia o chiave non valida'}), 401
+    g.db = percorso_famiglia(nome)
+    g.famiglia = nome
+    return None
+
+@bp.route('/famiglia', methods=['POST', 'DELETE'])
+def famiglia():
+    risposta = jsonify({'status': 'ok'})
+    if request.method == 'DELETE':
+        risposta.delete_cookie('famiglia')
+        return risposta
+    data = request.get_json(silent=True) or {}
+    nome, chiave = data.get('nome'), data.get('chiave')
+    if (not isinstance(nome, str) or not isinstance(chiave, str) or not NOME_FAMIGLIA.fullmatch(nome)
+            or not verifica_famiglia(nome, chiave)):
+        return jsonify({'status': 'errore', 'messaggio': 'famiglia o chiave non valida'}), 401
+    risposta.set_cookie('famiglia', f"{nome}:{chiave}", max_age=365 * 24 * 3600,
+                        httponly=True, samesite='Lax')
+    return risposta
+
+# Azioni del POST / che passano dal group commit
+AZIONI_IN_GRUPPO = ('aggiungi_credenza', 'aggiungi_lista', 'da_credenza_a_lista', 'consuma', 'compra', 'rimuovi')
+
+@bp.route('/', methods=['GET', 'POST'])
 def home():
     if request.method == 'POST':
         data = request.get_json()
         azione = data.get('azione')
         
-        if azione == 'aggiungi_credenza':
-            aggiungi_item(data.get('codice'), data.get('nome'), data.get('quantita'),
-                         data.get('prezzo'), data.get('scadenza'))
-        elif azione == 'aggiungi_lista':
-            aggiungi_lista_spesa(data.get('nome'), data.get('quantita'), data.get('prezzo_unitario'))
-        elif azione == 'da_credenza_a_lista':
-            # Copia dalla credenza alla lista (1 unità)
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-            c.execute("SELECT prezzo FROM credenza WHERE nome=?", (data.get('nome'),))
-            result = c.fetchone()
-            prezzo = result[0] if result else 0
-            aggiungi_lista_spesa(data.get('nome'), 1, prezzo)
-            conn.close()
-        elif azione == 'rimuovi':
-            rimuovi_item(data.get('nome'), data.get('tabella', 'credenza'))
+        if azione in AZIONI_IN_GRUPPO:
+            try:
+                errore = scrivi_in_gruppo(data)
+            except (ValueError, TypeError) as e:
+                return jsonify({'status': 'errore', 'messaggio': str(e)}), 400
+            if errore is not None:
+                return jsonify({'status': 'errore', 'messaggio': errore}), 409
+        elif azione == 'scarta_scaduti':
+            return jsonify({'status': 'ok', 'scartati': scarta_scaduti()})
         elif azione == 'cancella_tutto':
-            cancella_tutto(data.get('tabella', 'credenza'))
+            try:
+                cancella_tutto(data.get('tabella', 'credenza'))
+            except ValueError as e:
+                return jsonify({'status': 'errore', 'messaggio': str(e)}), 400
         
         return jsonify({'status': 'ok'})
     
-    return render_template_string(HTML)
+    return risposta_statica(_pagine["home"], 'text/html', 'no-cache')
 
-@app.route('/dati')
+@bp.route('/dati')
 def dati_json():
-    return jsonify(get_dati())
+    since = request.args.get('since', type=int)
+    versione = versione_corrente(get_conn())
+    etag = etag_versione(versione)
+    # Niente di nuovo dall'ultima versione vista dal client
+    if since == versione or etag_noto(etag):
+        return con_famiglia(Response(status=304), etag)
+
+    percorso = db_corrente()
+    varianti = leggi_cache_dati(percorso, since, versione)
+    if varianti is not None:
+        return risposta_dati(percorso, since, versione, varianti)
+    dati = get_modifiche(since) if since is not None else None
+    if dati is None:
+        # since troppo vecchio: serve il corpo completo, magari già in cache
+        varianti = leggi_cache_dati(percorso, None, versione) if since is not None else None
+        if varianti is not None:
+            return risposta_dati(percorso, None, versione, varianti)
+        risposta = Response(_conserva_dati(stream_dati(percorso), percorso, versione),
+                            mimetype='application/json')
+    else:
+        risposta = jsonify(dati)
+        salva_cache_dati(percorso, since, versione, {"identity": risposta.get_data()})
+    return con_famiglia(risposta, etag)
+
+# Corpo di /dati dalla cache; la variante gzip si calcola alla prima
+# richiesta che la accetta e resta con le altre
+def risposta_dati(percorso, since, versione, varianti):
+    compresso = request.accept_encodings['gzip'] and len(varianti["identity"]) >= SOGLIA_COMPRESSIONE
+    if compresso and "gzip" not in varianti:
+        varianti = {**varianti, "gzip": gzip.compress(varianti["identity"], LIVELLO_GZIP, mtime=0)}
+        salva_cache_dati(percorso, since, versione, varianti)
+    risposta = Response(varianti["gzip" if compresso else "identity"], mimetype='application/json')
+    if compresso:
+        risposta.headers['Content-Encoding'] = 'gzip'
+    risposta.vary.add('Accept-Encoding')
+    return con_famiglia(risposta, etag_versione(versione, *(["gzip"] if compresso else [])))
+
+@bp.route('/batch', methods=['POST'])
+def batch():
+    data = request.get_json(silent=True)
+    if isinstance(data, list):
+        data = {'operazioni': data}
+    operazioni = data.get('operazioni') if isinstance(data, dict) else None
+    if not isinstance(operazioni, list):
+        return jsonify({'status': 'errore', 'messaggio': 'serve una lista di operazioni'}), 400
+    if len(operazioni) > MAX_OPERAZIONI_BATCH:
+        return jsonify({'status': 'errore',
+                        'messaggio': f'massimo {MAX_OPERAZIONI_BATCH} operazioni per batch'}), 413
+    atomico = bool(data.get('atomico', True))
+    riuscito, risultati = esegui_batch(operazioni, atomico)
+    if riuscito:
+        return jsonify({'status': 'ok', 'risultati': risultati})
+    if atomico:
+        return jsonify({'status': 'annullato', 'risultati': risultati}), 409
+    return jsonify({'status': 'parziale', 'risultati': risultati})
+
+PAGINE_APP = ('index.html', 'manifest.json')
+
+@bp.route('/app')
+@bp.route('/app/')
+def spa():
+    if not os.path.exists(os.path.join(CARTELLA_APP, 'index.html')):
+        return 'App non compilata: cd frontend && npm install && npm run build', 503
+    # L'indice cambia a ogni build e va sempre rivalidato
+    return file_statico(CARTELLA_APP, 'index.html', 'no-cache')
+
+@bp.route('/app/assets/<path:nome>')
+def spa_asset(nome):
+    if nome in PAGINE_APP:
+        return 'Not Found', 404
+    # Il nome contiene l'hash del contenuto: può restare in cache per sempre
+    return file_statico(CARTELLA_APP, nome, 'public, max-age=31536000, immutable')
+
+@bp.route('/api/sync', methods=['GET', 'POST'])
+def api_sync():
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        mutazioni = data.get('mutazioni')
+        if not isinstance(mutazioni, list) or len(mutazioni) > MAX_MUTAZIONI_SYNC:
+            return jsonify({'status': 'errore', 'messaggio': 'mutazioni non valide'}), 400
+        risultati = applica_mutazioni(mutazioni)
+        return jsonify({'status': 'ok', 'rev': versione_corrente(get_conn()), 'risultati': risultati})
+
+    since = request.args.get('since', type=int)
+    rev = versione_corrente(get_conn())
+    if since is not None and since >= rev:
+        risposta = Response(status=304)
+    else:
+        risposta = jsonify({'rev': rev, **{c: leggi_collezione(c, since) for c in COLLEZIONI}})
+    risposta.headers['Cache-Control'] = 'no-cache'
+    return risposta
+
+@bp.route('/api/<collezione>')
+def api_collezione(collezione):
+    if collezione not in COLLEZIONI:
+        return jsonify({'status': 'errore', 'messaggio': 'collezione sconosciuta'}), 404
+    since = request.args.get('since', type=int)
+    return jsonify({'rev': versione_corrente(get_conn()), 'records': leggi_collezione(collezione, since)})
+
+@bp.route('/api/<collezione>/<int:id_record>', methods=['PUT', 'DELETE'])
+def api_record(collezione, id_record):
+    if collezione not in COLLEZIONI:
+        return jsonify({'status': 'errore', 'messaggio': 'collezione sconosciuta'}), 404
+    data = request.get_json(silent=True) or {}
+    versione = data.get('versione', request.args.get('versione', 0, type=int))
+    mutazione = {'collezione': collezione, 'id': id_record, 'versione': versione,
+                 'op': 'delete' if request.method == 'DELETE' else 'put',
+                 'dati': {k: v for k, v in data.items() if k != 'versione'}}
+    esito = applica_mutazioni([mutazione])[0]
+    if esito['esito'] == 'conflitto':
+        return jsonify(esito), 409
+    if esito['esito'] == 'errore':
+        return jsonify(esito), 400
+    return jsonify(esito)
+
+@bp.route('/zone')
+def zone_json():
+    conn = get_conn()
+    entro = request.args.get('entro', type=int)
+    if entro is None:
+        entro = giorni_avviso(conn)
+    if not 0 <= entro <= MAX_GIORNI_SCADENZA:
+        return jsonify({'status': 'errore', 'messaggio': f'entro deve essere tra 0 e {MAX_GIORNI_SCADENZA}'}), 400
+    versione = versione_corrente(conn)
+    oggi = date.today()
+    # Gli aggregati cambiano con il database e con il giorno
+    etag = etag_versione(versione, f"{oggi:%Y%m%d}", entro)
+    if etag_noto(etag):
+        risposta = Response(status=304)
+    else:
+        risposta = jsonify({"versione": versione, **aggregati_zone(conn, entro, oggi)})
+    return con_famiglia(risposta, etag)
+
+@bp.route('/zone/<int:id_zona>/sposta', methods=['POST'])
+def sposta_json(id_zona):
+    data = request.get_json(silent=True) or {}
+    try:
+        da_zona = int(data['da']) if 'da' in data else None
+        articoli = data.get('articoli', [])
+        if not isinstance(articoli, list) or len(articoli) > MAX_MUTAZIONI_SYNC or (da_zona is None and not articoli):
+            raise ValueError
+        coppie = [(int(a['id']), None if a.get('versione') is None else int(a['versione']))
+                  if isinstance(a, dict) else (int(a), None) for a in articoli]
+    except (ValueError, TypeError, KeyError):
+        return jsonify({'status': 'errore',
+                        'messaggio': 'servono "articoli" (id o {id, versione}) oppure "da"'}), 400
+    try:
+        spostati = sposta_articoli(id_zona, coppie, da_zona)
+    except LookupError as e:
+        return jsonify({'status': 'errore', 'messaggio': str(e)}), 404
+    except Conflitto as e:
+        return jsonify({'status': 'conflitto', 'record': e.args[0]}), 409
+    return jsonify({'status': 'ok', 'rev': versione_corrente(get_conn()), 'spostati': spostati})
+
+@bp.route('/elenco/<tabella>')
+def elenco_json(tabella):
+    try:
+        return jsonify(elenca(tabella,
+                              ordina=request.args.get('ordina', '-inserimento'),
+                              limit=request.args.get('limit', LIMITE_ELENCO, type=int),
+                              after=request.args.get('after'),
+                              prefisso=request.args.get('prefisso'),
+                              ean=request.args.get('ean')))
+    except ValueError as e:
+        return jsonify({'status': 'errore', 'messaggio': str(e)}), 400
+
+@bp.route('/stats')
+def stats_json():
+    conn = get_conn()
+    versione = versione_corrente(conn)
+    etag = etag_versione(versione)
+    if etag_noto(etag):
+        risposta = Response(status=304)
+    else:
+        risposta = jsonify({"versione": versione,
+                            "credenza": calcola_stats(conn, "credenza"),
+                            "lista_spesa": calcola_stats(conn, "lista_spesa")})
+    return con_famiglia(risposta, etag)
+
+@bp.route('/scadenze')
+def scadenze_json():
+    conn = get_conn()
+    entro = request.args.get('entro', type=int)
+    if entro is None:
+        entro = giorni_avviso(conn)
+    if not 0 <= entro <= MAX_GIORNI_SCADENZA:
+        return jsonify({'status': 'errore', 'messaggio': f'entro deve essere tra 0 e {MAX_GIORNI_SCADENZA}'}), 400
+    return jsonify(prossime_scadenze(conn, entro))
+
+@bp.route('/scadenze/riepilogo')
+def riepilogo_json():
+    risposta = Response(riepilogo_scadenze(), mimetype='application/json')
+    risposta.headers['Cache-Control'] = 'no-cache'
+    return risposta
+
+@bp.route('/cerca')
+def cerca_json():
+    q = request.args.get('q', '').strip()
+    limite = request.args.get('limit', LIMITE_RICERCA, type=int)
+    if not q or not 1 <= limite <= LIMITE_ELENCO_MAX:
+        return jsonify({'status': 'errore', 'messaggio': 'q obbligatorio, limit tra 1 e 500'}), 400
+    return jsonify({'q': q, 'risultati': cerca(q, limite)})
+
+@bp.route('/piano/spesa')
+def piano_spesa_json():
+    return jsonify(lista_pianificata(request.args.get('dieta', type=int)))
+
+@bp.route('/prezzi', methods=['GET', 'POST'])
+def prezzi_json():
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        nome, negozio, giorno = data.get('nome'), data.get('negozio'), data.get('giorno')
+        try:
+            prezzo = float(data.get('prezzo'))
+            if giorno is not None:
+                giorno = date.fromisoformat(giorno).isoformat()
+        except (TypeError, ValueError):
+            prezzo = None
+        if not nome or not isinstance(nome, str) or not prezzo or prezzo <= 0:
+            return jsonify({'status': 'errore', 'messaggio': 'nome, prezzo > 0 e giorno AAAA-MM-GG'}), 400
+        registra_prezzo(nome, prezzo, negozio, giorno)
+        return jsonify({'status': 'successo'})
+    nome = request.args.get('nome', '').strip()
+    if not nome:
+        return jsonify({'status': 'errore', 'messaggio': 'nome obbligatorio'}), 400
+    return jsonify({'nome': nome, 'mesi': storico_prezzi(get_conn(), nome)})
+
+# Stime per uno o più nomi: /prezzi/stima?nome=latte&nome=pane[&negozio=...]
+@bp.route('/prezzi/stima')
+def stima_prezzi_json():
+    nomi = list(dict.fromkeys(n.strip() for n in request.args.getlist('nome') if n.strip()))
+    if not 1 <= len(nomi) <= MAX_STIME:
+        return jsonify({'status': 'errore', 'messaggio': f'da 1 a {MAX_STIME} nomi'}), 400
+    conn, negozio = get_conn(), request.args.get('negozio')
+    return jsonify({'stime': {nome: stima_prezzo(conn, nome, negozio) for nome in nomi}})
+
+@bp.route('/consumi')
+def consumi_json():
+    giorni = request.args.get('giorni', 30, type=int)
+    if not 1 <= giorni <= MAX_GIORNI_CONSUMI:
+        return jsonify({'status': 'errore', 'messaggio': f'giorni deve essere tra 1 e {MAX_GIORNI_CONSUMI}'}), 400
+    return jsonify(consumi(get_conn(), giorni, request.args.get('nome') or None))
+
+# Registro dei movimenti, dal più recente; `prima` è l'id da cui proseguire
+@bp.route('/movimenti')
+def movimenti_json():
+    limite = request.args.get('limit', LIMITE_ELENCO, type=int)
+    prima = request.args.get('prima', type=int)
+    nome = request.args.get('nome')
+    if not 1 <= limite <= LIMITE_ELENCO_MAX:
+        return jsonify({'status': 'errore', 'messaggio': 'limit tra 1 e 500'}), 400
+    condizioni, parametri = [], []
+    if prima is not None:
+        condizioni.append("id < ?")
+        parametri.append(prima)
+    if nome:
+        condizioni.append("nome = ? COLLATE NOCASE")
+        parametri.append(nome)
+    where = f"WHERE {' AND '.join(condizioni)}" if condizioni else ""
+    cur = get_conn().execute(f"SELECT * FROM movimenti {where} ORDER BY id DESC LIMIT ?", parametri + [limite])
+    righe = [r for b in _righe(cur) for r in b]
+    return jsonify({'items': righe, 'prima': righe[-1]['id'] if len(righe) == limite else None})
+
+# /esporta?formato=ndjson|csv&tabelle=credenza,diete&gzip=0: di default tutte
+# le tabelle (una sola in CSV), compresse con gzip
+@bp.route('/esporta')
+def esporta():
+    formato = request.args.get('formato', 'ndjson')
+    tabelle = [t for t in request.args.get('tabelle', '').split(',') if t] or list(ESPORTAZIONE)
+    if formato not in ('ndjson', 'csv') or any(t not in ESPORTAZIONE for t in tabelle):
+        return jsonify({'status': 'errore',
+                        'messaggio': f'formato ndjson o csv, tabelle tra {", ".join(ESPORTAZIONE)}'}), 400
+    if formato == 'csv' and len(tabelle) != 1:
+        return jsonify({'status': 'errore', 'messaggio': 'in CSV si esporta una tabella per volta'}), 400
+    compresso = request.args.get('gzip', '1') != '0'
+    flusso = esporta_dati(db_corrente(), tabelle, formato)
+    nome = f"crenza-{'-'.join(tabelle) if len(tabelle) < len(ESPORTAZIONE) else 'backup'}-{date.today():%Y%m%d}.{formato}"
+    risposta = Response(comprimi(flusso) if compresso else flusso,
+                        mimetype='application/gzip' if compresso else
+                        ('text/csv' if formato == 'csv' else 'application/x-ndjson'))
+    risposta.headers['Content-Disposition'] = f'attachment; filename="{nome}{".gz" if compresso else ""}"'
+    risposta.headers['Cache-Control'] = 'no-store'
+    return risposta
+
+# Corpo NDJSON o CSV (?tabella=), compresso se Content-Encoding o Content-Type
+# lo dicono. ?id= rende l'importazione riprendibile, ?inizio= è il numero della
+# prima riga inviata quando si rimanda solo il resto del file.
+@bp.route('/importa', methods=['POST'])
+def importa():
+    formato, tabella = request.args.get('formato', 'ndjson'), request.args.get('tabella')
+    id_importazione, inizio = request.args.get('id'), request.args.get('inizio', 0, type=int)
+    if formato not in ('ndjson', 'csv') or (formato == 'csv' and tabella not in ESPORTAZIONE):
+        return jsonify({'status': 'errore', 'messaggio': 'formato ndjson, o csv con tabella'}), 400
+    if id_importazione is not None and not re.fullmatch(r'[\w-]{1,64}', id_importazione):
+        return jsonify({'status': 'errore', 'messaggio': 'id non valido'}), 400
+    flusso = request.stream
+    if request.content_encoding == 'gzip' or request.mimetype in ('application/gzip', 'application/x-gzip'):
+        flusso = gzip.GzipFile(fileobj=flusso)
+    try:
+        esito = importa_dati(flusso, formato, tabella, id_importazione, max(0, inizio))
+    except (OSError, EOFError, UnicodeDecodeError) as e:
+        return jsonify({'status': 'errore', 'messaggio': f'file illeggibile: {e}'}), 400
+    except ValueError as e:
+        return jsonify({'status': 'errore', 'messaggio': str(e)}), 409
+    return jsonify({'status': 'ok', **esito})
+
+@bp.route('/importa/<id_importazione>')
+def stato_importazione(id_importazione):
+    riga = get_conn().execute("SELECT righe, importate, scartate, aggiornata FROM importazioni WHERE id = ?",
+                              (id_importazione,)).fetchone()
+    if riga is None:
+        return jsonify({'status': 'non_trovato'}), 404
+    return jsonify(dict(zip(('righe', 'importate', 'scartate', 'aggiornata'), riga), id=id_importazione))
+
+@bp.route('/prodotti/<ean>')
+def prodotto_json(ean):
+    try:
+        prodotto = cerca_prodotto(normalizza_ean(ean))
+    except ValueError as e:
+        return jsonify({'status': 'errore', 'messaggio': str(e)}), 400
+    if prodotto is None:
+        return jsonify({'status': 'non_trovato'}), 404
+    risposta = jsonify(prodotto)
+    risposta.headers['Cache-Control'] = 'max-age=3600'
+    return risposta
+
+@bp.route('/metriche')
+def metriche():
+    return jsonify({"pool": stats_pool(), "prodotti": stats_cache_prodotti(), "dati": stats_cache_dati(),
+                    "gruppi": stats_gruppi(), "scadenze": dict(_scansione_stato)})
+
+@bp.route('/events')
+def eventi():
+    # Con i worker sync uno stream occuperebbe un worker intero: niente SSE, e
+    # il 204 dice a EventSource di non riconnettersi (i client fanno polling)
+    if not _gevent_attivo():
+        return Response(status=204)
+    avvia_osservatore()
+    # EventSource rimanda l'ultimo id ricevuto quando si riconnette
+    ultima = request.headers.get('Last-Event-ID', type=int)
+    if ultima is None:
+        ultima = request.args.get('since', type=int)
+    if ultima is None:
+        ultima = versione_corrente(get_conn())
+    percorso = db_corrente()
+
+    def stream(versione):
+        fine = time.monotonic() + DURATA_MAX_SSE
+        yield 'retry: 1000\n\n'
+        while True:
+            rimasto = fine - time.monotonic()
+            if rimasto <= 0:
+                return
+            nuova = attendi_versione(percorso, versione, min(HEARTBEAT_SSE, rimasto))
+            if nuova > versione:
+                versione = nuova
+                yield f'id: {versione}\nevent: modifica\ndata: {json.dumps({"versione": versione})}\n\n'
+            else:
+                yield ': ping\n\n'
+
+    return Response(stream(ultima), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Factory dell'applicazione (app.py, flask --app app): pagina classica su / e
+# app React su /app dallo stesso blueprint. Lo schema si prepara una volta per
+# deployment (flask prepara-db nella fase di release): qui si controlla solo la
+# versione, e si migra soltanto se il database è rimasto indietro. Con
+# preload_app (gunicorn.conf.py) tutto questo gira una volta nel master e i
+# worker lo ereditano copy-on-write.
+def create_app():
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    app.wsgi_app = servizio_asincrono(app.wsgi_app)
+    aggiorna_schema(DB_FILE)
+    if "home" not in _pagine:
+        _pagine["home"] = _codifica_corpo(app.jinja_env.from_string(HTML).render().encode())
+    return app
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    create_app().run(host='0.0.0.0', port=5000, debug=True)
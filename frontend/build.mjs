@@ -0,0 +1,79 @@
+// Compila la app React in asset statici con l'hash del contenuto nel nome:
+//
+//   cd frontend && npm install && npm run build
+//
+// Il primo `npm install` scrive package-lock.json, che va nel repository: da
+// lì in poi `npm ci` installa le stesse versioni, e senza lockfile la build
+// non parte. Dopo l'installazione la build non usa la rete: JSX, icone, CSS e
+// font arrivano tutti da node_modules, e la pagina non carica nulla da CDN.
+// Il risultato finisce in ../static/app, servito da Flask su /app.
+import { execFileSync } from 'node:child_process';
+import { createHash } from 'node:crypto';
+import fs from 'node:fs';
+import path from 'node:path';
+import { fileURLToPath } from 'node:url';
+
+const QUI = path.dirname(fileURLToPath(import.meta.url));
+const USCITA = path.join(QUI, '..', 'static', 'app');
+
+if (!fs.existsSync(path.join(QUI, 'package-lock.json'))) {
+    console.error('manca package-lock.json: esegui npm install e committa il lockfile prima di compilare');
+    process.exit(1);
+}
+const { build } = await import('esbuild');
+
+fs.rmSync(USCITA, { recursive: true, force: true });
+fs.mkdirSync(USCITA, { recursive: true });
+
+// JSX precompilato, tree shaking (delle icone lucide restano solo quelle
+// importate in Icon.jsx) e lo scanner in un chunk separato caricato on demand
+const risultato = await build({
+    entryPoints: [path.join(QUI, 'src', 'main.jsx')],
+    absWorkingDir: QUI,
+    bundle: true,
+    splitting: true,
+    format: 'esm',
+    minify: true,
+    target: ['es2019', 'safari13'],
+    jsx: 'automatic',
+    define: { 'process.env.NODE_ENV': '"production"' },
+    outdir: USCITA,
+    entryNames: '[name]-[hash]',
+    chunkNames: 'chunk-[hash]',
+    legalComments: 'none',
+    metafile: true,
+    logLevel: 'info',
+});
+const uscite = Object.entries(risultato.metafile.outputs);
+const ingresso = (nome) => path.basename(uscite.find(([, output]) => output.entryPoint === `src/${nome}`)[0]);
+
+// Font self-hosted: i woff2 di @fontsource (sottoinsieme latin, che copre anche
+// le lettere accentate), con l'hash del contenuto nel nome come il resto
+const hashDi = (dati) => createHash('sha256').update(dati).digest('hex').slice(0, 8).toUpperCase();
+const CARTELLA_FONT = path.join(QUI, 'node_modules', '@fontsource', 'plus-jakarta-sans', 'files');
+const fontFace = [400, 500, 600, 700, 800].map((peso) => {
+    const dati = fs.readFileSync(path.join(CARTELLA_FONT, `plus-jakarta-sans-latin-${peso}-normal.woff2`));
+    const nome = `plus-jakarta-sans-${peso}-${hashDi(dati)}.woff2`;
+    fs.writeFileSync(path.join(USCITA, nome), dati);
+    return `@font-face{font-family:'Plus Jakarta Sans';font-style:normal;font-display:swap;` +
+        `font-weight:${peso};src:url(/app/assets/${nome}) format('woff2')}`;
+}).join('');
+
+// Tailwind genera solo le classi che compaiono davvero nei sorgenti
+const cssProvvisorio = path.join(USCITA, 'app.css');
+execFileSync(path.join(QUI, 'node_modules', '.bin', 'tailwindcss'),
+    ['-c', path.join(QUI, 'tailwind.config.js'), '-i', path.join(QUI, 'src', 'styles.css'),
+     '-o', cssProvvisorio, '--minify'],
+    { stdio: 'inherit' });
+const contenutoCss = fontFace + fs.readFileSync(cssProvvisorio, 'utf8');
+const css = `app-${hashDi(contenutoCss)}.css`;
+fs.writeFileSync(path.join(USCITA, css), contenutoCss);
+fs.rmSync(cssProvvisorio);
+
+const manifest = { js: ingresso('main.jsx'), css };
+const html = fs.readFileSync(path.join(QUI, 'index.html'), 'utf8')
+    .replaceAll('{{ js }}', `/app/assets/${manifest.js}`)
+    .replaceAll('{{ css }}', `/app/assets/${manifest.css}`);
+fs.writeFileSync(path.join(USCITA, 'index.html'), html);
+fs.writeFileSync(path.join(USCITA, 'manifest.json'), JSON.stringify(manifest, null, 2) + '\n');
+console.log(`app compilata in ${path.relative(process.cwd(), USCITA)}: ${manifest.js}, ${manifest.css}`);
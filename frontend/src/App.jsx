@@ -0,0 +1,585 @@
+import { useState, useEffect, useMemo, useCallback } from 'react';
+import Icon from './Icon.jsx';
+import { CATEGORY_MAP } from './categorie.js';
+import { VirtualList, PantryRow, ShoppingRow, PANTRY_ROW_HEIGHT, SHOPPING_ROW_HEIGHT, expiryStatus, sortByExpiry } from './liste.jsx';
+import { Sync, salva, elimina, eliminaZona, spostaArticoli, migraDaV5, caricaStato } from './sync.js';
+
+const DAYS = ["Lunedì", "Martedì", "Mercoledì", "Giovedì", "Venerdì", "Sabato", "Domenica"];
+const MEALS = ["Colazione", "Spuntino Mattutino", "Pranzo", "Spuntino Pomeridiano", "Cena"];
+
+const App = () => {
+    const [activeTab, setActiveTab] = useState('pantry');
+    const [iniziale] = useState(() => { migraDaV5(); return caricaStato(); });
+    const [pantries, setPantries] = useState(iniziale.pantries);
+    const [activePantryId, setActivePantryId] = useState(() => parseInt(localStorage.getItem('crenza_v5_active_pantry')) || 1);
+    const [shoppingList, setShoppingList] = useState(iniziale.shoppingList);
+    const [diets, setDiets] = useState(iniziale.diets);
+    const [activeDietId, setActiveDietId] = useState(() => parseInt(localStorage.getItem('crenza_v5_active_diet')) || 1);
+    const [settings, setSettings] = useState(iniziale.settings);
+    const [showPantryManager, setShowPantryManager] = useState(false);
+    const [showDietManager, setShowDietManager] = useState(false);
+    const [moveItem, setMoveItem] = useState(null);
+    const [zoneMoveItem, setZoneMoveItem] = useState(null);
+    const [editingPantryId, setEditingPantryId] = useState(null);
+    const [editingDietId, setEditingDietId] = useState(null);
+
+    useEffect(() => Sync.avvia(() => {
+        const stato = caricaStato();
+        setPantries(stato.pantries);
+        setShoppingList(stato.shoppingList);
+        setDiets(stato.diets);
+        setSettings(stato.settings);
+    }), []);
+    useEffect(() => localStorage.setItem('crenza_v5_active_pantry', activePantryId), [activePantryId]);
+    useEffect(() => localStorage.setItem('crenza_v5_active_diet', activeDietId), [activeDietId]);
+
+    const currentPantry = useMemo(() => pantries.find(p => p.id === activePantryId) || pantries[0], [pantries, activePantryId]);
+    const currentDiet = useMemo(() => diets.find(d => d.id === activeDietId) || diets[0], [diets, activeDietId]);
+
+    const addToPantry = (item) => {
+        const nuovo = { ...item, id: Date.now(), pantryId: activePantryId };
+        salva('articoli', nuovo);
+        setPantries(prev => prev.map(p => p.id === activePantryId ? { ...p, items: [...p.items, nuovo] } : p));
+        setActiveTab('pantry');
+        setMoveItem(null);
+    };
+
+    const removeFromPantry = useCallback((id) => {
+        elimina('articoli', id);
+        setPantries(prev => prev.map(p => p.id === activePantryId ? { ...p, items: p.items.filter(i => i.id !== id) } : p));
+    }, [activePantryId]);
+
+    const moveToPantry = (item, zona) => {
+        setZoneMoveItem(null);
+        setPantries(prev => prev.map(p => ({ ...p, items: p.id === zona ? [...p.items, { ...item, pantryId: zona }] : p.items.filter(i => i.id !== item.id) })));
+        spostaArticoli(zona, [item]);
+    };
+
+    // Conteggi, scadenze e valore delle zone dagli aggregati del server; senza
+    // rete o con modifiche non ancora inviate valgono i conteggi locali
+    const [zoneStats, setZoneStats] = useState({});
+    useEffect(() => {
+        if (!showPantryManager) return;
+        fetch('/zone')
+            .then(r => r.ok ? r.json() : Promise.reject(r.status))
+            .then(res => setZoneStats(Object.fromEntries(res.zone.map(z => [z.id, z]))))
+            .catch(() => setZoneStats({}));
+    }, [showPantryManager, pantries]);
+
+    const removeFromShopping = useCallback((id) => {
+        elimina('spesa', id);
+        setShoppingList(prev => prev.filter(i => i.id !== id));
+    }, []);
+
+    // Oggi e limite di avviso calcolati una volta sola invece che per ogni articolo
+    const expiryLimits = useMemo(() => {
+        const isoLocale = (d) => `${d.getFullYear()}-${String(d.getMonth() + 1).padStart(2, '0')}-${String(d.getDate()).padStart(2, '0')}`;
+        const today = new Date();
+        const limit = new Date(today.getFullYear(), today.getMonth(), today.getDate() + (settings.alertDays || 0));
+        return { today: isoLocale(today), limit: isoLocale(limit) };
+    }, [settings.alertDays]);
+
+    const pantryItems = useMemo(() => sortByExpiry(currentPantry.items), [currentPantry.items]);
+
+    const updateDiet = (day, meal, value) => {
+        const aggiornata = { ...currentDiet, plan: { ...currentDiet.plan, [`${day}-${meal}`]: value } };
+        salva('diete', aggiornata);
+        setDiets(prev => prev.map(d => d.id === aggiornata.id ? aggiornata : d));
+    };
+
+    // Il pianificatore del server confronta i pasti della dieta con le scorte;
+    // qui si aggiungono alla spesa le voci mancanti non ancora in lista
+    const generateShopping = () => {
+        fetch(`/piano/spesa?dieta=${currentDiet.id}`)
+            .then(r => r.ok ? r.json() : Promise.reject(r.status))
+            .then(piano => {
+                const presenti = new Set(shoppingList.map(i => i.name.toLowerCase()));
+                const nuovi = piano.voci.filter(v => v.da_comprare > 0 && !presenti.has(v.nome)).map((v, i) => (
+                    { id: Date.now() + i, name: v.nome, qty: v.unita === 'pz' ? v.da_comprare : 1, price: v.prezzo_unitario || 0 }
+                ));
+                nuovi.forEach(n => salva('spesa', n));
+                setShoppingList(prev => [...prev, ...nuovi]);
+                setActiveTab('shopping');
+            })
+            .catch(() => alert('Per generare la spesa serve la connessione al server'));
+    };
+
+    // Le voci senza prezzo usano la stima del server dallo storico prezzi;
+    // si chiedono solo i nomi mai stimati, in una richiesta per volta
+    const [priceEstimates, setPriceEstimates] = useState({});
+    const unpricedNames = useMemo(() => [...new Set(shoppingList.filter(i => !i.price).map(i => i.name))]
+        .filter(n => !(n in priceEstimates)), [shoppingList, priceEstimates]);
+
+    useEffect(() => {
+        if (unpricedNames.length === 0) return;
+        const query = unpricedNames.slice(0, 500).map(n => `nome=${encodeURIComponent(n)}`).join('&');
+        let annullato = false;
+        fetch(`/prezzi/stima?${query}`)
+            .then(r => r.ok ? r.json() : Promise.reject(r.status))
+            .then(({ stime }) => {
+                if (annullato) return;
+                setPriceEstimates(prev => {
+                    const nuove = { ...prev };
+                    unpricedNames.forEach(n => { nuove[n] = stime[n.trim()]?.prezzo || null; });
+                    return nuove;
+                });
+            })
+            .catch(() => {});
+        return () => { annullato = true; };
+    }, [unpricedNames]);
+
+    // Ripristino da un backup di /esporta: l'id deriva dal file, così rimandare
+    // lo stesso file dopo un'interruzione riprende da dove era arrivato
+    const restoreBackup = (file) => {
+        if (!file) return;
+        const id = `${file.size}-${file.lastModified}-${file.name}`.replace(/[^\w-]/g, '_').slice(0, 64);
+        fetch(`/importa?id=${id}`, {
+            method: 'POST',
+            headers: { 'Content-Type': file.name.endsWith('.gz') ? 'application/gzip' : 'application/x-ndjson' },
+            body: file
+        })
+            .then(r => r.json())
+            .then(esito => {
+                if (esito.status !== 'ok') throw new Error(esito.messaggio);
+                alert(`Ripristinati ${esito.importate} elementi` + (esito.scartate ? `, ${esito.scartate} scartati` : ''));
+                Sync.ricevi();
+            })
+            .catch(e => alert('Ripristino non riuscito: ' + e.message));
+    };
+
+    // I dati stanno sul server: qui si butta solo la copia del browser, che al
+    // ricaricamento torna da /api/sync. Resta il segno della migrazione, se no
+    // migraDaV5 rimetterebbe in coda le zone e le diete di default.
+    const clearLocalCache = () => {
+        const nonInviate = Sync.coda.length ? `\n${Sync.coda.length} modifiche non ancora inviate andranno perse.` : '';
+        if (!confirm(`Svuotare la cache locale? I dati restano sul server e tornano al ricaricamento.${nonInviate}`)) return;
+        localStorage.clear();
+        localStorage.setItem('crenza_v6_migrato', '1');
+        location.reload();
+    };
+
+    const shoppingTotal = useMemo(() => {
+        return shoppingList.reduce((acc, item) => acc + ((item.price || priceEstimates[item.name] || 0) * (item.qty || 1)), 0);
+    }, [shoppingList, priceEstimates]);
+
+    return (
+        <div className="max-w-md mx-auto bg-white min-h-screen flex flex-col shadow-2xl relative border-x border-slate-100 overflow-hidden">
+            <header className="bg-gradient-to-r from-red-600 to-rose-500 text-white p-5 sticky top-0 z-40 shadow-lg">
+                <div className="flex justify-between items-center mb-2">
+                    <h1 className="text-2xl font-black flex items-center gap-2 tracking-tighter uppercase italic">
+                        <Icon name="pizza" size={32} /> CRENZA
+                    </h1>
+                    <button onClick={() => setShowPantryManager(!showPantryManager)} className="bg-white/20 p-2.5 rounded-2xl hover:bg-white/30 transition-all backdrop-blur-md">
+                        <Icon name="layers" size={22} />
+                    </button>
+                </div>
+                <div className="inline-flex items-center gap-2 bg-black/10 px-3 py-1.5 rounded-xl text-xs font-bold border border-white/10">
+                    <Icon name="map-pin" size={14} /> {currentPantry.name}
+                </div>
+            </header>
+
+            {showPantryManager && (
+                <div className="absolute top-[108px] left-0 right-0 z-50 bg-white shadow-2xl border-b animate-in slide-in-from-top duration-300 rounded-b-3xl">
+                    <div className="p-5 space-y-4">
+                        <h3 className="text-xs font-black text-slate-400 uppercase tracking-widest flex items-center gap-2">Le mie zone</h3>
+                        <div className="space-y-2 max-h-60 overflow-y-auto pr-1">
+                            {pantries.map(p => { const z = Sync.coda.length ? null : zoneStats[p.id]; return (
+                                <div key={p.id} className="flex gap-2">
+                                    {editingPantryId === p.id ? (
+                                        <input 
+                                            autoFocus
+                                            className="flex-1 bg-slate-50 border-2 border-red-500 rounded-2xl px-4 py-2 font-bold outline-none"
+                                            defaultValue={p.name}
+                                            onBlur={(e) => {
+                                                const newName = e.target.value.trim();
+                                                if (newName) {
+                                                    salva('zone', { id: p.id, name: newName });
+                                                    setPantries(pantries.map(x => x.id === p.id ? { ...x, name: newName } : x));
+                                                }
+                                                setEditingPantryId(null);
+                                            }}
+                                            onKeyPress={(e) => {
+                                                if (e.key === 'Enter') e.target.blur();
+                                            }}
+                                        />
+                                    ) : (
+                                        <button onClick={() => { setActivePantryId(p.id); setShowPantryManager(false); }} className={`flex-1 text-left p-4 rounded-2xl border-2 transition-all flex items-center justify-between ${activePantryId === p.id ? 'border-red-500 bg-red-50 text-red-700 shadow-sm' : 'border-slate-100 text-slate-600'}`}>
+                                            <span className="font-bold">{p.name}</span>
+                                            <span className="flex gap-1 items-center">
+                                                {z && z.scaduti + z.in_scadenza > 0 && <span className="text-[10px] bg-amber-100 text-amber-700 px-2 py-1 rounded-lg">{z.scaduti + z.in_scadenza} in scadenza</span>}
+                                                {z && z.valore > 0 && <span className="text-[10px] bg-white px-2 py-1 rounded-lg border border-slate-200">€{z.valore.toFixed(2)}</span>}
+                                                <span className="text-[10px] bg-white px-2 py-1 rounded-lg border border-slate-200">{z ? z.articoli : p.items.length} items</span>
+                                            </span>
+                                        </button>
+                                    )}
+                                    <button onClick={() => setEditingPantryId(editingPantryId === p.id ? null : p.id)} className="p-4 text-slate-300 hover:text-blue-500 transition-colors">
+                                        <Icon name="edit-3" size={20} />
+                                    </button>
+                                    <button onClick={() => { if(pantries.length > 1 && confirm("Eliminare questa zona e tutti i suoi prodotti?")) { eliminaZona(p); const f = pantries.filter(x => x.id !== p.id); setPantries(f); if(activePantryId === p.id) setActivePantryId(f[0].id); } }} className="p-4 text-slate-300 hover:text-red-500 transition-colors">
+                                        <Icon name="trash-2" size={20} />
+                                    </button>
+                                </div>
+                            ); })}
+                        </div>
+                        <div className="flex gap-2 pt-2 border-t border-slate-50">
+                            <input id="pantryName" type="text" placeholder="Nuova zona (es. Frigo)" className="flex-1 bg-slate-100 rounded-2xl px-4 py-3 text-sm font-bold focus:ring-2 focus:ring-red-500 outline-none" />
+                            <button onClick={() => { const v = document.getElementById('pantryName').value; if(v){ const z = {id: Date.now(), name: v}; salva('zone', z); setPantries([...pantries, {...z, items: []}]); document.getElementById('pantryName').value=''; } }} className="bg-red-600 text-white p-3 rounded-2xl shadow-lg shadow-red-200"><Icon name="plus" size={24} /></button>
+                        </div>
+                    </div>
+                </div>
+            )}
+
+            <main className="flex-1 p-5 overflow-y-auto pb-32">
+                {activeTab === 'pantry' && (
+                    <div className="space-y-6">
+                        <div className="flex justify-between items-end">
+                            <div>
+                                <p className="text-[10px] font-black text-red-500 uppercase tracking-[0.2em] mb-1">Inventario</p>
+                                <h2 className="text-3xl font-black text-slate-800 tracking-tighter">Credenza</h2>
+                            </div>
+                            <button onClick={() => setShowPantryManager(true)} className="flex items-center gap-2 bg-slate-100 hover:bg-slate-200 p-3 rounded-2xl transition-all">
+                                <Icon name="plus" size={18} className="text-red-600" />
+                                <span className="text-[10px] font-black uppercase text-slate-600">Nuova Zona</span>
+                            </button>
+                        </div>
+
+                        {/* Selettore rapido credenze */}
+                        <div className="flex gap-2 overflow-x-auto hide-scrollbar pb-2">
+                            {pantries.map(p => (
+                                <button 
+                                    key={p.id} 
+                                    onClick={() => setActivePantryId(p.id)}
+                                    className={`shrink-0 px-4 py-2 rounded-2xl text-[10px] font-black uppercase tracking-widest transition-all border-2 ${activePantryId === p.id ? 'bg-red-600 border-red-600 text-white shadow-lg shadow-red-100' : 'bg-white border-slate-100 text-slate-400 hover:border-red-200'}`}
+                                >
+                                    {p.name}
+                                </button>
+                            ))}
+                        </div>
+
+                        <div className="flex justify-between items-center bg-slate-50 p-4 rounded-3xl border border-slate-100">
+                            <div className="flex items-center gap-3">
+                                <div className="w-10 h-10 bg-white rounded-2xl flex items-center justify-center shadow-sm">
+                                    <Icon name="box" size={20} className="text-red-600" />
+                                </div>
+                                <div>
+                                    <h4 className="font-black text-slate-800 text-sm">{currentPantry.name}</h4>
+                                    <p className="text-[10px] font-bold text-slate-400 uppercase">{currentPantry.items.length} Articoli totali</p>
+                                </div>
+                            </div>
+                            <button onClick={() => { setEditingPantryId(currentPantry.id); setShowPantryManager(true); }} className="p-2 text-slate-300 hover:text-blue-500 transition-colors">
+                                <Icon name="edit-3" size={18} />
+                            </button>
+                        </div>
+
+                        {currentPantry.items.length === 0 ? (
+                            <div className="flex flex-col items-center justify-center py-24 text-slate-200 text-center">
+                                <Icon name="package" size={80} strokeWidth={1} className="mb-4" />
+                                <p className="font-black uppercase tracking-widest text-xs">Credenza Vuota</p>
+                            </div>
+                        ) : (
+                            <VirtualList items={pantryItems} rowHeight={PANTRY_ROW_HEIGHT} renderItem={item => (
+                                <PantryRow item={item} status={expiryStatus(item.expiry, expiryLimits)} onRemove={removeFromPantry} onMove={pantries.length > 1 ? setZoneMoveItem : null} />
+                            )} />
+                        )}
+                    </div>
+                )}
+
+                {activeTab === 'shopping' && (
+                    <div className="space-y-6">
+                        <div className="flex justify-between items-end">
+                            <h2 className="text-3xl font-black text-slate-800 tracking-tighter">La Spesa</h2>
+                            <div className="text-right">
+                                <p className="text-[10px] font-black text-slate-400 uppercase tracking-widest">Totale Stimato</p>
+                                <p className="text-2xl font-black text-red-600">€{shoppingTotal.toFixed(2)}</p>
+                            </div>
+                        </div>
+
+                        <div className="bg-white p-4 rounded-[2.5rem] shadow-xl border-2 border-slate-100 space-y-3">
+                            <input id="shopIn" type="text" placeholder="Cosa comprare?" className="w-full bg-slate-50 rounded-2xl px-4 py-3 outline-none text-sm font-bold border-2 border-transparent focus:border-red-100" />
+                            <div className="flex gap-2">
+                                <div className="flex-1">
+                                    <label className="text-[9px] font-black text-slate-300 uppercase pl-2">Quantità</label>
+                                    <input id="shopQty" type="number" defaultValue="1" min="1" className="w-full bg-slate-50 rounded-xl px-4 py-2 outline-none text-sm font-bold" />
+                                </div>
+                                <div className="flex-1">
+                                    <label className="text-[9px] font-black text-slate-300 uppercase pl-2">Prezzo €</label>
+                                    <input id="shopPrice" type="number" step="0.01" placeholder="0.00" className="w-full bg-slate-50 rounded-xl px-4 py-2 outline-none text-sm font-bold" />
+                                </div>
+                                <button onClick={() => { 
+                                    const name = document.getElementById('shopIn').value;
+                                    const qty = parseFloat(document.getElementById('shopQty').value) || 1;
+                                    const price = parseFloat(document.getElementById('shopPrice').value) || 0;
+                                    if(name){ 
+                                        const nuovo = {id: Date.now(), name, qty, price};
+                                        salva('spesa', nuovo);
+                                        setShoppingList([...shoppingList, nuovo]); 
+                                        document.getElementById('shopIn').value = ''; 
+                                        document.getElementById('shopQty').value = '1'; 
+                                        document.getElementById('shopPrice').value = ''; 
+                                    } 
+                                }} className="self-end bg-red-600 text-white p-3 rounded-2xl shadow-lg shadow-red-200 active:scale-95 transition-all"><Icon name="plus" size={24} /></button>
+                            </div>
+                        </div>
+
+                        <div>
+                            <VirtualList items={shoppingList} rowHeight={SHOPPING_ROW_HEIGHT} renderItem={item => (
+                                <ShoppingRow item={item} estimate={item.price ? null : priceEstimates[item.name]} onMove={setMoveItem} onRemove={removeFromShopping} />
+                            )} />
+                            {shoppingList.length === 0 && <div className="text-center py-20 opacity-30 font-black uppercase text-xs tracking-[0.3em]">Lista vuota</div>}
+                        </div>
+                    </div>
+                )}
+
+                {activeTab === 'diet' && (
+                    <div className="space-y-6">
+                        <div className="flex justify-between items-center">
+                            <h2 className="text-3xl font-black text-slate-800 tracking-tighter">Dieta</h2>
+                            <button onClick={() => setShowDietManager(!showDietManager)} className="bg-red-50 text-red-600 p-3 rounded-2xl flex items-center gap-2 font-black text-xs uppercase tracking-widest">
+                                <Icon name="users" size={16} /> {currentDiet.name}
+                            </button>
+                        </div>
+
+                        <button onClick={generateShopping} className="w-full flex items-center justify-center gap-2 bg-slate-800 text-white py-3 rounded-2xl font-black text-[10px] uppercase tracking-widest shadow-lg active:scale-95 transition-all">
+                            <Icon name="shopping-bag" size={16} /> Genera la spesa dalla dieta
+                        </button>
+
+                        {showDietManager && (
+                            <div className="bg-white p-5 rounded-[2rem] border-2 border-slate-100 shadow-xl space-y-4 animate-in slide-in-from-top duration-300">
+                                <h3 className="text-[10px] font-black text-slate-400 uppercase tracking-widest">Scegli o aggiungi dieta</h3>
+                                <div className="space-y-2">
+                                    {diets.map(d => (
+                                        <div key={d.id} className="flex gap-2">
+                                            {editingDietId === d.id ? (
+                                                <input 
+                                                    autoFocus
+                                                    className="flex-1 bg-slate-50 border-2 border-red-500 rounded-xl px-4 py-2 font-bold outline-none"
+                                                    defaultValue={d.name}
+                                                    onBlur={(e) => {
+                                                        const newName = e.target.value.trim();
+                                                        if (newName) {
+                                                            salva('diete', { ...d, name: newName });
+                                                            setDiets(diets.map(x => x.id === d.id ? { ...x, name: newName } : x));
+                                                        }
+                                                        setEditingDietId(null);
+                                                    }}
+                                                    onKeyPress={(e) => { if (e.key === 'Enter') e.target.blur(); }}
+                                                />
+                                            ) : (
+                                                <button onClick={() => { setActiveDietId(d.id); setShowDietManager(false); }} className={`flex-1 text-left p-3 rounded-xl border-2 font-bold transition-all ${activeDietId === d.id ? 'border-red-500 bg-red-50 text-red-700' : 'border-slate-50 text-slate-500'}`}>
+                                                    {d.name}
+                                                </button>
+                                            )}
+                                            <button onClick={() => setEditingDietId(editingDietId === d.id ? null : d.id)} className="p-2 text-slate-300 hover:text-blue-500"><Icon name="edit-3" size={18} /></button>
+                                            <button onClick={() => { if(diets.length > 1 && confirm("Eliminare?")) { elimina('diete', d.id); const f = diets.filter(x => x.id !== d.id); setDiets(f); if(activeDietId === d.id) setActiveDietId(f[0].id); } }} className="p-2 text-slate-300 hover:text-red-500"><Icon name="trash-2" size={18} /></button>
+                                        </div>
+                                    ))}
+                                </div>
+                                <div className="flex gap-2 pt-2 border-t">
+                                    <input id="newDietName" type="text" placeholder="Nome nuova dieta" className="flex-1 bg-slate-50 rounded-xl px-4 py-2 text-xs font-bold outline-none" />
+                                    <button onClick={() => { const v = document.getElementById('newDietName').value; if(v){ const nuova = {id: Date.now(), name: v, plan: {}}; salva('diete', nuova); setDiets([...diets, nuova]); document.getElementById('newDietName').value=''; } }} className="bg-red-600 text-white p-2 rounded-xl"><Icon name="plus" size={20} /></button>
+                                </div>
+                            </div>
+                        )}
+
+                        <div className="flex gap-2 overflow-x-auto hide-scrollbar pb-2">
+                            {DAYS.map((day, idx) => (
+                                <button key={day} onClick={() => document.getElementById(`day-${idx}`).scrollIntoView({ behavior: 'smooth', block: 'start' })} className="shrink-0 bg-white border-2 border-slate-100 px-4 py-2 rounded-2xl text-[10px] font-black uppercase tracking-widest text-slate-400 hover:text-red-500 hover:border-red-200 transition-all">{day}</button>
+                            ))}
+                        </div>
+                        <div className="space-y-12">
+                            {DAYS.map((day, idx) => (
+                                <div key={day} id={`day-${idx}`} className="space-y-4">
+                                    <div className="flex items-center gap-3">
+                                        <div className="w-8 h-8 rounded-full bg-red-600 text-white flex items-center justify-center font-black text-xs">{idx + 1}</div>
+                                        <h3 className="text-xl font-black text-slate-800 tracking-tight">{day}</h3>
+                                    </div>
+                                    <div className="grid grid-cols-1 gap-3 bg-white p-4 rounded-[2.5rem] border-2 border-slate-50 shadow-sm">
+                                        {MEALS.map(meal => (
+                                            <div key={meal} className="space-y-1">
+                                                <label className="text-[9px] font-black text-slate-300 uppercase tracking-widest pl-2">{meal}</label>
+                                                <input 
+                                                    type="text" 
+                                                    value={currentDiet.plan[`${day}-${meal}`] || ''} 
+                                                    onChange={e => updateDiet(day, meal, e.target.value)}
+                                                    className="w-full bg-slate-50/50 border-2 border-slate-50 rounded-2xl px-4 py-3 text-sm font-bold focus:bg-white focus:border-red-100 outline-none transition-all placeholder:text-slate-200"
+                                                    placeholder="Cosa mangiamo?"
+                                                />
+                                            </div>
+                                        ))}
+                                    </div>
+                                </div>
+                            ))}
+                        </div>
+                    </div>
+                )}
+
+                {activeTab === 'scan' && <AddView initialName={moveItem?.name} onAdd={(item) => { addToPantry(moveItem && moveItem.price ? { ...item, price: moveItem.price } : item); if(moveItem) { elimina('spesa', moveItem.id); setShoppingList(shoppingList.filter(i => i.id !== moveItem.id)); } }} onCancel={() => { setActiveTab('pantry'); setMoveItem(null); }} />}
+
+                {activeTab === 'settings' && (
+                    <div className="space-y-6">
+                        <h2 className="text-3xl font-black text-slate-800 tracking-tighter">Opzioni</h2>
+                        <div className="p-8 bg-white border-2 border-slate-100 rounded-[3rem] shadow-xl space-y-8">
+                            <div className="space-y-4">
+                                <label className="text-xs font-black text-slate-400 uppercase tracking-widest flex items-center gap-2"><Icon name="bell" size={14} /> Giorni pre-avviso scadenza</label>
+                                <div className="flex items-center gap-4">
+                                    <input type="number" value={settings.alertDays} onChange={e => { const nuove = {...settings, alertDays: parseInt(e.target.value) || 0}; salva('impostazioni', nuove); setSettings(nuove); }} className="w-24 bg-slate-50 border-2 border-slate-100 rounded-2xl px-4 py-3 font-black text-xl focus:border-red-500 outline-none transition-all" />
+                                    <span className="text-slate-400 font-bold">Giorni</span>
+                                </div>
+                            </div>
+                            <div className="grid grid-cols-2 gap-3">
+                                <a href="/esporta" download className="flex items-center justify-center gap-2 text-slate-600 font-black p-4 bg-slate-50 rounded-[2rem] hover:bg-slate-100 transition-all active:scale-95">
+                                    <Icon name="download" size={18} /> Backup
+                                </a>
+                                <label className="flex items-center justify-center gap-2 text-slate-600 font-black p-4 bg-slate-50 rounded-[2rem] hover:bg-slate-100 transition-all active:scale-95 cursor-pointer">
+                                    <Icon name="upload" size={18} /> Ripristina
+                                    <input type="file" accept=".gz,.ndjson,.json" className="hidden" onChange={e => { restoreBackup(e.target.files[0]); e.target.value = ''; }} />
+                                </label>
+                            </div>
+                            <button onClick={clearLocalCache} className="w-full flex items-center justify-center gap-3 text-red-600 font-black p-5 bg-red-50 rounded-[2rem] hover:bg-red-100 transition-all active:scale-95">
+                                <Icon name="trash-2" size={22} /> Svuota la cache locale
+                            </button>
+                        </div>
+                    </div>
+                )}
+            </main>
+
+            {moveItem && (
+                <div className="fixed inset-0 z-50 bg-black/40 backdrop-blur-sm flex items-end justify-center">
+                    <div className="bg-white w-full max-w-md p-6 rounded-t-[3rem] animate-in slide-in-from-bottom duration-300">
+                        <h3 className="text-xl font-black mb-4 flex items-center gap-2 text-slate-800"><Icon name="truck" /> Sposta in Credenza</h3>
+                        <p className="text-sm text-slate-400 font-bold mb-6">Stai spostando: <span className="text-red-600">{moveItem.name}</span></p>
+                        <button onClick={() => { setActiveTab('scan'); }} className="w-full bg-red-600 text-white font-black py-5 rounded-[2rem] shadow-xl shadow-red-200 mb-3 uppercase tracking-widest text-xs">Scegli Categoria e Scadenza</button>
+                        <button onClick={() => setMoveItem(null)} className="w-full bg-slate-100 text-slate-400 font-black py-4 rounded-[2rem] uppercase tracking-widest text-xs">Annulla</button>
+                    </div>
+                </div>
+            )}
+
+            {zoneMoveItem && (
+                <div className="fixed inset-0 z-50 bg-black/40 backdrop-blur-sm flex items-end justify-center">
+                    <div className="bg-white w-full max-w-md p-6 rounded-t-[3rem] animate-in slide-in-from-bottom duration-300">
+                        <h3 className="text-xl font-black mb-4 flex items-center gap-2 text-slate-800"><Icon name="truck" /> Sposta in un'altra zona</h3>
+                        <p className="text-sm text-slate-400 font-bold mb-6">Stai spostando: <span className="text-red-600">{zoneMoveItem.name}</span></p>
+                        <div className="space-y-2 mb-3 max-h-60 overflow-y-auto">
+                            {pantries.filter(p => p.id !== zoneMoveItem.pantryId).map(p => (
+                                <button key={p.id} onClick={() => moveToPantry(zoneMoveItem, p.id)} className="w-full text-left p-4 rounded-2xl border-2 border-slate-100 font-bold text-slate-600 hover:border-red-500">{p.name}</button>
+                            ))}
+                        </div>
+                        <button onClick={() => setZoneMoveItem(null)} className="w-full bg-slate-100 text-slate-400 font-black py-4 rounded-[2rem] uppercase tracking-widest text-xs">Annulla</button>
+                    </div>
+                </div>
+            )}
+
+            <nav className="fixed bottom-0 left-0 right-0 max-w-md mx-auto glass-nav border-t border-slate-100 flex justify-around p-4 z-40 pb-8 rounded-t-[3rem] shadow-[0_-10px_40px_rgba(0,0,0,0.05)]">
+                <NavButton active={activeTab === 'pantry'} count={currentPantry.items.length} onClick={() => setActiveTab('pantry')} icon="grid" label="Credenza" />
+                <NavButton active={activeTab === 'shopping'} count={shoppingList.length} onClick={() => setActiveTab('shopping')} icon="shopping-bag" label="Spesa" />
+                <div className="relative -mt-12">
+                    <button onClick={() => { setMoveItem(null); setActiveTab('scan'); }} className={`p-5 rounded-[2rem] shadow-2xl shadow-red-200 transition-all active:scale-90 ${activeTab === 'scan' ? 'bg-slate-800 text-white' : 'bg-gradient-to-tr from-red-600 to-rose-500 text-white ring-8 ring-white'}`}>
+                        <Icon name="plus" size={32} />
+                    </button>
+                </div>
+                <NavButton active={activeTab === 'diet'} onClick={() => setActiveTab('diet')} icon="calendar" label="Dieta" />
+                <NavButton active={activeTab === 'settings'} onClick={() => setActiveTab('settings')} icon="settings" label="Opzioni" />
+            </nav>
+        </div>
+    );
+};
+
+const NavButton = ({ active, onClick, icon, label, count }) => (
+    <button onClick={onClick} className={`relative flex flex-col items-center gap-1 transition-all ${active ? 'text-red-600 scale-110' : 'text-slate-300 hover:text-slate-500'}`}>
+        <Icon name={icon} size={24} strokeWidth={active ? 2.5 : 2} />
+        <span className="text-[8px] font-black uppercase tracking-tighter">{label}</span>
+        {count > 0 && <span className="absolute -top-1 -right-1 bg-red-600 text-white text-[8px] font-black w-4 h-4 rounded-full flex items-center justify-center ring-2 ring-white">{count}</span>}
+    </button>
+);
+
+const AddView = ({ onAdd, onCancel, initialName }) => {
+    const [mode, setMode] = useState('manual');
+    const [name, setName] = useState(initialName || '');
+    const [expiry, setExpiry] = useState('');
+    const [category, setCategory] = useState('Altro');
+    const [barcode, setBarcode] = useState('');
+
+    const handleSubmit = (e) => {
+        if(e) e.preventDefault();
+        if (!name) return;
+        onAdd({ name, expiry, category, barcode });
+    };
+
+    // Il catalogo locale completa nome e categoria del codice appena letto
+    const handleScan = (code) => {
+        setBarcode(code);
+        setMode('manual');
+        fetch(`/prodotti/${encodeURIComponent(code)}`)
+            .then(r => r.ok ? r.json() : null)
+            .then(prodotto => {
+                if (!prodotto) return;
+                setName(attuale => attuale || prodotto.nome);
+                if (CATEGORY_MAP[prodotto.categoria]) setCategory(prodotto.categoria);
+            })
+            .catch(() => {});
+    };
+
+    return (
+        <div className="space-y-8 animate-in fade-in zoom-in-95 duration-300">
+            <div className="flex bg-slate-100 p-1.5 rounded-3xl mb-4 shadow-inner">
+                <button onClick={() => setMode('manual')} className={`flex-1 py-3 rounded-2xl text-xs font-black transition-all uppercase tracking-widest ${mode === 'manual' ? 'bg-white shadow-sm text-red-600' : 'text-slate-400'}`}>Manuale</button>
+                <button onClick={() => setMode('scan')} className={`flex-1 py-3 rounded-2xl text-xs font-black transition-all uppercase tracking-widest ${mode === 'scan' ? 'bg-white shadow-sm text-red-600' : 'text-slate-400'}`}>Scanner</button>
+            </div>
+
+            {mode === 'scan' ? (
+                <div className="space-y-6">
+                    <div id="reader" className="overflow-hidden rounded-[3rem] border-8 border-slate-50 bg-slate-100 min-h-[300px] shadow-2xl relative">
+                        <div className="absolute inset-0 border-[2px] border-red-500/30 animate-pulse pointer-events-none rounded-[2.5rem] m-8"></div>
+                    </div>
+                    <ScannerComponent onResult={handleScan} />
+                    <button onClick={() => setMode('manual')} className="w-full py-5 text-slate-400 font-black text-xs uppercase tracking-widest bg-slate-100 rounded-[2rem]">Annulla e usa manuale</button>
+                </div>
+            ) : (
+                <form onSubmit={handleSubmit} className="space-y-8">
+                    <div className="space-y-6">
+                        <div>
+                            <label className="text-[10px] font-black text-slate-300 uppercase tracking-[0.3em] mb-3 block px-2">Cos'è?</label>
+                            <input autoFocus type="text" required value={name} onChange={e => setName(e.target.value)} className="w-full bg-slate-50 border-4 border-slate-50 rounded-[2rem] px-6 py-5 font-black text-xl focus:bg-white focus:border-red-100 outline-none transition-all placeholder:text-slate-200" placeholder="Esempio: Mele..." />
+                        </div>
+                        <div className="space-y-6">
+                            <label className="text-[10px] font-black text-slate-300 uppercase tracking-[0.3em] mb-2 block px-2">Categoria</label>
+                            <div className="grid grid-cols-3 gap-2">
+                                {Object.keys(CATEGORY_MAP).map(cat => (
+                                    <button key={cat} type="button" onClick={() => setCategory(cat)} className={`p-3 rounded-2xl border-2 flex flex-col items-center gap-1 transition-all ${category === cat ? 'border-red-500 bg-red-50 text-red-600' : 'border-slate-50 bg-slate-50 text-slate-400'}`}>
+                                        <Icon name={CATEGORY_MAP[cat].icon} size={20} />
+                                        <span className="text-[8px] font-black uppercase truncate w-full text-center">{cat}</span>
+                                    </button>
+                                ))}
+                            </div>
+                        </div>
+                        <div>
+                            <label className="text-[10px] font-black text-slate-300 uppercase tracking-[0.3em] mb-3 block px-2">Data Scadenza</label>
+                            <input type="date" value={expiry} onChange={e => setExpiry(e.target.value)} className="w-full bg-slate-50 border-4 border-slate-50 rounded-[2rem] px-6 py-5 font-black text-lg focus:bg-white focus:border-red-100 outline-none transition-all" />
+                        </div>
+                    </div>
+                    <div className="flex gap-4 pt-4">
+                        <button type="button" onClick={onCancel} className="flex-1 py-6 text-slate-400 font-black uppercase tracking-widest bg-slate-100 rounded-[2rem] text-xs">Annulla</button>
+                        <button type="submit" className="flex-1 py-6 bg-gradient-to-r from-red-600 to-rose-500 text-white font-black uppercase tracking-widest rounded-[2rem] shadow-xl shadow-red-200 text-xs text-center">AGGIUNGI</button>
+                    </div>
+                </form>
+            )}
+        </div>
+    );
+};
+
+const ScannerComponent = ({ onResult }) => {
+    useEffect(() => {
+        let html5QrCode = null;
+        let smontato = false;
+        // La libreria dello scanner è pesante: si scarica solo quando serve
+        import('html5-qrcode').then(({ Html5Qrcode }) => {
+            if (smontato) return;
+            html5QrCode = new Html5Qrcode("reader");
+            html5QrCode.start({ facingMode: "environment" }, { fps: 15, qrbox: 250 }, (decodedText) => { html5QrCode.stop().then(() => onResult(decodedText)); }).catch(err => console.error(err));
+        });
+        return () => { smontato = true; if(html5QrCode && html5QrCode.isScanning) html5QrCode.stop().catch(e => console.log(e)); };
+    }, []);
+    return null;
+};
+
+export default App;
@@ -0,0 +1,23 @@
+import {
+    Apple, Archive, Bell, Box, Calendar, Carrot, Clock, CupSoda, Download, Drumstick, Edit3, Fish, Grid,
+    IceCream, Layers, MapPin, Milk, Package, Pizza, Plus, Settings, ShoppingBag, Snowflake,
+    Sparkles, Trash2, Truck, Upload, Users, Utensils, Wheat
+} from 'lucide-react';
+
+// Solo le icone usate dalla app: il bundler scarta tutte le altre
+const ICONE = {
+    "apple": Apple, "archive": Archive, "bell": Bell, "box": Box, "calendar": Calendar,
+    "carrot": Carrot, "clock": Clock, "cup-soda": CupSoda, "download": Download, "drumstick": Drumstick,
+    "edit-3": Edit3, "fish": Fish, "grid": Grid, "ice-cream": IceCream, "layers": Layers,
+    "map-pin": MapPin, "milk": Milk, "package": Package, "pizza": Pizza, "plus": Plus,
+    "settings": Settings, "shopping-bag": ShoppingBag, "snowflake": Snowflake,
+    "sparkles": Sparkles, "trash-2": Trash2, "truck": Truck, "upload": Upload, "users": Users,
+    "utensils": Utensils, "wheat": Wheat
+};
+
+const Icon = ({ name, size = 24, className = "", strokeWidth = 2 }) => {
+    const Componente = ICONE[name] || Box;
+    return <Componente size={size} className={className} strokeWidth={strokeWidth} />;
+};
+
+export default Icon;
@@ -0,0 +1,15 @@
+export const CATEGORY_MAP = {
+    "Pasta/Riso": { icon: "utensils", color: "bg-orange-100 text-orange-600 border-orange-200" },
+    "Pane/Farina": { icon: "wheat", color: "bg-amber-100 text-amber-700 border-amber-200" },
+    "Verdura": { icon: "carrot", color: "bg-green-100 text-green-700 border-green-200" },
+    "Frutta": { icon: "apple", color: "bg-emerald-100 text-emerald-700 border-emerald-200" },
+    "Carne": { icon: "drumstick", color: "bg-red-100 text-red-600 border-red-200" },
+    "Pesce": { icon: "fish", color: "bg-blue-100 text-blue-700 border-blue-200" },
+    "Latticini": { icon: "milk", color: "bg-indigo-100 text-indigo-600 border-indigo-200" },
+    "Bibite": { icon: "cup-soda", color: "bg-cyan-100 text-cyan-600 border-cyan-200" },
+    "Dolci": { icon: "ice-cream", color: "bg-pink-100 text-pink-600 border-pink-200" },
+    "Conserve": { icon: "archive", color: "bg-stone-100 text-stone-600 border-stone-200" },
+    "Surgelati": { icon: "snowflake", color: "bg-sky-100 text-sky-600 border-sky-200" },
+    "Igiene": { icon: "sparkles", color: "bg-violet-100 text-violet-600 border-violet-200" },
+    "Altro": { icon: "box", color: "bg-slate-100 text-slate-600 border-slate-200" }
+};
@@ -0,0 +1,119 @@
+import { memo, useEffect, useRef, useState } from 'react';
+import Icon from './Icon.jsx';
+import { CATEGORY_MAP } from './categorie.js';
+
+// Altezze fisse delle righe (card + spazio sotto), usate dalla lista virtuale
+export const PANTRY_ROW_HEIGHT = 108;
+export const SHOPPING_ROW_HEIGHT = 88;
+
+// Le scadenze sono date ISO: basta confrontarle come stringhe con oggi e con
+// il limite di avviso
+export const expiryStatus = (expiry, limits) => {
+    if (!expiry) return 'none';
+    if (expiry < limits.today) return 'expired';
+    if (expiry <= limits.limit) return 'near';
+    return 'ok';
+};
+
+// Copia ordinata: lo stato di React non va mai ordinato sul posto
+export const sortByExpiry = (items) => [...items].sort((a, b) => {
+    const x = a.expiry || '9999', y = b.expiry || '9999';
+    return x < y ? -1 : x > y ? 1 : 0;
+});
+
+// Lista a finestra sullo scorrimento della pagina: monta solo le righe visibili
+// più qualche riga di margine; il contenitore ha l'altezza della lista intera,
+// così la barra di scorrimento resta giusta.
+export const VirtualList = ({ items, rowHeight, renderItem, overscan = 6 }) => {
+    const container = useRef(null);
+    const [range, setRange] = useState({ start: 0, end: 20 });
+
+    useEffect(() => {
+        let frame = null;
+        const measure = () => {
+            frame = null;
+            if (!container.current) return;
+            const top = container.current.getBoundingClientRect().top;
+            const start = Math.max(0, Math.floor(-top / rowHeight) - overscan);
+            const end = Math.max(start, Math.ceil((window.innerHeight - top) / rowHeight) + overscan);
+            setRange(prev => prev.start === start && prev.end === end ? prev : { start, end });
+        };
+        const schedule = () => { if (frame === null) frame = requestAnimationFrame(measure); };
+        measure();
+        // In cattura: arrivano anche gli scroll dei contenitori interni
+        window.addEventListener('scroll', schedule, { passive: true, capture: true });
+        window.addEventListener('resize', schedule);
+        return () => {
+            window.removeEventListener('scroll', schedule, { capture: true });
+            window.removeEventListener('resize', schedule);
+            if (frame !== null) cancelAnimationFrame(frame);
+        };
+    }, [items.length, rowHeight, overscan]);
+
+    const start = Math.min(range.start, items.length);
+    const end = Math.min(range.end, items.length);
+    return (
+        <div ref={container} style={{ height: items.length * rowHeight, position: 'relative' }}>
+            <div style={{ transform: `translateY(${start * rowHeight}px)` }}>
+                {items.slice(start, end).map(item => (
+                    <div key={item.id} style={{ height: rowHeight }}>{renderItem(item)}</div>
+                ))}
+            </div>
+        </div>
+    );
+};
+
+export const PantryItemCard = ({ item, status, onRemove, onMove }) => {
+    const cat = CATEGORY_MAP[item.category] || CATEGORY_MAP["Altro"];
+    return (
+        <div className={`card-pop group relative p-4 rounded-[2rem] border-2 flex gap-4 items-center shadow-sm hover:shadow-xl transition-all ${
+            status === 'expired' ? 'bg-red-50 border-red-200' : 
+            status === 'near' ? 'bg-amber-50 border-amber-200' : 'bg-white border-slate-50'
+        }`}>
+            <div className={`w-14 h-14 rounded-2xl flex items-center justify-center shadow-inner shrink-0 ${cat.color} border`}>
+                <Icon name={cat.icon} size={28} />
+            </div>
+            <div className="flex-1 min-w-0">
+                <h3 className="font-extrabold text-slate-800 text-lg leading-tight truncate">{item.name}</h3>
+                <div className="flex items-center gap-2 mt-1">
+                    <span className="text-[9px] font-black uppercase tracking-wider opacity-60">{item.category}</span>
+                    <div className={`flex items-center gap-1 text-[10px] font-bold ${status === 'expired' ? 'text-red-600' : status === 'near' ? 'text-amber-600' : 'text-slate-400'}`}>
+                        <Icon name="clock" size={10} />
+                        {item.expiry ? item.expiry : 'Senza scadenza'}
+                    </div>
+                </div>
+            </div>
+            {onMove && (
+                <button onClick={() => onMove(item)} className="w-10 h-10 rounded-full bg-slate-50 text-slate-300 hover:bg-blue-500 hover:text-white flex items-center justify-center transition-all active:scale-90">
+                    <Icon name="truck" size={16} />
+                </button>
+            )}
+            <button onClick={() => onRemove(item.id)} className="w-10 h-10 rounded-full bg-slate-50 text-slate-300 hover:bg-red-500 hover:text-white flex items-center justify-center transition-all active:scale-90">
+                <Icon name="trash-2" size={16} />
+            </button>
+            {status === 'expired' && <div className="absolute -top-2 -right-2 bg-red-600 text-white text-[8px] font-black px-2 py-1 rounded-lg shadow-lg uppercase">Scaduto</div>}
+        </div>
+    );
+};
+
+// estimate: prezzo stimato dallo storico, mostrato con ~ se manca il prezzo
+export const ShoppingItemCard = ({ item, estimate, onMove, onRemove }) => (
+    <div className="group flex items-center justify-between p-4 bg-white rounded-3xl border-2 border-slate-50 shadow-sm hover:border-red-100 transition-all">
+        <div className="flex-1 min-w-0">
+            <h3 className="font-extrabold text-slate-800 truncate">{item.name}</h3>
+            <div className="flex gap-3 text-[10px] font-bold text-slate-400 uppercase">
+                <span>Q.tà: {item.qty || 1}</span>
+                <span>{!item.price && estimate ? '~' : ''}€{(item.price || estimate || 0).toFixed(2)}</span>
+                <span className="text-red-500 font-black">Tot: €{((item.qty || 1) * (item.price || estimate || 0)).toFixed(2)}</span>
+            </div>
+        </div>
+        <div className="flex gap-1">
+            <button onClick={() => onMove(item)} className="p-3 text-red-500 hover:bg-red-50 rounded-2xl transition-all"><Icon name="truck" size={18} /></button>
+            <button onClick={() => onRemove(item.id)} className="p-3 text-slate-200 hover:text-red-500 transition-colors"><Icon name="trash-2" size={18} /></button>
+        </div>
+    </div>
+);
+
+// Righe stabili: con props invariate React salta il render
+export const PantryRow = memo(PantryItemCard);
+export const ShoppingRow = memo(ShoppingItemCard);
@@ -0,0 +1,203 @@
+// Archivio locale: una chiave di localStorage per ogni record, così
+// una modifica riscrive solo il record toccato e non tutta la collezione
+const PREFISSO_ARCHIVIO = 'crenza_v6:';
+export const Archivio = {
+    chiave: (coll, id) => `${PREFISSO_ARCHIVIO}${coll}:${id}`,
+    leggi: (coll, id) => JSON.parse(localStorage.getItem(Archivio.chiave(coll, id)) || 'null'),
+    scrivi: (coll, rec) => localStorage.setItem(Archivio.chiave(coll, rec.id), JSON.stringify(rec)),
+    elimina: (coll, id) => localStorage.removeItem(Archivio.chiave(coll, id)),
+    tutti: (coll) => {
+        const prefisso = `${PREFISSO_ARCHIVIO}${coll}:`;
+        const records = [];
+        for (let i = 0; i < localStorage.length; i++) {
+            const k = localStorage.key(i);
+            if (k.startsWith(prefisso)) records.push(JSON.parse(localStorage.getItem(k)));
+        }
+        return records.sort((a, b) => a.id - b.id);
+    },
+};
+
+const stessoRecord = (m, collezione, id) => m.collezione === collezione && m.id === id;
+
+// Coda delle mutazioni da mandare al server. Funziona offline: la coda
+// sta in localStorage e si svuota appena c'è rete. Ogni mutazione porta
+// la versione del record da cui è partita; se sul server è cambiato
+// nel frattempo il server risponde "conflitto" e vince la sua copia.
+export const Sync = {
+    coda: JSON.parse(localStorage.getItem('crenza_v6_coda') || '[]'),
+    rev: parseInt(localStorage.getItem('crenza_v6_rev')) || 0,
+    inVolo: 0,
+    suRemoto: () => {},
+
+    salvaCoda() {
+        localStorage.setItem('crenza_v6_coda', JSON.stringify(this.coda));
+    },
+
+    accoda(collezione, op, rec) {
+        const { id, versione, rev, ...dati } = rec;
+        // Più modifiche allo stesso record non ancora inviate diventano una sola
+        const i = this.coda.findIndex((m, idx) => idx >= this.inVolo && stessoRecord(m, collezione, id));
+        if (i >= 0) Object.assign(this.coda[i], { op, dati: op === 'put' ? dati : undefined });
+        else this.coda.push({ collezione, id, op, versione: versione || 0, dati: op === 'put' ? dati : undefined });
+        this.salvaCoda();
+        this.invia();
+    },
+
+    invia() {
+        if (this.inVolo || !this.coda.length || !navigator.onLine) return;
+        const lotto = this.coda.slice(0, 200);
+        this.inVolo = lotto.length;
+        fetch('/api/sync', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({ mutazioni: lotto })
+        })
+            .then(r => { if (!r.ok) throw new Error(r.status); return r.json(); })
+            .then(res => {
+                this.coda.splice(0, lotto.length);
+                this.inVolo = 0;
+                res.risultati.forEach((esito, i) => this.esito(lotto[i], esito));
+                this.salvaCoda();
+                this.suRemoto();
+                this.ricevi();
+                this.invia();
+            })
+            .catch(() => { this.inVolo = 0; });
+    },
+
+    esito(m, esito) {
+        if (esito.esito === 'ok') {
+            // La nostra scrittura diventa la base delle modifiche successive
+            const locale = Archivio.leggi(m.collezione, m.id);
+            if (locale && !esito.eliminato) Archivio.scrivi(m.collezione, { ...locale, versione: esito.versione });
+            this.coda.forEach(altra => { if (stessoRecord(altra, m.collezione, m.id)) altra.versione = esito.versione; });
+        } else if (esito.esito === 'conflitto') {
+            this.coda = this.coda.filter(altra => !stessoRecord(altra, m.collezione, m.id));
+            this.applica(m.collezione, [esito.record]);
+        }
+    },
+
+    ricevi() {
+        if (!navigator.onLine) return;
+        fetch('/api/sync?since=' + this.rev)
+            .then(r => r.status === 304 ? null : r.json())
+            .then(data => {
+                if (!data || data.rev < this.rev) return;
+                COLLEZIONI_SYNC.forEach(coll => this.applica(coll, data[coll]));
+                this.rev = data.rev;
+                localStorage.setItem('crenza_v6_rev', data.rev);
+                this.suRemoto();
+            })
+            .catch(() => {});
+    },
+
+    applica(collezione, records) {
+        records.forEach(rec => {
+            // Le modifiche locali ancora in coda hanno la precedenza
+            if (this.coda.some(m => stessoRecord(m, collezione, rec.id))) return;
+            if (rec.eliminato) return Archivio.elimina(collezione, rec.id);
+            const { rev, ...resto } = rec;
+            Archivio.scrivi(collezione, resto);
+        });
+    },
+
+    avvia(suRemoto) {
+        this.suRemoto = suRemoto;
+        window.addEventListener('online', () => { this.invia(); this.ricevi(); });
+        // Senza stream (browser vecchi, o worker sync: /events risponde 204)
+        // si chiedono le novità più spesso
+        const polling = () => setInterval(() => this.ricevi(), 3000);
+        if (window.EventSource) {
+            const sorgente = new EventSource('/events');
+            sorgente.addEventListener('modifica', () => this.ricevi());
+            sorgente.onerror = () => { if (sorgente.readyState === EventSource.CLOSED) polling(); };
+        } else polling();
+        setInterval(() => { this.invia(); this.ricevi(); }, 30000);
+        this.invia();
+        this.ricevi();
+    },
+};
+
+export const COLLEZIONI_SYNC = ['zone', 'articoli', 'spesa', 'diete', 'impostazioni'];
+
+export const salva = (coll, rec) => {
+    const vecchio = Archivio.leggi(coll, rec.id);
+    const nuovo = { ...rec, versione: vecchio ? vecchio.versione : 0 };
+    Archivio.scrivi(coll, nuovo);
+    Sync.accoda(coll, 'put', nuovo);
+};
+
+export const elimina = (coll, id) => {
+    const vecchio = Archivio.leggi(coll, id);
+    Archivio.elimina(coll, id);
+    Sync.accoda(coll, 'delete', { id, versione: vecchio ? vecchio.versione : 0 });
+};
+
+// Il server cancella anche gli articoli della zona: qui basta dimenticarli
+export const eliminaZona = (zona) => {
+    const ids = new Set(zona.items.map(i => i.id));
+    Sync.coda = Sync.coda.filter((m, idx) => idx < Sync.inVolo || !(m.collezione === 'articoli' && ids.has(m.id)));
+    ids.forEach(id => Archivio.elimina('articoli', id));
+    elimina('zone', zona.id);
+};
+
+// Spostamento tra zone: online è una sola richiesta al server, che sposta
+// tutti gli articoli o nessuno; offline, o con modifiche ancora in coda,
+// passa dalla coda come le altre scritture
+export const spostaArticoli = (zona, articoli) => {
+    const spostati = articoli.map(a => ({ ...a, pantryId: zona }));
+    if (!navigator.onLine || articoli.some(a => Sync.coda.some(m => stessoRecord(m, 'articoli', a.id)))) {
+        spostati.forEach(a => salva('articoli', a));
+        return Promise.resolve();
+    }
+    spostati.forEach(a => Archivio.scrivi('articoli', a));
+    return fetch(`/zone/${zona}/sposta`, {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({ articoli: articoli.map(a => ({ id: a.id, versione: a.versione || 0 })) })
+    })
+        .then(r => r.json().then(res => {
+            if (r.ok) return res.spostati.forEach(e => {
+                const locale = Archivio.leggi('articoli', e.id);
+                if (locale) Archivio.scrivi('articoli', { ...locale, versione: e.versione });
+            });
+            // Il server non ha spostato niente: vale la sua copia
+            articoli.forEach(a => Archivio.scrivi('articoli', a));
+            if (res.record) Sync.applica('articoli', [res.record]);
+        }))
+        .catch(() => spostati.forEach(a => salva('articoli', a)))
+        .then(() => { Sync.suRemoto(); Sync.ricevi(); });
+};
+
+// Primo avvio con l'archivio per record: importa i vecchi blob crenza_v5_*
+// (o i valori di default) e li mette in coda per il server
+export const migraDaV5 = () => {
+    if (localStorage.getItem('crenza_v6_migrato')) return;
+    const pantries = JSON.parse(localStorage.getItem('crenza_v5_pantries') || 'null') || [{ id: 1, name: "Dispensa Principale", items: [] }];
+    pantries.forEach(p => {
+        salva('zone', { id: p.id, name: p.name });
+        p.items.forEach(item => salva('articoli', { ...item, pantryId: p.id }));
+    });
+    JSON.parse(localStorage.getItem('crenza_v5_shopping') || '[]').forEach(item => salva('spesa', item));
+    const diets = JSON.parse(localStorage.getItem('crenza_v5_diets') || 'null') || [
+        { id: 1, name: "La mia Dieta", plan: {} },
+        { id: 2, name: "Dieta figlio", plan: {} }
+    ];
+    diets.forEach(d => salva('diete', d));
+    salva('impostazioni', { id: 1, ...JSON.parse(localStorage.getItem('crenza_v5_settings') || '{"alertDays": 3}') });
+    ['crenza_v5_pantries', 'crenza_v5_shopping', 'crenza_v5_diets', 'crenza_v5_settings'].forEach(k => localStorage.removeItem(k));
+    localStorage.setItem('crenza_v6_migrato', '1');
+};
+
+export const caricaStato = () => {
+    const perZona = {};
+    Archivio.tutti('articoli').forEach(a => (perZona[a.pantryId] = perZona[a.pantryId] || []).push(a));
+    const zone = Archivio.tutti('zone');
+    const diete = Archivio.tutti('diete');
+    return {
+        pantries: zone.length ? zone.map(z => ({ ...z, items: perZona[z.id] || [] })) : [{ id: 1, name: "Dispensa Principale", items: [] }],
+        shoppingList: Archivio.tutti('spesa'),
+        diets: diete.length ? diete : [{ id: 1, name: "La mia Dieta", plan: {} }],
+        settings: Archivio.leggi('impostazioni', 1) || { id: 1, alertDays: 3 },
+    };
+};
@@ -0,0 +1,8 @@
+export default {
+    content: {
+        relative: true,
+        files: ['./index.html', './src/**/*.{js,jsx}'],
+    },
+    theme: { extend: {} },
+    plugins: [],
+};
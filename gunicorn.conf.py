@@ -0,0 +1,16 @@
+# Configurazione letta da gunicorn all'avvio (Procfile: gunicorn app:app).
+# Di default worker sync, e i client aggiornano con il polling (/events
+# risponde 204); con CRENZA_ASYNC=1 worker gevent: un processo tiene
+# migliaia di client fermi (stream /events, keep-alive) e SQLite lavora in un
+# pool di CRENZA_THREAD_SQLITE thread nativi (vedi servizio_asincrono in
+# credenza.py). Richiede gevent (requirements.txt).
+import os
+
+# L'app (create_app, schema e pagina home compressa) si carica una volta nel
+# master; i worker la ereditano con il fork, copy-on-write
+preload_app = True
+
+if os.environ.get("CRENZA_ASYNC") == "1":
+    worker_class = "worker_asincrono.WorkerAsincrono"
+    worker_connections = int(os.environ.get("CRENZA_CONNESSIONI", 10000))
+    keepalive = 75
@@ -0,0 +1,14 @@
+# Worker gevent per la modalità asincrona (gunicorn.conf.py, CRENZA_ASYNC=1).
+# Rende cooperativo solo l'I/O: thread, lock e thread-local restano nativi,
+# come li usano il pool SQLite e le connessioni per thread di credenza.py.
+import socket
+
+from gevent import monkey
+from gunicorn.workers.ggevent import GeventWorker
+
+
+class WorkerAsincrono(GeventWorker):
+    def patch(self):
+        monkey.patch_all(thread=False)
+        self.sockets = [socket.socket(s.FAMILY, socket.SOCK_STREAM, fileno=s.sock.fileno())
+                        for s in self.sockets]